@@ -6,6 +6,9 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from database import db
 from ml_service import solar_ml
+from spatial_index import charger_index, charger_coordinates
+from charger_catalog import charger_catalog
+from repository import Booking, columns
 
 import requests
 from datetime import datetime
@@ -30,75 +33,56 @@ class EVAssistantTools:
     def search_chargers(query: str = "", user_lat: float = None, user_lng: float = None):
         """Search for available EV charging stations. Sorts by distance if user location provided."""
         try:
-            res = db.client.table('chargers').select("*").execute()
-            chargers = res.data if res.data else []
-            
-            # Helper for distance
-            import math
-            def calculate_distance(lat1, lon1, lat2, lon2):
-                try:
-                    R = 6371 # km
-                    dlat = math.radians(lat2 - lat1)
-                    dlon = math.radians(lon2 - lon1)
-                    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                    return R * c
-                except:
-                    return float('inf')
+            catalog = charger_catalog.snapshot()
+            # Catalog rows are shared and read-only; work on copies
+            chargers = [dict(c) for c in catalog.chargers]
+            has_location = user_lat is not None and user_lng is not None
 
-            enriched_chargers = []
-            
-            for charger in chargers:
-                lat = None
-                lng = None
-                
-                # Check for nested location object (e.g. JSON column)
-                if 'location' in charger and isinstance(charger['location'], dict):
-                    loc = charger['location']
-                    lat = loc.get('lat') or loc.get('latitude')
-                    lng = loc.get('lng') or loc.get('longitude')
-                else:
-                    # Fallback to top-level keys
-                    lat = charger.get('latitude') or charger.get('lat') or charger.get('Latitude')
-                    lng = charger.get('longitude') or charger.get('lng') or charger.get('Longitude')
-                
-                # Address
+            # Order by distance through the shared spatial index
+            if has_location:
+                by_id = {c['id']: c for c in chargers}
+                ranked = [
+                    (charger_id, dist_val) for charger_id, dist_val in
+                    charger_index.nearest(float(user_lat), float(user_lng), k=len(chargers))
+                    if charger_id in by_id
+                ]
+                ordered = []
+                for charger_id, dist_val in ranked:
+                    charger = by_id[charger_id]
+                    charger['distance_km'] = round(dist_val, 2)
+                    charger['proximity_info'] = f"{dist_val:.2f} km away"
+                    ordered.append(charger)
+                # Chargers without coordinates go last, as before
+                ranked_ids = {charger_id for charger_id, _ in ranked}
+                ordered.extend(c for c in chargers if c['id'] not in ranked_ids)
+                chargers = ordered
+
+            def add_address(charger):
                 if 'address' not in charger or not charger['address']:
-                    if lat and lng:
-                        charger['address'] = EVAssistantTools._get_address(lat, lng)
+                    coords = charger_coordinates(charger)
+                    if coords:
+                        charger['address'] = EVAssistantTools._get_address(*coords)
                     else:
                         charger['address'] = "Location details unavailable"
 
-                # Distance Calculation
-                dist_info = ""
-                dist_val = float('inf')
-                
-                if user_lat is not None and user_lng is not None and lat and lng:
-                    try:
-                        dist_val = calculate_distance(float(user_lat), float(user_lng), float(lat), float(lng))
-                        dist_info = f"{dist_val:.2f} km away"
-                        charger['distance_km'] = round(dist_val, 2)
-                        charger['proximity_info'] = dist_info
-                    except Exception as e:
-                        print(f"Distance calc error: {e}")
-                
-                # Filter by Query (if provided)
-                if query:
-                    q = query.lower()
-                    text = str(charger).lower()
-                    if q not in text:
-                        continue
-
-                enriched_chargers.append(charger)
+            if query:
+                # Address is part of the searchable text, so it is resolved up front
+                q = query.lower()
+                enriched_chargers = []
+                for charger in chargers:
+                    add_address(charger)
+                    if q in str(charger).lower():
+                        enriched_chargers.append(charger)
+            else:
+                enriched_chargers = chargers
 
-            # Sort by distance if location provided
-            if user_lat is not None and user_lng is not None:
-                enriched_chargers.sort(key=lambda x: x.get('distance_km', float('inf')))
+            # Return top 5 closest if sorting by distance, else top 5 general
+            top = enriched_chargers[:5]
+            for charger in top:
+                add_address(charger)
 
             print(f"Chargers found: {len(enriched_chargers)}") 
-            
-            # Return top 5 closest if sorting by distance, else top 5 general
-            return json.dumps(enriched_chargers[:5], indent=2)
+            return json.dumps(top, indent=2)
 
         except Exception as e:
             return f"Error searching chargers: {str(e)}"
@@ -125,7 +109,7 @@ class EVAssistantTools:
         try:
             # Note: In a real secure env, we'd verify this user_id matches the session
             # For now, the Agent enforces it by passing the session user_id
-            res = db.client.table('bookings').select("*, chargers(name)").eq('user_id', user_id).execute()
+            res = db.client.table('bookings').select(f"{columns(Booking)}, chargers(name)").eq('user_id', user_id).execute()
             return json.dumps(res.data, indent=2)
         except Exception as e:
             return f"Error fetching bookings: {str(e)}"
@@ -135,11 +119,11 @@ class EVAssistantTools:
         """Create a new booking for a user."""
         try:
             # 1. Fetch charger details for cost calculation
-            charger_res = db.client.table('chargers').select("cost_per_kwh").eq('id', charger_id).execute()
-            if not charger_res.data:
+            charger = charger_catalog.get(charger_id)
+            if not charger:
                 return "Error: Charger not found."
             
-            cost_per_kwh = charger_res.data[0].get('cost_per_kwh', 0)
+            cost_per_kwh = charger.get('cost_per_kwh', 0)
             
             # 2. Calculate duration in hours
             fmt = "%Y-%m-%dT%H:%M:%S"
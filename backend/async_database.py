@@ -0,0 +1,176 @@
+"""
+Async database helper module for Supabase operations
+Same method surface as database.Database, built on the shared pooled
+AsyncClient from supabase_clients, so async endpoints can have many PostgREST
+calls in flight without blocking the event loop. The queries are the ones in
+queries.py; only awaiting them differs from the sync class.
+
+The client is opened in the app lifespan; methods also connect lazily so
+scripts can use it without the app.
+"""
+import logging
+from typing import Optional, Dict, Any, List
+
+from supabase import AsyncClient
+
+from repository import UserCredentials, UserProfile
+from password_hasher import password_hasher, HasherOverloaded
+from queries import DatabaseQueries, arun, create_user_failed, new_user
+from supabase_clients import supabase_clients
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase(DatabaseQueries):
+    @property
+    def client(self) -> AsyncClient:
+        """Shared AsyncClient (opened by the app lifespan or connect())"""
+        return supabase_clients.current_async
+
+    async def connect(self) -> AsyncClient:
+        """Shared AsyncClient from the registry, opening it if needed"""
+        return await supabase_clients.async_client()
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password using bcrypt (in the password hashing pool)"""
+        return await password_hasher.hash_async(password)
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        """Verify a password against its hash (in the password hashing pool)"""
+        try:
+            return await password_hasher.verify_async(password, hashed)
+        except HasherOverloaded:
+            raise
+        except Exception as e:
+            logger.error(f"Password verification error: {e}")
+            return False
+
+    async def set_password_hash(self, user_id: Any, hashed: str) -> bool:
+        """Replace a user's stored hash (e.g. after a cost change)"""
+        return await arun(self._set_password_hash(await self.connect(), user_id, hashed))
+
+    async def create_user(
+        self,
+        email: str,
+        password: str,
+        full_name: str,
+        verification_token: str,
+        vehicle_model: str = None,
+        battery_capacity: float = None,
+        avatar_url: str = None,
+        country: str = "India",
+        role: str = "user"
+    ) -> Dict[str, Any]:
+        """Create a new user in Supabase with all fields"""
+        try:
+            hashed_password = await self.hash_password(password)
+        except HasherOverloaded:
+            raise
+        except Exception as e:
+            return create_user_failed(e)
+        user_data = new_user(email, hashed_password, full_name, verification_token, vehicle_model,
+                             battery_capacity, avatar_url, country, role)
+        return await arun(self._create_user(await self.connect(), user_data))
+
+    async def get_user_by_email(self, email: str) -> Optional[UserProfile]:
+        """Get user by email (cached, without password_hash)"""
+        return await arun(self._get_user_by_email(await self.connect(), email))
+
+    async def get_user_for_login(self, email: str) -> Optional[UserCredentials]:
+        """Get the user with password_hash, straight from the database"""
+        return await arun(self._find_user(await self.connect(), "email", email, UserCredentials,
+                                          what="user for login"))
+
+    async def get_user_by_id(self, user_id: str) -> Optional[UserProfile]:
+        """Get user by ID (cached, without password_hash)"""
+        return await arun(self._get_user_by_id(await self.connect(), user_id))
+
+    async def get_user_by_token(self, token: str) -> Optional[UserProfile]:
+        """Get user by verification token"""
+        return await arun(self._find_user(await self.connect(), "verification_token", token, what="user by token"))
+
+    async def add_charger(self, charger_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a new charger to the database"""
+        return await arun(self._add_charger(await self.connect(), charger_data))
+
+    async def update_charger_status(self, charger_id: Any, status: str) -> Dict[str, Any]:
+        """Change a charger's status and push the new row into the catalog"""
+        return await arun(self._update_charger_status(await self.connect(), charger_id, status))
+
+    async def update_charger_statuses(self, charger_ids: List[Any], status: str) -> Dict[str, Any]:
+        """Set the same status on many chargers in one update and push the rows into the catalog"""
+        return await arun(self._update_charger_statuses(await self.connect(), charger_ids, status))
+
+    async def verify_user(self, token: str) -> bool:
+        """Mark user as verified"""
+        return await arun(self._verify_user(await self.connect(), token))
+
+    async def update_user(self, email: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Update user profile data"""
+        return await arun(self._update_user(await self.connect(), email, updates))
+
+    async def cancel_booking(self, booking_id: Any) -> Dict[str, Any]:
+        """Mark a booking Cancelled and release its slot in the occupancy index"""
+        return await arun(self._cancel_booking(await self.connect(), booking_id))
+
+    async def start_charging_session(self, user_id: Any, charger_id: Any) -> Dict[str, Any]:
+        """
+        Insert a Confirmed booking starting now (Confirmed = charging) with a
+        1 hour placeholder end, replaced when the session completes
+        """
+        return await arun(self._start_charging_session(await self.connect(), user_id, charger_id))
+
+    async def get_charging_session(self, booking_id: Any) -> Optional[Dict[str, Any]]:
+        """A running session (Confirmed booking that has started) by id, from the database"""
+        return await arun(self._get_charging_session(await self.connect(), booking_id))
+
+    async def get_active_session(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        """The user's running session from the database (raises on query errors)"""
+        return await arun(self._get_active_session(await self.connect(), user_id))
+
+    async def complete_charging_session(self, booking_id: Any, usage: Dict[str, float],
+                                        charger_id: Any = None) -> Dict[str, Any]:
+        """
+        Mark a running session Completed with its metered usage, ending it now.
+        With charger_id, only if the session is on that charger.
+        """
+        return await arun(self._complete_charging_session(await self.connect(), booking_id, usage, charger_id))
+
+    async def get_bookings(self, user_id: str, limit: int = 5, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of upcoming bookings for a user, soonest first (raises InvalidCursor)"""
+        return await arun(self._get_bookings(await self.connect(), user_id, limit, cursor))
+
+    async def get_conversations(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get a page of a user's conversations, newest first (raises InvalidCursor)"""
+        return await arun(self._get_conversations(await self.connect(), user_id, limit, cursor))
+
+    async def get_messages(self, conversation_id: str, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a page of messages, walking back from the newest. Each page is
+        returned in chronological order; next_cursor points at older messages.
+        Raises InvalidCursor for a cursor it didn't produce.
+        """
+        return await arun(self._get_messages(await self.connect(), conversation_id, limit, cursor))
+
+    async def create_booking_if_available(self, booking_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Create a booking ONLY IF the slot is available, in one book_slot RPC
+        call guarded by the bookings_no_overlap exclusion constraint
+        """
+        return await arun(self._create_booking_if_available(await self.connect(), booking_data))
+
+    async def get_busy_intervals(self, charger_ids: List[Any], window_start: str, window_end: str) -> Dict[str, Any]:
+        """
+        Fetch every non-cancelled booking overlapping the window for all the
+        given chargers, grouped into per-charger busy intervals. Chunks are
+        queried concurrently.
+        """
+        return await arun(self._get_busy_intervals(await self.connect(), charger_ids, window_start, window_end))
+
+    async def clear_user_history(self, user_id: Any) -> Dict[str, Any]:
+        """Delete all Completed or Cancelled bookings for a user, archived ones included"""
+        return await arun(self._clear_user_history(await self.connect(), user_id))
+
+
+# Create singleton instance
+adb = AsyncDatabase()
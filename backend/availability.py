@@ -0,0 +1,72 @@
+"""
+Charger availability helpers
+In-memory interval arithmetic over booking rows, so a whole search window can
+be checked after a single bookings query instead of one query per slot.
+"""
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+def parse_timestamp(value) -> datetime:
+    """
+    Parse an ISO timestamp into a naive UTC datetime.
+    Naive inputs are kept as-is, which matches how PostgREST compares naive
+    filter strings against timestamptz columns.
+    """
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+class BusyIntervals:
+    """Sorted busy intervals for one charger with O(log n) overlap checks"""
+    __slots__ = ("starts", "ends", "_max_end")
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, datetime]]):
+        intervals = sorted(intervals)
+        self.starts = [s for s, _ in intervals]
+        self.ends = [e for _, e in intervals]
+        # Running max of end times lets us answer "does anything that starts
+        # before X end after Y?" with one bisect.
+        self._max_end = []
+        running = None
+        for e in self.ends:
+            running = e if running is None or e > running else running
+            self._max_end.append(running)
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """True if [start, end) overlaps no busy interval"""
+        idx = bisect_left(self.starts, end)
+        return idx == 0 or self._max_end[idx - 1] <= start
+
+    def free_mask(self, slot_starts: np.ndarray, slot_ends: np.ndarray) -> np.ndarray:
+        """Vectorized is_free over arrays of datetime64 slot bounds"""
+        if not self.starts:
+            return np.ones(len(slot_starts), dtype=bool)
+        starts = np.array(self.starts, dtype="datetime64[s]")
+        ends = np.array(self.ends, dtype="datetime64[s]")
+        overlap = (starts[None, :] < slot_ends[:, None]) & (ends[None, :] > slot_starts[:, None])
+        return ~overlap.any(axis=1)
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def group_busy_intervals(rows: List[Dict[str, Any]]) -> Dict[Any, BusyIntervals]:
+    """Group booking rows (charger_id, start_time, end_time) into per-charger intervals"""
+    grouped: Dict[Any, list] = {}
+    for row in rows:
+        grouped.setdefault(row["charger_id"], []).append(
+            (parse_timestamp(row["start_time"]), parse_timestamp(row["end_time"]))
+        )
+    return {charger_id: BusyIntervals(intervals) for charger_id, intervals in grouped.items()}
+
+
+EMPTY = BusyIntervals([])
@@ -0,0 +1,23 @@
+"""
+Shared helpers for the bench_*.py scripts
+"""
+import os
+from typing import Optional
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def print_table(rows):
+    """Print a list of same-keyed dicts as a markdown table"""
+    headers = list(rows[0].keys())
+    print("| " + " | ".join(headers) + " |")
+    print("|" + "|".join("---" for _ in headers) + "|")
+    for row in rows:
+        print("| " + " | ".join(str(row[h]) for h in headers) + " |")
@@ -0,0 +1,93 @@
+"""
+Login throughput benchmark
+Measures password verification throughput, the CPU-bound half of /api/login,
+through PasswordHasher at several pool sizes, plus an in-process baseline.
+Prints requests/second overall and per core (pool worker), with p50/p95
+latency, as a markdown table.
+
+Usage:
+    python bench_login.py
+    python bench_login.py --rounds 10 --workers 1,2,4 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import bcrypt
+
+from bench_common import print_table
+from password_hasher import PasswordHasher
+
+PASSWORD = "correct horse battery staple"
+
+
+def bench_inline(hashed: bytes, n: int) -> dict:
+    """Sequential bcrypt on the calling thread: what a sync endpoint did before"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        bcrypt.checkpw(PASSWORD.encode('utf-8'), hashed)
+        latencies.append(time.perf_counter() - t)
+    return _row("inline", 1, n, time.perf_counter() - started, latencies)
+
+
+async def bench_pool(hashed: str, rounds: int, workers: int, n: int) -> dict:
+    """n concurrent verifications through a pool of `workers` processes"""
+    hasher = PasswordHasher(rounds=rounds, max_workers=workers, max_pending=n)
+    try:
+        # Warm up: spawn every worker before timing
+        await asyncio.gather(*(hasher.verify_async(PASSWORD, hashed) for _ in range(workers)))
+
+        async def one():
+            t = time.perf_counter()
+            ok = await hasher.verify_async(PASSWORD, hashed)
+            assert ok
+            return time.perf_counter() - t
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(n)))
+        return _row(f"pool-{workers}", workers, n, time.perf_counter() - started, latencies)
+    finally:
+        hasher.shutdown()
+
+
+def _row(name: str, cores: int, n: int, elapsed: float, latencies) -> dict:
+    quantiles = statistics.quantiles(latencies, n=20)
+    return {
+        "mode": name,
+        "cores": cores,
+        "requests": n,
+        "rps": round(n / elapsed, 1),
+        "rps_per_core": round(n / elapsed / cores, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(quantiles[18] * 1000, 1),
+    }
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, max(1, cpus // 2), cpus})
+    parser = argparse.ArgumentParser(description="Benchmark login password verification throughput")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--workers", default=",".join(str(w) for w in default_workers),
+                        help="Comma-separated pool sizes")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(args.rounds))
+    print(f"bcrypt cost {args.rounds}, {cpus} CPUs, {args.requests} logins per run")
+
+    rows = [bench_inline(hashed, max(10, args.requests // 10))]
+    for workers in (int(w) for w in args.workers.split(",") if w.strip()):
+        print(f"Benchmarking pool of {workers}...")
+        rows.append(asyncio.run(bench_pool(hashed.decode('utf-8'), args.rounds, workers, args.requests)))
+
+    print()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Solar ML benchmark harness
+Trains a matrix of model configurations on the same synthetic data and
+measures each one through SolarMLService against a fixed evaluation set:
+prediction error, single-row and batch inference latency, training time, and
+for the saved joblib artifact its size on disk, load time and the resident
+memory it adds once loaded. The service is built from that artifact, not from
+the ml_service singleton (which loads or trains its own model). Load time and
+resident memory are measured in a fresh process per artifact, so allocator
+reuse from earlier configurations doesn't hide the model's footprint (Linux;
+resident_mb is blank where /proc/self/statm is missing). Prints a markdown
+table (optionally CSV).
+
+Usage:
+    python bench_solar_ml.py
+    python bench_solar_ml.py --train-samples 200000 --configs rf-100,et-100,hgb --csv bench.csv
+"""
+import argparse
+import csv
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import joblib
+import numpy as np
+
+from bench_common import print_table, rss_bytes
+from solar_training import build_model, evaluate_model, generate_synthetic_data
+
+# Fixed evaluation set: same seed/size on every run so numbers are comparable
+EVAL_SEED = 20260214
+EVAL_SAMPLES = 20000
+
+
+def _model_matrix():
+    """Name -> factory for every configuration the harness knows about"""
+    from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor
+    from sklearn.linear_model import Ridge
+
+    configs = {}
+    for n in (25, 50, 100, 200):
+        configs[f"rf-{n}"] = lambda n=n: build_model(n_estimators=n)
+        for depth in (8, 12):
+            configs[f"rf-{n}-d{depth}"] = lambda n=n, depth=depth: build_model(n_estimators=n, max_depth=depth)
+    for n in (50, 100):
+        configs[f"et-{n}"] = lambda n=n: ExtraTreesRegressor(n_estimators=n, random_state=42)
+    configs["hgb"] = lambda: HistGradientBoostingRegressor(random_state=42)
+    configs["ridge"] = lambda: Ridge()
+    return configs
+
+
+def load_eval_set(path: str = None):
+    """Evaluation set from an .npz file (hour, cloud_cover, radiation, efficiency) or the fixed seed"""
+    if path:
+        import pandas as pd
+        data = np.load(path)
+        X = pd.DataFrame({k: data[k] for k in ('hour', 'cloud_cover', 'radiation')})
+        return X, data['efficiency']
+    return generate_synthetic_data(EVAL_SAMPLES, seed=EVAL_SEED)
+
+
+def _percentiles_ms(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples) * 1000, p95 * 1000
+
+
+def _load_artifact(path):
+    """(load seconds, resident bytes added) for a joblib artifact; run in a fresh process"""
+    import gc
+    # Import what unpickling needs first, so only the model itself is counted
+    import sklearn.ensemble
+    import sklearn.linear_model
+
+    gc.collect()
+    before = rss_bytes()
+    t0 = time.perf_counter()
+    model = joblib.load(path)
+    load_s = time.perf_counter() - t0
+    gc.collect()
+    after = rss_bytes()
+    del model
+    return load_s, None if before is None else after - before
+
+
+def bench_config(name, factory, X_train, y_train, X_eval, y_eval, artifact_dir: str,
+                 repeats: int = 200, batch_size: int = 48):
+    from ml_service import SolarMLService
+
+    model = factory()
+    t0 = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_s = time.perf_counter() - t0
+
+    artifact = os.path.join(artifact_dir, f"{name}.joblib")
+    joblib.dump(model, artifact)
+    del model
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        load_s, resident = pool.submit(_load_artifact, artifact).result()
+
+    model = joblib.load(artifact)
+    service = SolarMLService(model=model, model_version=name)
+    errors = evaluate_model(model, X_eval, y_eval)
+
+    hours = X_eval['hour'].values
+    cloud = X_eval['cloud_cover'].values
+    rad = X_eval['radiation'].values
+
+    single = []
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        service.predict_efficiency(int(hours[i]), float(cloud[i]), float(rad[i]))
+        single.append(time.perf_counter() - t0)
+
+    batch = []
+    for i in range(repeats):
+        lo = (i * batch_size) % (len(hours) - batch_size)
+        t0 = time.perf_counter()
+        service.predict_efficiency_batch(hours[lo:lo + batch_size], cloud[lo:lo + batch_size], rad[lo:lo + batch_size])
+        batch.append(time.perf_counter() - t0)
+
+    single_p50, single_p95 = _percentiles_ms(single)
+    batch_p50, batch_p95 = _percentiles_ms(batch)
+    service.executor.shutdown()
+    return {
+        "config": name,
+        "mae": round(errors["mae"], 3),
+        "rmse": round(errors["rmse"], 3),
+        "single_p50_ms": round(single_p50, 3),
+        "single_p95_ms": round(single_p95, 3),
+        f"batch{batch_size}_p50_ms": round(batch_p50, 3),
+        f"batch{batch_size}_p95_ms": round(batch_p95, 3),
+        "artifact_mb": round(os.path.getsize(artifact) / 1e6, 2),
+        "resident_mb": None if resident is None else round(resident / 1e6, 2),
+        "load_ms": round(load_s * 1000, 1),
+        "train_s": round(train_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark solar ML model configurations")
+    parser.add_argument("--train-samples", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--configs", default="rf-25,rf-50,rf-100,rf-100-d12,et-100,hgb,ridge",
+                        help="Comma-separated config names, or 'all'")
+    parser.add_argument("--eval-file", default=None, help="Optional .npz evaluation set")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--csv", default=None, help="Also write results to this CSV file")
+    args = parser.parse_args()
+
+    matrix = _model_matrix()
+    names = list(matrix) if args.configs == "all" else [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = [n for n in names if n not in matrix]
+    if unknown:
+        parser.error(f"Unknown configs: {', '.join(unknown)} (available: {', '.join(matrix)})")
+
+    X_train, y_train = generate_synthetic_data(args.train_samples, seed=args.seed)
+    X_eval, y_eval = load_eval_set(args.eval_file)
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_solar_ml_") as artifact_dir:
+        for name in names:
+            print(f"Benchmarking {name}...")
+            rows.append(bench_config(name, matrix[name], X_train, y_train, X_eval, y_eval, artifact_dir,
+                                     repeats=args.repeats))
+
+    print()
+    print_table(rows)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Booking archiver
+Background job that moves Completed/Cancelled bookings older than
+BOOKING_ARCHIVE_AFTER_DAYS from `bookings` to `bookings_archive` through the
+archive_bookings RPC (migrations/0008_bookings_archive.sql), one batch per call,
+so overlap checks and user listings only ever touch live bookings. Their
+session_meter_minutes move to session_meter_minutes_archive in the same
+transaction (0013_session_meter_minutes_archive.sql).
+
+Each run drains up to BOOKING_ARCHIVE_MAX_BATCHES batches; the RPC uses
+SKIP LOCKED, so every worker process can run its own archiver safely.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from postgrest.exceptions import APIError
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("BOOKING_ARCHIVE_AFTER_DAYS", "30"))
+BATCH_SIZE = int(os.getenv("BOOKING_ARCHIVE_BATCH", "500"))
+MAX_BATCHES = int(os.getenv("BOOKING_ARCHIVE_MAX_BATCHES", "20"))
+INTERVAL = float(os.getenv("BOOKING_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+class BookingArchiver:
+    def __init__(self, after_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = BATCH_SIZE,
+                 max_batches: int = MAX_BATCHES, interval: float = INTERVAL):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.interval = interval
+        self.enabled = True
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"runs": 0, "archived_total": 0, "last_run_archived": 0,
+                       "last_run_seconds": None, "last_error": None}
+
+    def run_once(self) -> int:
+        """Archive up to max_batches batches; returns rows moved"""
+        from database import db, RPC_MISSING
+        started = time.perf_counter()
+        moved = 0
+        try:
+            for _ in range(self.max_batches):
+                if self._stop.is_set():
+                    break
+                res = db.client.rpc("archive_bookings", {
+                    "p_older_than_days": self.after_days,
+                    "p_batch_size": self.batch_size,
+                }).execute()
+                batch = res.data or 0
+                moved += batch
+                if batch < self.batch_size:
+                    break
+        except APIError as e:
+            if e.code != RPC_MISSING:
+                raise
+            logger.warning("archive_bookings RPC not found; run migrate.py (0008_bookings_archive). Archiver disabled.")
+            self.enabled = False
+        finally:
+            self._stats["runs"] += 1
+            self._stats["archived_total"] += moved
+            self._stats["last_run_archived"] = moved
+            self._stats["last_run_seconds"] = round(time.perf_counter() - started, 3)
+        if moved:
+            logger.info(f"Archived {moved} bookings older than {self.after_days} days")
+        return moved
+
+    def _run(self):
+        while self.enabled and not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+                self._stats["last_error"] = None
+            except Exception as e:
+                self._stats["last_error"] = str(e)
+                logger.error(f"Booking archival failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="booking-archiver", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def metrics(self) -> dict:
+        return {"enabled": self.enabled, "after_days": self.after_days, "batch_size": self.batch_size,
+                **self._stats}
+
+
+booking_archiver = BookingArchiver()
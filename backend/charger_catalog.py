@@ -0,0 +1,178 @@
+"""
+In-process charger catalog
+Holds the chargers table in memory as immutable, versioned snapshots so request
+handlers never download the whole table. Readers grab one snapshot and use it
+for the whole request; writers build a new snapshot and swap the reference, so
+nobody ever sees a half-applied update.
+
+Invalidation:
+- Database.add_charger / update_charger_status push the changed row in, and
+  AsyncDatabase.update_charger_statuses (OCPP gateway) a batch of them
+- a background poller reloads when max(updated_at) moves past the watermark
+  (see migrations/0006_chargers_updated_at.sql) or the snapshot is older than
+  CHARGER_CATALOG_MAX_AGE seconds (catches deletes and out-of-band edits)
+"""
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Optional
+
+from postgrest.exceptions import APIError
+
+from repository import CHARGER_FIELDS, column_missing, has_column, projection
+from spatial_index import charger_index
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("CHARGER_CATALOG_POLL_SECONDS", "30"))
+MAX_AGE = float(os.getenv("CHARGER_CATALOG_MAX_AGE", "600"))
+
+
+class CatalogSnapshot:
+    """Immutable view of the chargers table at one version"""
+    __slots__ = ("version", "chargers", "by_id", "watermark", "loaded_at")
+
+    def __init__(self, version: int, rows: Iterable[Dict[str, Any]], watermark: Optional[str], loaded_at: float):
+        self.version = version
+        self.chargers = tuple(MappingProxyType(dict(r)) for r in rows)
+        self.by_id = MappingProxyType({c['id']: c for c in self.chargers})
+        self.watermark = watermark
+        self.loaded_at = loaded_at
+
+    def get(self, charger_id: Any):
+        """Charger row by id (accepts the id as int or numeric string)"""
+        charger = self.by_id.get(charger_id)
+        if charger is None and isinstance(charger_id, str) and charger_id.isdigit():
+            charger = self.by_id.get(int(charger_id))
+        return charger
+
+    def __len__(self):
+        return len(self.chargers)
+
+
+def _watermark(rows) -> Optional[str]:
+    stamps = [r.get('updated_at') or r.get('created_at') for r in rows]
+    stamps = [s for s in stamps if s]
+    return max(stamps) if stamps else None
+
+
+class ChargerCatalog:
+    def __init__(self, poll_interval: float = POLL_INTERVAL, max_age: float = MAX_AGE):
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._has_updated_at = True
+
+    def _fetch_rows(self):
+        from database import db
+        while True:
+            try:
+                response = db.client.table("chargers").select(projection("chargers", CHARGER_FIELDS)).execute()
+                return response.data or []
+            except APIError as e:
+                # Optional columns missing until their migrations are applied
+                if not column_missing("chargers", e):
+                    raise
+                if not has_column("chargers", "updated_at"):
+                    self._has_updated_at = False
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Current snapshot, loading the table on first use"""
+        snap = self._snapshot
+        if snap is None:
+            snap = self.refresh()
+        return snap
+
+    def get(self, charger_id: Any):
+        return self.snapshot().get(charger_id)
+
+    def refresh(self) -> CatalogSnapshot:
+        """Reload the full table and swap in a new snapshot"""
+        rows = self._fetch_rows()
+        with self._write_lock:
+            version = (self._snapshot.version + 1) if self._snapshot else 1
+            snap = CatalogSnapshot(version, rows, _watermark(rows), time.monotonic())
+            charger_index.build(snap.chargers)
+            self._snapshot = snap
+        logger.info(f"Charger catalog loaded: {len(snap)} chargers (version {snap.version})")
+        return snap
+
+    def invalidate(self):
+        """Drop the snapshot; the next reader reloads"""
+        with self._write_lock:
+            self._snapshot = None
+
+    def apply_upsert(self, row: Dict[str, Any]):
+        """Copy-on-write update for a single added or changed charger"""
+        self.apply_upserts([row])
+
+    def apply_upserts(self, changed: Iterable[Dict[str, Any]]):
+        """Copy-on-write update for a batch of added or changed chargers (one new snapshot)"""
+        changed = list(changed)
+        if not changed:
+            return
+        with self._write_lock:
+            current = self._snapshot
+            if current is None:
+                return  # Nothing loaded yet; the first reader picks the rows up
+            rows = dict(current.by_id)
+            stamps = [current.watermark]
+            for row in changed:
+                rows[row['id']] = row
+                stamps.append(row.get('updated_at') or row.get('created_at'))
+            watermark = max(filter(None, stamps), default=None)
+            self._snapshot = CatalogSnapshot(current.version + 1, rows.values(), watermark, current.loaded_at)
+            for row in changed:
+                charger_index.upsert(row)
+
+    def poll_once(self):
+        """Reload if the table changed since the snapshot's watermark"""
+        snap = self._snapshot
+        if snap is None or time.monotonic() - snap.loaded_at > self.max_age:
+            self.refresh()
+            return
+        if not self._has_updated_at:
+            return
+        from database import db
+        try:
+            res = db.client.table("chargers").select("updated_at").order("updated_at", desc=True).limit(1).execute()
+        except Exception as e:
+            # Column missing until the migration is applied; fall back to max-age reloads
+            logger.warning(f"Charger catalog watermark polling disabled: {e}")
+            self._has_updated_at = False
+            return
+        latest = res.data[0].get('updated_at') if res.data else None
+        if latest and (snap.watermark is None or latest > snap.watermark):
+            self.refresh()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Charger catalog poll failed: {e}")
+
+    def start(self):
+        """Load now and start the background poller"""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Charger catalog initial load failed: {e}")
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="charger-catalog-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+charger_catalog = ChargerCatalog()
@@ -0,0 +1,239 @@
+"""
+Active charging session registry
+Confirmed bookings (Confirmed = charging, see /api/charge/control) kept in
+memory by user and by charger, loaded from `bookings` at startup and kept
+current on every booking write this process makes. A booking counts as an
+active session once its start_time has passed; until then it is only a
+reservation. Status checks become dictionary lookups, and start/stop skip
+their "is there a session?" query.
+
+Changes are pushed to subscribers (the /api/charge/events stream) as the
+user's full session state, so clients stop polling. A periodic reload picks
+up sessions started or stopped by other workers, and reservations whose
+start_time has arrived, and pushes those too; writes are still confirmed by
+the database (stop only completes a booking that is still Confirmed there).
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from availability import parse_timestamp
+from repository import Booking, columns
+
+logger = logging.getLogger(__name__)
+
+RELOAD_INTERVAL = float(os.getenv("CHARGING_SESSIONS_RELOAD_SECONDS", "30"))
+PAGE_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 16
+
+ACTIVE_STATUS = "Confirmed"
+
+
+def _key(value: Any) -> str:
+    # user_id arrives as a string from requests and as an int from bookings rows
+    return str(value)
+
+
+class ChargingSessions:
+    def __init__(self, reload_interval: float = RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._sessions: Dict[str, Dict[str, Any]] = {}          # booking id -> row
+        self._started: Dict[str, datetime] = {}                  # booking id -> start_time
+        self._by_user: Dict[str, Set[str]] = {}
+        self._by_charger: Dict[str, Set[str]] = {}
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"reloads": 0, "events_published": 0, "events_dropped": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    # ---- queries ---------------------------------------------------------
+
+    def _first_locked(self, booking_ids: Optional[Set[str]], now: datetime) -> Optional[Dict[str, Any]]:
+        started = [b for b in booking_ids or () if self._started[b] <= now]
+        if not started:
+            return None
+        return self._sessions[min(started, key=lambda b: (len(b), b))]
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def for_user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        """The user's active session (oldest booking if several), or None"""
+        with self._lock:
+            return self._first_locked(self._by_user.get(_key(user_id)), self._now())
+
+    def for_charger(self, charger_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._first_locked(self._by_charger.get(_key(charger_id)), self._now())
+
+    def get(self, booking_id: Any) -> Optional[Dict[str, Any]]:
+        """A tracked Confirmed booking by id, started or not"""
+        with self._lock:
+            return self._sessions.get(_key(booking_id))
+
+    def state(self, user_id: Any) -> Dict[str, Any]:
+        """Session state as returned by action=status and pushed to subscribers"""
+        session = self.for_user(user_id)
+        return {"is_charging": session is not None, "session": session}
+
+    # ---- maintenance -----------------------------------------------------
+
+    def _add_locked(self, row: Dict[str, Any]):
+        booking_id = _key(row["id"])
+        self._sessions[booking_id] = row
+        self._started[booking_id] = parse_timestamp(row["start_time"])
+        self._by_user.setdefault(_key(row["user_id"]), set()).add(booking_id)
+        self._by_charger.setdefault(_key(row["charger_id"]), set()).add(booking_id)
+
+    def _remove_locked(self, booking_id: str) -> Optional[Dict[str, Any]]:
+        row = self._sessions.pop(booking_id, None)
+        if row is None:
+            return None
+        del self._started[booking_id]
+        for index, key in ((self._by_user, _key(row["user_id"])), (self._by_charger, _key(row["charger_id"]))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(booking_id)
+                if not ids:
+                    del index[key]
+        return row
+
+    def load(self, rows: List[Dict[str, Any]]):
+        """Replace the registry with the given Confirmed booking rows"""
+        now = self._now()
+        with self._lock:
+            before = {user: self._first_locked(ids, now) for user, ids in self._by_user.items()}
+            self._sessions, self._started, self._by_user, self._by_charger = {}, {}, {}, {}
+            for row in rows:
+                self._add_locked(row)
+            after = {user: self._first_locked(ids, now) for user, ids in self._by_user.items()}
+            self._loaded = True
+        for user_id in before.keys() | after.keys():
+            if before.get(user_id) != after.get(user_id):
+                self._publish(user_id)
+
+    def upsert_booking(self, row: Dict[str, Any]):
+        """Apply a created/updated booking row (anything not Confirmed is removed)"""
+        booking_id = _key(row["id"])
+        with self._lock:
+            previous = self._remove_locked(booking_id)
+            if row.get("status") == ACTIVE_STATUS:
+                self._add_locked(row)
+        if previous is not None and _key(previous["user_id"]) != _key(row["user_id"]):
+            self._publish(_key(previous["user_id"]))
+        if previous is not None or row.get("status") == ACTIVE_STATUS:
+            self._publish(_key(row["user_id"]))
+
+    def remove_booking(self, booking_id: Any):
+        with self._lock:
+            row = self._remove_locked(_key(booking_id))
+        if row is not None:
+            self._publish(_key(row["user_id"]))
+
+    # ---- push ------------------------------------------------------------
+
+    def subscribe(self, user_id: Any) -> asyncio.Queue:
+        """Queue of session states for one user, starting with the current one"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        queue.put_nowait(self.state(user_id))
+        with self._lock:
+            self._subscribers.setdefault(_key(user_id), set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: Any, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(_key(user_id))
+            if subscribers is None:
+                return
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                del self._subscribers[_key(user_id)]
+
+    def _deliver(self, queue: asyncio.Queue, state: Dict[str, Any]):
+        # States are complete snapshots, so a slow reader only needs the newest
+        if queue.full():
+            queue.get_nowait()
+            self._stats["events_dropped"] += 1
+        queue.put_nowait(state)
+
+    def _publish(self, user_id: str):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        state = self.state(user_id)
+        for loop, queue in subscribers:
+            try:
+                # Writes may come from the threadpool (sync Database) or the loop itself
+                loop.call_soon_threadsafe(self._deliver, queue, state)
+            except RuntimeError:
+                self.unsubscribe(user_id, queue)   # loop closed
+                continue
+            self._stats["events_published"] += 1
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def reload(self):
+        """Rebuild from the bookings table"""
+        from database import db
+        rows, offset = [], 0
+        while True:
+            res = db.client.table("bookings")\
+                .select(columns(Booking))\
+                .eq("status", ACTIVE_STATUS)\
+                .order("id")\
+                .range(offset, offset + PAGE_SIZE - 1)\
+                .execute()
+            page = res.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        self.load(rows)
+        self._stats["reloads"] += 1
+        logger.info(f"Charging sessions loaded: {len(rows)} active for {len(self._by_user)} users")
+
+    def _run(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Charging sessions reload failed: {e}")
+
+    def start(self):
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error(f"Charging sessions initial load failed: {e}")
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="charging-sessions-reload", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "tracked_bookings": len(self._sessions),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                **self._stats,
+            }
+
+
+charging_sessions = ChargingSessions()
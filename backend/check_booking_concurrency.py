@@ -0,0 +1,168 @@
+"""
+Double-booking check for the bookings_no_overlap constraint and book_slot RPC
+Applies the booking migrations (0007, 0008, 0011) to a scratch schema on a
+local Postgres with the btree_gist extension available (stock postgresql
+contrib), fires concurrent book_slot calls at it and checks that no two
+non-cancelled bookings on the same charger overlap, and that book_slot returns
+exactly the booking columns. Needs psycopg (requirements-dev.txt), not
+Supabase.
+
+    python check_booking_concurrency.py --dsn postgresql://postgres@localhost/postgres
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATIONS = ("0007_bookings_no_overlap.sql", "0008_bookings_archive.sql", "0011_bookings_drop_period.sql")
+BOOKING_COLUMNS = ["id", "user_id", "charger_id", "start_time", "end_time", "energy_kwh", "total_cost",
+                   "status", "created_at"]
+EXCLUSION_VIOLATION = "23P01"
+
+# Same columns as setup_tables.sql, without the foreign keys
+BOOKINGS_DDL = """
+create table {schema}.bookings (
+  id bigint generated by default as identity primary key,
+  user_id bigint not null,
+  charger_id bigint not null,
+  start_time timestamp with time zone not null,
+  end_time timestamp with time zone not null,
+  energy_kwh float,
+  total_cost float,
+  status text check (status in ('Pending', 'Confirmed', 'Completed', 'Cancelled')) default 'Pending',
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null
+)
+"""
+
+
+def setup(dsn: str, schema: str):
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(f"drop schema if exists {schema} cascade")
+        conn.execute(f"create schema {schema}")
+        conn.execute(BOOKINGS_DDL.format(schema=schema))
+        for name in MIGRATIONS:
+            conn.execute((MIGRATIONS_DIR / name).read_text().replace("public.", f"{schema}."))
+
+
+def teardown(dsn: str, schema: str):
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(f"drop schema if exists {schema} cascade")
+
+
+def fire(dsn: str, schema: str, bookings):
+    """Call book_slot once per booking, all released at the same instant"""
+    barrier = threading.Barrier(len(bookings))
+    outcomes = [None] * len(bookings)
+
+    def worker(i, booking):
+        with psycopg.connect(dsn, autocommit=True) as conn:
+            barrier.wait()
+            try:
+                conn.execute(f"select id from {schema}.book_slot(%s)", [Jsonb(booking)]).fetchone()
+                outcomes[i] = "booked"
+            except psycopg.Error as e:
+                outcomes[i] = "conflict" if e.sqlstate == EXCLUSION_VIOLATION else f"error {e.sqlstate}: {e}"
+
+    threads = [threading.Thread(target=worker, args=(i, b)) for i, b in enumerate(bookings)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+def returned_columns(dsn: str, schema: str, booking: dict) -> list:
+    """Column names of a book_slot result row (rolled back)"""
+    with psycopg.connect(dsn) as conn:
+        cursor = conn.execute(f"select * from {schema}.book_slot(%s)", [Jsonb(booking)])
+        conn.rollback()
+        return [c.name for c in cursor.description]
+
+
+def overlapping_pairs(dsn: str, schema: str) -> int:
+    with psycopg.connect(dsn) as conn:
+        return conn.execute(f"""
+            select count(*) from {schema}.bookings a join {schema}.bookings b
+              on a.charger_id = b.charger_id and a.id < b.id
+             and a.status <> 'Cancelled' and b.status <> 'Cancelled'
+             and a.start_time < b.end_time and b.start_time < a.end_time
+        """).fetchone()[0]
+
+
+def booking(charger_id: int, start: datetime, hours: float, user_id: int) -> dict:
+    return {
+        "user_id": user_id,
+        "charger_id": charger_id,
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(hours=hours)).isoformat(),
+        "status": "Confirmed",
+        "energy_kwh": 10.0,
+        "total_cost": 120.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL", "postgresql://postgres@localhost/postgres"))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--schema", default="booking_concurrency_check")
+    args = parser.parse_args()
+
+    base = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    failures = []
+    setup(args.dsn, args.schema)
+    try:
+        # 1. Everyone wants the same slot: exactly one may win
+        outcomes = fire(args.dsn, args.schema, [booking(1, base, 2, i) for i in range(args.requests)])
+        booked = outcomes.count("booked")
+        errors = [o for o in outcomes if o not in ("booked", "conflict")]
+        print(f"same slot:    {booked} booked, {outcomes.count('conflict')} conflicts, {len(errors)} errors")
+        if booked != 1 or errors:
+            failures.append(f"same slot: expected 1 booking and no errors, got {booked} and {errors[:3]}")
+
+        # 2. Random overlapping windows over a few chargers; back-to-back
+        # bookings are allowed, overlapping ones are not
+        rng = random.Random(7)
+        bookings = [
+            booking(rng.randint(2, 4), base + timedelta(minutes=15 * rng.randint(0, 32)), rng.choice([0.5, 1, 2]), i)
+            for i in range(args.requests)
+        ]
+        outcomes = fire(args.dsn, args.schema, bookings)
+        errors = [o for o in outcomes if o not in ("booked", "conflict")]
+        pairs = overlapping_pairs(args.dsn, args.schema)
+        print(f"random slots: {outcomes.count('booked')} booked, {outcomes.count('conflict')} conflicts, "
+              f"{len(errors)} errors, {pairs} overlapping pairs")
+        if pairs or errors:
+            failures.append(f"random slots: {pairs} overlapping pairs, errors {errors[:3]}")
+
+        # 3. A cancelled booking frees its slot
+        with psycopg.connect(args.dsn, autocommit=True) as conn:
+            conn.execute(f"update {args.schema}.bookings set status = 'Cancelled' where charger_id = 1")
+        outcomes = fire(args.dsn, args.schema, [booking(1, base, 2, 0)])
+        print(f"after cancel: {outcomes[0]}")
+        if outcomes != ["booked"]:
+            failures.append(f"after cancel: expected booked, got {outcomes[0]}")
+
+        # 4. book_slot returns the booking columns and nothing else
+        columns = returned_columns(args.dsn, args.schema, booking(5, base, 1, 0))
+        print(f"columns:      {', '.join(columns)}")
+        if columns != BOOKING_COLUMNS:
+            failures.append(f"columns: expected {BOOKING_COLUMNS}, got {columns}")
+    finally:
+        teardown(args.dsn, args.schema)
+
+    if failures:
+        print("FAIL\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: no double bookings")
+
+
+if __name__ == "__main__":
+    main()
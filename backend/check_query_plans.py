@@ -0,0 +1,169 @@
+"""
+Query-plan check for the hot queries
+Creates a scratch database on a local Postgres, runs every migration with
+migrate.py, seeds it, and EXPLAINs each query the backend runs per request.
+Fails if any of them reads bookings/users/conversations/messages/
+session_meter_minutes with a sequential scan (or an index scan with no index
+condition, which is the same thing in index order).
+
+Sequential scans are disabled for the session, so the planner only picks one
+when no index can serve the query; results don't depend on how much data the
+scratch database holds. Needs psycopg (requirements-dev.txt).
+
+    python check_query_plans.py --dsn postgresql://postgres@localhost/postgres
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+
+from migrate import MIGRATIONS_DIR, migrate
+from repository import Booking, BookingSlot, Conversation, Message, UserCredentials, UserProfile, columns
+
+CHECKED_TABLES = {"bookings", "users", "conversations", "messages", "session_meter_minutes"}
+
+SEED = """
+insert into users (email, password_hash, full_name, verification_token, is_verified)
+select 'user' || i || '@example.com', 'x', 'User ' || i, 'token-' || i, i % 3 = 0
+from generate_series(1, 5000) i;
+
+insert into chargers (name, location, cost_per_kwh)
+select 'Charger ' || i, jsonb_build_object('lat', 12 + i / 100.0, 'lng', 77 + i / 100.0), 12
+from generate_series(1, 50) i;
+
+-- Back-to-back 1h slots per charger, starting 60 days ago
+insert into bookings (user_id, charger_id, start_time, end_time, status, energy_kwh, total_cost)
+select 1 + (c * 997 + s) % 5000, c,
+       date_trunc('hour', now()) - interval '60 days' + s * interval '1 hour',
+       date_trunc('hour', now()) - interval '60 days' + (s + 1) * interval '1 hour',
+       (array['Confirmed', 'Completed', 'Cancelled', 'Pending'])[1 + s % 4], 10, 120
+from generate_series(1, 50) c, generate_series(0, 2000) s;
+
+insert into conversations (user_id, title, created_at)
+select 1 + i % 5000, 'Chat ' || i, now() - i * interval '1 minute'
+from generate_series(1, 20000) i;
+
+insert into messages (conversation_id, role, content, created_at)
+select c.id, (array['user', 'assistant'])[1 + m % 2], 'message ' || m, c.created_at + m * interval '1 second'
+from conversations c, generate_series(1, 5) m;
+
+analyze;
+"""
+
+# (name, query) pairs mirroring the PostgREST calls in database.py,
+# async_database.py, occupancy_index.py, booking_archiver.py, telemetry.py
+# and main.py.
+# {conversation_id} and {cursor} are filled in from the seeded data.
+HOT_QUERIES: List[Tuple[str, str]] = [
+    ("bookings: overlap check", f"""
+        select {columns(BookingSlot)} from bookings
+        where charger_id = 7 and status <> 'Cancelled'
+          and start_time < now() + interval '2 hours' and end_time > now()"""),
+    ("bookings: upcoming for user", f"""
+        select {columns(Booking)} from bookings
+        where user_id = 42 and end_time >= now()
+        order by start_time, id limit 6"""),
+    ("bookings: upcoming for user, next page", f"""
+        select {columns(Booking)} from bookings
+        where user_id = 42 and end_time >= now()
+          and (start_time > now() or (start_time = now() and id > 100))
+        order by start_time, id limit 6"""),
+    ("bookings: clear user history", """
+        select id from bookings where user_id = 42 and status in ('Completed', 'Cancelled')"""),
+    ("bookings: archiver batch", """
+        select id from bookings
+        where status in ('Completed', 'Cancelled') and end_time < now() - interval '30 days'
+        order by end_time limit 500"""),
+    ("users: login by email", f"""
+        select {columns(UserCredentials)} from users where email = 'user42@example.com'"""),
+    ("users: by id", f"select {columns(UserProfile)} from users where id = 42"),
+    ("users: by verification token", f"""
+        select {columns(UserProfile)} from users where verification_token = 'token-42'"""),
+    ("conversations: first page", f"""
+        select {columns(Conversation)} from conversations
+        where user_id = 42 order by created_at desc, id desc limit 51"""),
+    ("conversations: next page", f"""
+        select {columns(Conversation)} from conversations
+        where user_id = 42 and (created_at < {{cursor}} or (created_at = {{cursor}} and id < '{{conversation_id}}'))
+        order by created_at desc, id desc limit 51"""),
+    ("messages: latest page", f"""
+        select {columns(Message)} from messages
+        where conversation_id = '{{conversation_id}}' order by created_at desc, id desc limit 51"""),
+    ("session_meter_minutes: energy at stop", """
+        select energy_kwh from session_meter_minutes where booking_id = 42"""),
+]
+
+
+def scan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from scan_nodes(child)
+
+
+def full_scans(plan: dict) -> List[str]:
+    """Scans of checked tables that read the whole relation"""
+    found = []
+    for node in scan_nodes(plan):
+        table = node.get("Relation Name")
+        if table not in CHECKED_TABLES:
+            continue
+        kind = node["Node Type"]
+        if kind == "Seq Scan" or (kind in ("Index Scan", "Index Only Scan") and "Index Cond" not in node):
+            found.append(f"{kind} on {table}")
+    return found
+
+
+def used_indexes(plan: dict) -> List[str]:
+    return sorted({node["Index Name"] for node in scan_nodes(plan) if "Index Name" in node})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL", "postgresql://postgres@localhost/postgres"),
+                        help="any database on the server; a scratch database is created next to it")
+    parser.add_argument("--database", default="query_plan_check")
+    parser.add_argument("--migrations", type=Path, default=MIGRATIONS_DIR)
+    args = parser.parse_args()
+
+    scratch_dsn = make_conninfo(args.dsn, dbname=args.database)
+    with psycopg.connect(args.dsn, autocommit=True) as admin:
+        admin.execute(sql.SQL("drop database if exists {}").format(sql.Identifier(args.database)))
+        admin.execute(sql.SQL("create database {}").format(sql.Identifier(args.database)))
+
+    failures = []
+    try:
+        migrate(scratch_dsn, args.migrations)
+        with psycopg.connect(scratch_dsn, autocommit=True) as conn:
+            conn.execute(SEED)
+            conn.execute("set enable_seqscan = off")
+            conversation_id, created_at = conn.execute(
+                "select id, created_at from conversations where user_id = 42 order by created_at desc limit 1"
+            ).fetchone()
+            for name, query in HOT_QUERIES:
+                query = query.format(conversation_id=conversation_id, cursor=f"'{created_at.isoformat()}'")
+                plan = conn.execute(f"explain (format json) {query}").fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                plan = plan[0]["Plan"]
+                bad = full_scans(plan)
+                print(f"{'FAIL' if bad else 'ok':<5} {name:<42} {', '.join(bad or used_indexes(plan))}")
+                if bad:
+                    failures.append(name)
+    finally:
+        with psycopg.connect(args.dsn, autocommit=True) as admin:
+            admin.execute(sql.SQL("drop database if exists {}").format(sql.Identifier(args.database)))
+
+    if failures:
+        print(f"\nFAIL: {len(failures)} hot queries fall back to a sequential scan: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"\nOK: all {len(HOT_QUERIES)} hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
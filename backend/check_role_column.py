@@ -1,7 +1,7 @@
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
 from pathlib import Path
+from supabase_clients import supabase_clients
 
 # Load env
 env_path = Path(__file__).parent.parent / '.env'
@@ -14,7 +14,7 @@ if not url or not key:
     print("Error: Supabase credentials not found in .env")
     exit(1)
 
-supabase: Client = create_client(url, key)
+supabase = supabase_clients.client()
 
 print(f"Connecting to Supabase at {url}...")
 
@@ -31,7 +31,7 @@ except Exception as e:
     print("Please run the following SQL in your Supabase Dashboard SQL Editor:")
     print("-" * 50)
     try:
-        with open('../add_role_column.sql', 'r') as f:
+        with open(Path(__file__).parent / 'migrations' / '0002_users_role.sql', 'r') as f:
             print(f.read())
     except:
         print("ALTER TABLE public.users ADD COLUMN IF NOT EXISTS role VARCHAR(50) DEFAULT 'user';")
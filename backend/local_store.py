@@ -0,0 +1,763 @@
+"""
+Local storage backend
+SQLite stand-in for Supabase that speaks the part of the PostgREST client API
+the backend uses: table().select/insert/upsert/update/delete with eq/neq/gt/gte/lt/
+lte/in_/is_/or_ filters, order, limit and range, one-level embeds such as
+chargers(name), and the book_slot / clear_user_history / archive_bookings
+RPCs. Every endpoint runs unchanged against it, without a network, so their
+server-side cost can be benchmarked in isolation.
+
+Semantics follow migrations/: the same tables, defaults and check
+constraints, unique emails, bookings_no_overlap enforced on every booking
+write, timestamps compared as instants and returned as UTC ISO strings, and
+errors raised as postgrest APIError carrying the Postgres/PostgREST code the
+callers already handle (23P01, 23505, 42703, PGRST202, ...).
+
+Selected by supabase_clients with STORAGE_BACKEND=memory or
+STORAGE_BACKEND=sqlite (file at SQLITE_PATH). To seed a file for benchmarks:
+
+    python local_store.py seed --path bench.sqlite3 --chargers 500 --users 2000
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+logger = logging.getLogger(__name__)
+
+# Fixed-width UTC text, so SQLite's string comparison orders instants correctly
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f+00:00"
+_TS_NOW = "(strftime('%Y-%m-%dT%H:%M:%f', 'now') || '000+00:00')"
+
+SCHEMA = f"""
+create table if not exists users (
+  id integer primary key autoincrement,
+  email text unique,
+  password_hash text,
+  full_name text,
+  avatar_url text,
+  vehicle_model text,
+  battery_capacity real,
+  verification_token text,
+  is_verified integer default 0,
+  role text default 'user',
+  country text default 'India',
+  created_at text not null default {_TS_NOW}
+) strict;
+
+create table if not exists chargers (
+  id integer primary key autoincrement,
+  name text not null,
+  location text,
+  status text check (status in ('Available', 'Occupied', 'Offline')) default 'Available',
+  cost_per_kwh real default 12.0,
+  power_kw real default 7.0,
+  created_at text not null default {_TS_NOW},
+  updated_at text not null default {_TS_NOW}
+) strict;
+
+create table if not exists bookings (
+  id integer primary key autoincrement,
+  user_id integer not null references users(id),
+  charger_id integer not null references chargers(id),
+  start_time text not null,
+  end_time text not null,
+  energy_kwh real,
+  total_cost real,
+  status text check (status in ('Pending', 'Confirmed', 'Completed', 'Cancelled')) default 'Pending',
+  created_at text not null default {_TS_NOW},
+  check (start_time <= end_time)
+) strict;
+
+create table if not exists bookings_archive (
+  id integer primary key,
+  user_id integer not null,
+  charger_id integer not null,
+  start_time text not null,
+  end_time text not null,
+  energy_kwh real,
+  total_cost real,
+  status text,
+  created_at text not null,
+  archived_at text not null default {_TS_NOW}
+) strict;
+
+create table if not exists conversations (
+  id text primary key,
+  user_id integer not null references users(id),
+  title text,
+  created_at text default {_TS_NOW}
+) strict;
+
+create table if not exists messages (
+  id text primary key,
+  conversation_id text not null references conversations(id) on delete cascade,
+  role text not null check (role in ('user', 'assistant')),
+  content text not null,
+  created_at text default {_TS_NOW}
+) strict;
+
+create table if not exists session_meter_minutes (
+  booking_id integer not null references bookings(id) on delete restrict,
+  minute text not null,
+  samples integer not null,
+  energy_kwh real not null,
+  meter_kwh real,
+  power_kw_avg real,
+  power_kw_max real,
+  soc_percent real,
+  primary key (booking_id, minute)
+) strict;
+
+create table if not exists session_meter_minutes_archive (
+  booking_id integer not null,
+  minute text not null,
+  samples integer not null,
+  energy_kwh real not null,
+  meter_kwh real,
+  power_kw_avg real,
+  power_kw_max real,
+  soc_percent real,
+  archived_at text not null default {_TS_NOW}
+) strict;
+
+create index if not exists idx_bookings_charger_time on bookings (charger_id, start_time, end_time);
+create index if not exists idx_bookings_user_status on bookings (user_id, status);
+create index if not exists idx_bookings_finished_end_time on bookings (end_time)
+  where status in ('Completed', 'Cancelled');
+create index if not exists idx_bookings_archive_user_id on bookings_archive (user_id);
+create index if not exists idx_session_meter_minutes_archive_booking
+  on session_meter_minutes_archive (booking_id, minute);
+create index if not exists idx_users_email on users (email);
+create index if not exists idx_users_verification_token on users (verification_token);
+create index if not exists idx_conversations_user_created on conversations (user_id, created_at desc, id desc);
+create index if not exists idx_messages_conversation_created on messages (conversation_id, created_at desc, id desc);
+"""
+
+TIMESTAMP_COLUMNS = {"created_at", "updated_at", "start_time", "end_time", "archived_at", "minute"}
+JSON_COLUMNS = {"location"}
+BOOLEAN_COLUMNS = {"is_verified"}
+UUID_TABLES = {"conversations", "messages"}
+
+FINISHED_STATUSES = ("Completed", "Cancelled")
+BOOK_SLOT_FIELDS = ("user_id", "charger_id", "start_time", "end_time", "energy_kwh", "total_cost", "status")
+
+_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _api_error(code: str, message: str) -> APIError:
+    return APIError({"code": code, "message": message, "hint": None, "details": None})
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _format_ts(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime(_TS_FORMAT)
+
+
+def _encode(column: str, value: Any) -> Any:
+    """Python/JSON value -> stored value"""
+    if value is None:
+        return None
+    if column in TIMESTAMP_COLUMNS:
+        if isinstance(value, datetime):
+            return _format_ts(value)
+        try:
+            # Naive strings mean UTC, as in a Supabase session
+            return _format_ts(datetime.fromisoformat(str(value).replace("Z", "+00:00")))
+        except ValueError:
+            raise _api_error("22007", f'invalid input syntax for type timestamp with time zone: "{value}"')
+    if column in JSON_COLUMNS:
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _decode_row(row: sqlite3.Row) -> Dict[str, Any]:
+    out = {}
+    for column in row.keys():
+        value = row[column]
+        if value is not None:
+            if column in TIMESTAMP_COLUMNS:
+                value = datetime.fromisoformat(value).isoformat()
+            elif column in JSON_COLUMNS:
+                value = json.loads(value)
+            elif column in BOOLEAN_COLUMNS:
+                value = bool(value)
+        out[column] = value
+    return out
+
+
+# ---- or=(...) filter strings ------------------------------------------------
+
+_TOKEN = re.compile(r'\s*(?:(and|or)\(|"((?:[^"\\]|\\.)*)"|([^,()"]+)|(\))|(,))')
+
+
+def _parse_logic(text: str) -> List[tuple]:
+    """
+    Parse PostgREST logic syntax (the argument of or_/and=) into filter nodes:
+    ("cond", column, op, value) or ("and"|"or", [nodes]).
+    """
+    pos, stack, current = 0, [], []
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise _api_error("PGRST100", f"failed to parse logic tree ({text})")
+        pos = match.end()
+        group, quoted, bare, close, comma = match.groups()
+        if group:
+            stack.append((group, current))
+            current = []
+        elif close:
+            if not stack:
+                raise _api_error("PGRST100", f"failed to parse logic tree ({text})")
+            group, parent = stack.pop()
+            parent.append((group, current))
+            current = parent
+        elif comma:
+            continue
+        else:
+            # column.op.value, where the value part may be quoted
+            if quoted is not None:
+                raise _api_error("PGRST100", f"failed to parse logic tree ({text})")
+            column, _, rest = bare.partition(".")
+            op, _, value = rest.partition(".")
+            if not value and pos < len(text) and text[pos] == '"':
+                match = _TOKEN.match(text, pos)
+                value = re.sub(r"\\(.)", r"\1", match.group(2))
+                pos = match.end()
+            current.append(("cond", column.strip(), op, value))
+    if stack:
+        raise _api_error("PGRST100", f"failed to parse logic tree ({text})")
+    return current
+
+
+# ---- query builders ------------------------------------------------------------
+
+@dataclass
+class LocalResponse:
+    data: Any
+    count: Optional[int] = None
+
+
+class _Query:
+    """Chainable builder with the postgrest-py request builder's method names"""
+
+    def __init__(self, store: "LocalStore", table: str):
+        self._store = store
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.payload: Any = None
+        self.filters: List[tuple] = []
+        self.ordering: List[Tuple[str, bool, Optional[bool]]] = []
+        self.limit_rows: Optional[int] = None
+        self.offset_rows: Optional[int] = None
+        self.count: Optional[str] = None
+        self.conflict: Optional[Tuple[str, str]] = None   # (ignore|merge, conflict columns)
+
+    # actions
+    def select(self, *columns: str, count: Optional[str] = None, head: Optional[bool] = None):
+        self.action, self.count = "select", count
+        self.columns = ",".join(columns) or "*"
+        return self
+
+    def insert(self, json: Any, *, count=None, returning=None, upsert: bool = False, default_to_null: bool = True):
+        self.action, self.payload = "insert", json
+        return self
+
+    def upsert(self, json: Any, *, count=None, returning=None, ignore_duplicates: bool = False,
+               on_conflict: str = "", default_to_null: bool = True):
+        self.action, self.payload = "insert", json
+        self.conflict = ("ignore" if ignore_duplicates else "merge", on_conflict or "id")
+        return self
+
+    def update(self, json: Dict[str, Any], *, count=None, returning=None):
+        self.action, self.payload = "update", json
+        return self
+
+    def delete(self, *, count=None, returning=None):
+        self.action = "delete"
+        return self
+
+    # filters
+    def _cond(self, column: str, op: str, value: Any):
+        self.filters.append(("cond", column, op, value))
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self._cond(column, "eq", value)
+
+    def neq(self, column: str, value: Any):
+        return self._cond(column, "neq", value)
+
+    def gt(self, column: str, value: Any):
+        return self._cond(column, "gt", value)
+
+    def gte(self, column: str, value: Any):
+        return self._cond(column, "gte", value)
+
+    def lt(self, column: str, value: Any):
+        return self._cond(column, "lt", value)
+
+    def lte(self, column: str, value: Any):
+        return self._cond(column, "lte", value)
+
+    def in_(self, column: str, values):
+        return self._cond(column, "in", list(values))
+
+    def is_(self, column: str, value: Any):
+        return self._cond(column, "is", value)
+
+    def or_(self, filters: str, reference_table: Optional[str] = None):
+        self.filters.append(("or", _parse_logic(filters)))
+        return self
+
+    # modifiers
+    def order(self, column: str, *, desc: bool = False, nullsfirst: Optional[bool] = None,
+              foreign_table: Optional[str] = None):
+        self.ordering.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size: int, *, foreign_table: Optional[str] = None):
+        self.limit_rows = size
+        return self
+
+    def range(self, start: int, end: int, foreign_table: Optional[str] = None):
+        self.offset_rows, self.limit_rows = start, end - start + 1
+        return self
+
+    def execute(self) -> LocalResponse:
+        return self._store.run(self)
+
+
+class _AsyncQuery(_Query):
+    async def execute(self) -> LocalResponse:
+        return self._store.run(self)
+
+
+class _Rpc:
+    def __init__(self, store: "LocalStore", fn: str, params: Dict[str, Any]):
+        self._store, self.fn, self.params = store, fn, params
+
+    def execute(self) -> LocalResponse:
+        return self._store.call(self.fn, self.params)
+
+
+class _AsyncRpc(_Rpc):
+    async def execute(self) -> LocalResponse:
+        return self._store.call(self.fn, self.params)
+
+
+class LocalClient:
+    """Drop-in for supabase.Client's table()/rpc()"""
+
+    def __init__(self, store: "LocalStore"):
+        self.store = store
+
+    def table(self, name: str) -> _Query:
+        return _Query(self.store, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _Rpc:
+        return _Rpc(self.store, fn, params or {})
+
+
+class LocalAsyncClient(LocalClient):
+    """Drop-in for supabase.AsyncClient's table()/rpc(); execute() is awaitable"""
+
+    def table(self, name: str) -> _AsyncQuery:
+        return _AsyncQuery(self.store, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _AsyncRpc:
+        return _AsyncRpc(self.store, fn, params or {})
+
+
+# ---- store ---------------------------------------------------------------------
+
+class LocalStore:
+    """
+    One SQLite connection behind a lock: statements run one at a time, like a
+    single-connection database, which is what makes the overlap check atomic.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("pragma foreign_keys = on")
+        if path != ":memory:":
+            self._conn.execute("pragma journal_mode = wal")
+        self._conn.executescript(SCHEMA)
+        self._columns: Dict[str, Tuple[str, ...]] = {
+            table: tuple(r["name"] for r in self._conn.execute(f"pragma table_info({table})"))
+            for (table,) in self._conn.execute(
+                "select name from sqlite_master where type = 'table' and name not like 'sqlite_%'")
+        }
+        logger.info(f"Local store opened at {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # -- SQL building --
+
+    def _table_columns(self, table: str) -> Tuple[str, ...]:
+        if table not in self._columns:
+            raise _api_error("42P01", f'relation "public.{table}" does not exist')
+        return self._columns[table]
+
+    def _column(self, table: str, column: str) -> str:
+        if column not in self._table_columns(table):
+            raise _api_error("42703", f"column {table}.{column} does not exist")
+        return f'"{column}"'
+
+    def _where(self, table: str, nodes: List[tuple], joiner: str = " and ") -> Tuple[str, list]:
+        parts, params = [], []
+        for node in nodes:
+            if node[0] in ("and", "or"):
+                sql, sub = self._where(table, node[1], f" {node[0]} ")
+                parts.append(f"({sql})")
+                params.extend(sub)
+                continue
+            _, column, op, value = node
+            col = self._column(table, column)
+            if op in _OPERATORS:
+                parts.append(f"{col} {_OPERATORS[op]} ?")
+                params.append(_encode(column, value))
+            elif op == "in":
+                parts.append(f"{col} in ({', '.join('?' * len(value))})" if value else "0")
+                params.extend(_encode(column, v) for v in value)
+            elif op == "is":
+                keyword = {"null": "null", "true": "1", "false": "0"}.get(str(value).lower())
+                if keyword is None and value is not None:
+                    raise _api_error("PGRST100", f"invalid is. value: {value}")
+                parts.append(f"{col} is {keyword or 'null'}")
+            else:
+                raise _api_error("PGRST100", f"unsupported operator: {op}")
+        return joiner.join(parts) or "1", params
+
+    def _select_list(self, table: str, columns: str) -> Tuple[List[str], List[Tuple[str, str, List[str]]]]:
+        """Plain columns and (embedded table, fk column, columns) from a select string"""
+        plain, embeds, depth, item = [], [], 0, ""
+        for ch in columns + ",":
+            if ch == "," and depth == 0:
+                item = item.strip()
+                if item:
+                    match = re.fullmatch(r"(\w+)\((.*)\)", item)
+                    if match:
+                        other = match.group(1)
+                        fk = (other[:-1] if other.endswith("s") else other) + "_id"
+                        self._column(table, fk)
+                        embeds.append((other, fk, [c.strip() for c in match.group(2).split(",") if c.strip()]))
+                    elif item == "*":
+                        plain.extend(self._table_columns(table))
+                    else:
+                        self._column(table, item)
+                        plain.append(item)
+                item = ""
+                continue
+            depth += ch == "("
+            depth -= ch == ")"
+            item += ch
+        return plain, embeds
+
+    # -- actions --
+
+    def run(self, query: _Query) -> LocalResponse:
+        try:
+            with self._lock:
+                return getattr(self, f"_{query.action}")(query)
+        except sqlite3.IntegrityError as e:
+            raise self._integrity_error(query.table, str(e)) from e
+        except sqlite3.OperationalError as e:
+            raise _api_error("42601" if "syntax" in str(e) else "XX000", str(e)) from e
+
+    def _select(self, q: _Query) -> LocalResponse:
+        plain, embeds = self._select_list(q.table, q.columns)
+        fetch = list(dict.fromkeys(plain + [fk for _, fk, _ in embeds]))
+        where, params = self._where(q.table, q.filters)
+        sql = f'select {", ".join(self._column(q.table, c) for c in fetch)} from "{q.table}" where {where}'
+        if q.ordering:
+            sql += " order by " + ", ".join(
+                f"{self._column(q.table, col)} {'desc' if desc else 'asc'} "
+                f"nulls {'first' if (desc if nullsfirst is None else nullsfirst) else 'last'}"
+                for col, desc, nullsfirst in q.ordering
+            )
+        if q.limit_rows is not None:
+            sql += f" limit {int(q.limit_rows)} offset {int(q.offset_rows or 0)}"
+        rows = [_decode_row(r) for r in self._conn.execute(sql, params)]
+        for other, fk, cols in embeds:
+            self._embed(rows, other, fk, cols)
+        for row in rows:
+            for key in set(row) - set(plain) - {other for other, _, _ in embeds}:
+                del row[key]
+        count = None
+        if q.count:
+            count = self._conn.execute(f'select count(*) from "{q.table}" where {where}', params).fetchone()[0]
+        return LocalResponse(rows, count)
+
+    def _embed(self, rows: List[dict], other: str, fk: str, cols: List[str]):
+        ids = list({row[fk] for row in rows if row.get(fk) is not None})
+        found = {}
+        if ids:
+            wanted = list(dict.fromkeys(["id"] + cols))
+            sql = (f'select {", ".join(self._column(other, c) for c in wanted)} from "{other}" '
+                   f'where id in ({", ".join("?" * len(ids))})')
+            for r in self._conn.execute(sql, ids):
+                record = _decode_row(r)
+                found[record["id"]] = {c: record[c] for c in cols}
+        for row in rows:
+            row[other] = found.get(row.get(fk))
+
+    def _insert(self, q: _Query) -> LocalResponse:
+        records = q.payload if isinstance(q.payload, list) else [q.payload]
+        inserted = []
+        self._conn.execute("begin")
+        try:
+            for record in records:
+                record = dict(record)
+                if q.table in UUID_TABLES and record.get("id") is None:
+                    record["id"] = str(uuid.uuid4())
+                cols = [self._column(q.table, c) for c in record]
+                sql = (f'insert into "{q.table}" ({", ".join(cols)}) '
+                       f'values ({", ".join("?" * len(cols))})')
+                if not cols:
+                    sql = f'insert into "{q.table}" default values'
+                if q.conflict:
+                    sql += self._on_conflict(q.table, *q.conflict, cols)
+                row = self._conn.execute(sql + " returning *", [_encode(c, v) for c, v in record.items()]).fetchone()
+                if row is not None:
+                    inserted.append(_decode_row(row))
+            if q.table == "bookings":
+                self._check_no_overlap([r["id"] for r in inserted])
+            self._conn.execute("commit")
+        except BaseException:
+            self._conn.execute("rollback")
+            raise
+        return LocalResponse(inserted)
+
+    def _on_conflict(self, table: str, mode: str, target: str, cols: List[str]) -> str:
+        keys = [self._column(table, c.strip()) for c in target.split(",")]
+        if mode == "ignore":
+            return f' on conflict ({", ".join(keys)}) do nothing'
+        changes = [c for c in cols if c not in keys]
+        if not changes:
+            return f' on conflict ({", ".join(keys)}) do nothing'
+        return f' on conflict ({", ".join(keys)}) do update set ' + ", ".join(f"{c} = excluded.{c}" for c in changes)
+
+    def _update(self, q: _Query) -> LocalResponse:
+        changes = dict(q.payload)
+        if q.table == "chargers" and "updated_at" not in changes:
+            # chargers_set_updated_at trigger
+            changes["updated_at"] = _utc_now()
+        assignments = ", ".join(f"{self._column(q.table, c)} = ?" for c in changes)
+        where, params = self._where(q.table, q.filters)
+        self._conn.execute("begin")
+        try:
+            rows = self._conn.execute(
+                f'update "{q.table}" set {assignments} where {where} returning *',
+                [_encode(c, v) for c, v in changes.items()] + params,
+            ).fetchall()
+            updated = [_decode_row(r) for r in rows]
+            if q.table == "bookings":
+                self._check_no_overlap([r["id"] for r in updated])
+            self._conn.execute("commit")
+        except BaseException:
+            self._conn.execute("rollback")
+            raise
+        return LocalResponse(updated)
+
+    def _delete(self, q: _Query) -> LocalResponse:
+        where, params = self._where(q.table, q.filters)
+        rows = self._conn.execute(f'delete from "{q.table}" where {where} returning *', params).fetchall()
+        return LocalResponse([_decode_row(r) for r in rows])
+
+    def _check_no_overlap(self, booking_ids: List[Any]):
+        """bookings_no_overlap: no two non-cancelled bookings on a charger share time"""
+        if not booking_ids:
+            return
+        clash = self._conn.execute(f"""
+            select a.id, b.id from bookings a join bookings b
+              on b.charger_id = a.charger_id and b.id <> a.id
+             and b.status <> 'Cancelled' and b.start_time < a.end_time and a.start_time < b.end_time
+            where a.id in ({", ".join("?" * len(booking_ids))}) and a.status <> 'Cancelled'
+            limit 1
+        """, booking_ids).fetchone()
+        if clash:
+            raise _api_error("23P01", 'conflicting key value violates exclusion constraint "bookings_no_overlap"')
+
+    @staticmethod
+    def _integrity_error(table: str, message: str) -> APIError:
+        if message.startswith("UNIQUE"):
+            column = message.rsplit(".", 1)[-1]
+            return _api_error("23505", f'duplicate key value violates unique constraint "{table}_{column}_key"')
+        if message.startswith("NOT NULL"):
+            column = message.rsplit(".", 1)[-1]
+            return _api_error("23502", f'null value in column "{column}" of relation "{table}" '
+                                       f'violates not-null constraint')
+        if message.startswith("FOREIGN KEY"):
+            return _api_error("23503", f'insert or update on table "{table}" violates foreign key constraint')
+        if "start_time <= end_time" in message:
+            # Postgres fails building the bookings_no_overlap range instead
+            return _api_error("22000", "range lower bound must be less than or equal to range upper bound")
+        if message.startswith("CHECK"):
+            return _api_error("23514", f'new row for relation "{table}" violates check constraint')
+        if "cannot store" in message:
+            return _api_error("22P02", f"invalid input syntax: {message}")
+        return _api_error("23000", message)
+
+    # -- RPCs (migrations/0007_bookings_no_overlap.sql, 0008_bookings_archive.sql, 0013) --
+
+    def call(self, fn: str, params: Dict[str, Any]) -> LocalResponse:
+        handler = getattr(self, f"_rpc_{fn}", None)
+        if handler is None:
+            raise _api_error("PGRST202", f"Could not find the function public.{fn} in the schema cache")
+        try:
+            with self._lock:
+                return LocalResponse(handler(**params))
+        except sqlite3.IntegrityError as e:
+            raise self._integrity_error("bookings", str(e)) from e
+
+    def _rpc_book_slot(self, p_booking: Dict[str, Any]) -> List[dict]:
+        booking = {k: p_booking.get(k) for k in BOOK_SLOT_FIELDS}
+        booking["status"] = booking["status"] or "Confirmed"
+        query = _Query(self, "bookings").insert(booking)
+        return self._insert(query).data
+
+    def _rpc_clear_user_history(self, p_user_id: Any) -> int:
+        self._conn.execute("begin")
+        try:
+            self._conn.execute("""
+                delete from session_meter_minutes where booking_id in (
+                  select id from bookings where user_id = ? and status in (?, ?)
+                )
+            """, [p_user_id, *FINISHED_STATUSES])
+            hot = self._conn.execute(
+                "delete from bookings where user_id = ? and status in (?, ?)", [p_user_id, *FINISHED_STATUSES]
+            ).rowcount
+            self._conn.execute("""
+                delete from session_meter_minutes_archive
+                where booking_id in (select id from bookings_archive where user_id = ?)
+            """, [p_user_id])
+            archived = self._conn.execute("delete from bookings_archive where user_id = ?", [p_user_id]).rowcount
+            self._conn.execute("commit")
+        except BaseException:
+            self._conn.execute("rollback")
+            raise
+        return hot + archived
+
+    def _rpc_archive_bookings(self, p_older_than_days: int, p_batch_size: int = 500) -> int:
+        cutoff = _format_ts(_utc_now() - timedelta(days=p_older_than_days))
+        archive_columns = ", ".join(c for c in self._columns["bookings_archive"] if c != "archived_at")
+        minute_columns = ", ".join(self._columns["session_meter_minutes"])
+        archived_at = _format_ts(_utc_now())
+        self._conn.execute("begin")
+        try:
+            self._conn.execute("""
+                create temp table if not exists archive_batch (id integer primary key)
+            """)
+            self._conn.execute("delete from archive_batch")
+            self._conn.execute("""
+                insert into archive_batch
+                select id from bookings
+                where status in (?, ?) and end_time < ?
+                order by end_time limit ?
+            """, [*FINISHED_STATUSES, cutoff, p_batch_size])
+            # Meter minutes move with their bookings (session_meter_minutes restricts the delete)
+            self._conn.execute(f"""
+                insert into session_meter_minutes_archive ({minute_columns}, archived_at)
+                select {minute_columns}, ? from session_meter_minutes
+                where booking_id in (select id from archive_batch)
+            """, [archived_at])
+            self._conn.execute("delete from session_meter_minutes where booking_id in (select id from archive_batch)")
+            self._conn.execute(f"""
+                insert into bookings_archive ({archive_columns}, archived_at)
+                select {archive_columns}, ? from bookings where id in (select id from archive_batch)
+            """, [archived_at])
+            moved = self._conn.execute("delete from bookings where id in (select id from archive_batch)").rowcount
+            self._conn.execute("commit")
+        except BaseException:
+            self._conn.execute("rollback")
+            raise
+        return moved
+
+    # -- benchmark data --
+
+    def seed(self, chargers: int = 200, users: int = 1000, bookings_per_charger: int = 20,
+             password: str = "password", center: Tuple[float, float] = (12.9716, 77.5946)):
+        """
+        Fill an empty store with chargers around `center`, verified users
+        (user<N>@example.com, all with `password`) and upcoming bookings.
+        """
+        from password_hasher import password_hasher
+
+        rng = random.Random(42)
+        password_hash = password_hasher.hash(password)
+        client = LocalClient(self)
+        client.table("chargers").insert([{
+            "name": f"Charger {i}",
+            "location": {"lat": center[0] + rng.uniform(-0.2, 0.2), "lng": center[1] + rng.uniform(-0.2, 0.2)},
+            "status": rng.choice(["Available", "Available", "Available", "Occupied", "Offline"]),
+            "cost_per_kwh": round(rng.uniform(8, 20), 1),
+            "power_kw": rng.choice([3.3, 7.0, 22.0, 50.0]),
+        } for i in range(1, chargers + 1)]).execute()
+        client.table("users").insert([{
+            "email": f"user{i}@example.com",
+            "password_hash": password_hash,
+            "full_name": f"User {i}",
+            "verification_token": str(uuid.uuid4()),
+            "is_verified": True,
+        } for i in range(1, users + 1)]).execute()
+        start = _utc_now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        client.table("bookings").insert([{
+            "user_id": rng.randint(1, users),
+            "charger_id": c,
+            "start_time": start + timedelta(hours=2 * s),
+            "end_time": start + timedelta(hours=2 * s + 1),
+            "status": "Confirmed",
+            "energy_kwh": 7.0,
+            "total_cost": 84.0,
+        } for c in range(1, chargers + 1) for s in range(bookings_per_charger)]).execute()
+        logger.info(f"Seeded {chargers} chargers, {users} users, {chargers * bookings_per_charger} bookings")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    seed = sub.add_parser("seed", help="fill a new SQLite file with benchmark data")
+    seed.add_argument("--path", required=True)
+    seed.add_argument("--chargers", type=int, default=200)
+    seed.add_argument("--users", type=int, default=1000)
+    seed.add_argument("--bookings-per-charger", type=int, default=20)
+    seed.add_argument("--password", default="password")
+    args = parser.parse_args()
+
+    store = LocalStore(args.path)
+    try:
+        store.seed(args.chargers, args.users, args.bookings_per_charger, args.password)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import asyncio
+import json
 import os
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Any
@@ -7,8 +10,19 @@ from datetime import datetime, timedelta
 import scheduler
 from email_service import email_service
 from database import db
+from async_database import adb
+from supabase_clients import supabase_clients
+from pagination import DEFAULT_LIMIT, InvalidCursor, clamp_limit, envelope
+from password_hasher import password_hasher, HasherOverloaded
+from message_writer import message_writer
+from telemetry import telemetry
+from ocpp_gateway import ocpp_gateway
+from query_metrics import RouteContextMiddleware, query_metrics
+from occupancy_index import occupancy_index
+from charging_sessions import charging_sessions
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
 
 # Load environment variables from current and parent directory
 load_dotenv() # Load from ./backend/.env if it exists
@@ -27,7 +41,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from charger_catalog import charger_catalog
+    from occupancy_index import occupancy_index
+    from booking_archiver import booking_archiver
+    charger_catalog.start()
+    occupancy_index.start()
+    charging_sessions.start()
+    booking_archiver.start()
+    try:
+        await supabase_clients.async_client()
+    except Exception as e:
+        logger.error(f"Async Supabase client failed to open: {e}")
+    message_writer.start()
+    telemetry.start()
+    ocpp_gateway.start()
+    yield
+    booking_archiver.stop()
+    await ocpp_gateway.stop()
+    await telemetry.stop()
+    await message_writer.stop()
+    charging_sessions.stop()
+    occupancy_index.stop()
+    charger_catalog.stop()
+    password_hasher.shutdown()
+    # Last: everything above may still be finishing a query on these clients
+    await supabase_clients.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Tags Supabase calls with the route that made them (query_metrics.py)
+app.add_middleware(RouteContextMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -69,74 +116,125 @@ async def control_charge(request: ChargeControlRequest):
     - start: Create a new 'Active' booking
     - stop: Mark current booking as Completed
     - status: Check if user is currently charging
+    Sessions are looked up in the in-memory registry (charging_sessions.py);
+    clients can follow changes on /api/charge/events instead of polling status.
     """
     try:
         # 1. Check for valid user
-        user = db.get_user_by_id(request.user_id)
+        user = await adb.get_user_by_id(request.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # 2. Handle Actions
         if request.action == "start":
             # Check if already charging
-            active = db.client.table("bookings").select("*").eq("user_id", request.user_id).eq("status", "Confirmed").execute()
-            if active.data and len(active.data) > 0:
-                return {"status": "success", "message": "Already charging", "is_charging": True, "session": active.data[0]}
-            
-            # Start new session
-            # We create a booking starting NOW
-            now_iso = datetime.now().isoformat()
-             # Default 1 hour duration placeholder, will be updated on stop
-            end_iso = (datetime.now() +  timedelta(hours=1)).isoformat()
-            
-            booking_data = {
-                "user_id": request.user_id,
-                "charger_id": request.charger_id,
-                "start_time": now_iso,
-                "end_time": end_iso, 
-                "status": "Confirmed", # Confirmed = Active Charging for this demo
-                "total_cost": 0.0, # Will calc on stop
-                "energy_kwh": 0.0 
-            }
-            
-            res = db.client.table("bookings").insert(booking_data).execute()
-            if res.data:
-                 return {"status": "success", "message": "Charging started", "is_charging": True, "session": res.data[0]}
-            else:
+            session = await _active_session(request.user_id)
+            if session:
+                return {"status": "success", "message": "Already charging", "is_charging": True, "session": session}
+
+            # Start new session (a Confirmed booking starting now)
+            result = await adb.start_charging_session(request.user_id, request.charger_id)
+            if result.get("conflict"):
+                raise HTTPException(status_code=409, detail="Charger is booked for this time")
+            if not result["success"]:
                 raise HTTPException(status_code=500, detail="Failed to start charging")
+            return {"status": "success", "message": "Charging started", "is_charging": True, "session": result["session"]}
 
         elif request.action == "stop":
-            # Find active session
-            active = db.client.table("bookings").select("*").eq("user_id", request.user_id).eq("status", "Confirmed").execute()
-            if not active.data:
+            # Find active session; fall back to the database in case another
+            # worker started it since the last registry reload
+            session = charging_sessions.for_user(request.user_id) or await _active_session(request.user_id, refresh=True)
+            if not session:
                  return {"status": "success", "message": "No active charging session", "is_charging": False}
-            
-            session = active.data[0]
-            # Update to Completed
-            now_iso = datetime.now().isoformat()
-            db.client.table("bookings").update({
-                "status": "Completed", 
-                "end_time": now_iso
-            }).eq("id", session['id']).execute()
-            
-            return {"status": "success", "message": "Charging stopped", "is_charging": False}
+
+            # Bill what the meter reported (telemetry.py), then mark Completed
+            usage = await telemetry.bill(session)
+            result = await adb.complete_charging_session(session['id'], usage)
+            if not result["success"]:
+                # Stopped elsewhere already
+                return {"status": "success", "message": "No active charging session", "is_charging": False}
+
+            return {"status": "success", "message": "Charging stopped", "is_charging": False, **usage}
 
         elif request.action == "status":
-             active = db.client.table("bookings").select("*").eq("user_id", request.user_id).eq("status", "Confirmed").execute()
-             is_charging = len(active.data) > 0
-             return {
-                 "status": "success", 
-                 "is_charging": is_charging, 
-                 "session": active.data[0] if is_charging else None
-             }
+             session = await _active_session(request.user_id)
+             meter = telemetry.live(session['id']) if session else None
+             return {"status": "success", "is_charging": session is not None, "session": session, "meter": meter}
         
         else:
             raise HTTPException(status_code=400, detail="Invalid action")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Charge Control Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _active_session(user_id: str, refresh: bool = False) -> Optional[dict]:
+    """The user's running session from the registry, or the database if it isn't loaded"""
+    if charging_sessions.loaded and not refresh:
+        return charging_sessions.for_user(user_id)
+    return await adb.get_active_session(user_id)
+
+@app.get("/api/charge/events")
+async def charge_events(user_id: str, request: Request):
+    """
+    Server-Sent Events stream of the user's charging session state.
+    Sends the current state on connect, then one `session` event per change
+    (same shape as action=status), with a comment line as keep-alive.
+    """
+    user = await adb.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    async def stream():
+        queue = charging_sessions.subscribe(user_id)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    state = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: session\ndata: {json.dumps(state, default=str)}\n\n"
+        finally:
+            charging_sessions.unsubscribe(user_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+class MeterSamples(BaseModel):
+    session_id: int # booking id of the charging session
+    ts: List[float] # epoch seconds
+    power_kw: List[Optional[float]]
+    energy_kwh: Optional[List[Optional[float]]] = None # meter register
+    soc: Optional[List[Optional[float]]] = None
+
+class TelemetryBatch(BaseModel):
+    sessions: List[MeterSamples]
+
+@app.post("/api/telemetry")
+async def ingest_telemetry(batch: TelemetryBatch):
+    """
+    Meter samples from chargers, batched per session as parallel arrays.
+    Buffered in memory and written as 1-minute aggregates (telemetry.py).
+    """
+    accepted = received = 0
+    try:
+        await telemetry.resume([samples.session_id for samples in batch.sessions])
+        for samples in batch.sessions:
+            received += len(samples.ts)
+            accepted += telemetry.ingest(samples.session_id, samples.ts, samples.power_kw,
+                                         samples.energy_kwh, samples.soc)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "accepted": accepted, "dropped": received - accepted}
+
+@app.websocket("/ocpp/{charge_point_id}")
+async def ocpp_endpoint(websocket: WebSocket, charge_point_id: str):
+    """OCPP 1.6-J connection from a charger (ocpp_gateway.py)"""
+    await ocpp_gateway.serve(websocket, charge_point_id)
+
 @app.post("/api/optimize", response_model=ScheduleResponse)
 def optimize_charging(request: ChargeRequest):
     logger.info(f"MAIN: Received optimize request: {request}")
@@ -152,24 +250,55 @@ def optimize_charging(request: ChargeRequest):
 async def get_solar_forecast(
     hours_ahead: int = 12, 
     lat: float = 12.9716, 
-    lng: float = 77.5946
+    lng: float = 77.5946,
+    format: str = "rows"
 ):
     """
     Get ML-based solar efficiency forecast
     Uses Open-Meteo API for real-time weather data
+    format=columnar returns parallel per-field arrays instead of per-hour objects
     """
+    if format not in ("rows", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be 'rows' or 'columnar'")
     try:
-        from ml_service import solar_ml
-        forecast = await solar_ml.get_forecast(lat=lat, lng=lng, hours_ahead=hours_ahead)
+        from ml_service import solar_ml, InferenceOverloaded
+        try:
+            forecast = await solar_ml.get_forecast(
+                lat=lat, lng=lng, hours_ahead=hours_ahead, columnar=(format == "columnar")
+            )
+        except InferenceOverloaded:
+            raise HTTPException(status_code=503, detail="Forecast service busy, please retry", headers={"Retry-After": "2"})
         return {
             "status": "success",
             "location": {"lat": lat, "lng": lng},
+            "format": format,
             "forecast": forecast
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"ML Forecast error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/metrics")
+def get_metrics():
+    """Runtime metrics for capacity planning"""
+    from ml_service import solar_ml
+    from user_cache import user_cache
+    from booking_archiver import booking_archiver
+    return {
+        "status": "success",
+        "solar_inference": solar_ml.executor.metrics(),
+        "user_cache": user_cache.metrics(),
+        "password_hashing": password_hasher.metrics(),
+        "booking_archiver": booking_archiver.metrics(),
+        "chat_writes": message_writer.metrics(),
+        "telemetry": telemetry.metrics(),
+        "ocpp": ocpp_gateway.metrics(),
+        "charging_sessions": charging_sessions.metrics(),
+        "queries": query_metrics.snapshot()
+    }
+
 class BookingConfirmation(BaseModel):
     user_email: str
     user_name: str
@@ -222,7 +351,7 @@ async def create_booking(booking: CreateBookingRequest):
         
         # Attempt to create booking via DB (handles overlaps)
         from database import db
-        result = await db.create_booking_if_available(booking_data)
+        result = await adb.create_booking_if_available(booking_data)
         
         if result["success"]:
             # Send confirmation email asynchronously
@@ -232,8 +361,10 @@ async def create_booking(booking: CreateBookingRequest):
                 logger.error(f"Failed to trigger post-booking actions: {e}")
                 
             return {"status": "success", "booking": result["booking"]}
-        else:
+        elif result.get("conflict"):
             raise HTTPException(status_code=409, detail=result["error"])
+        else:
+            raise HTTPException(status_code=500, detail=result["error"])
             
     except HTTPException as he:
         raise he
@@ -245,6 +376,10 @@ class SmartScheduleRequest(BaseModel):
     lat: float
     lng: float
     energy_needed: float = 20.0 # kWh
+    distance_weight: float = 10.0
+    cost_weight: float = 5.0
+    efficiency_weight: float = 0.5
+    top_n: int = 1
 
 @app.post("/api/smart-schedule")
 async def get_smart_schedule(req: SmartScheduleRequest):
@@ -256,124 +391,106 @@ async def get_smart_schedule(req: SmartScheduleRequest):
     """
     try:
         from database import db
-        from ml_service import solar_ml
+        from ml_service import solar_ml, InferenceOverloaded
         from datetime import datetime, timedelta
-        import math
-        
-        # 1. Fetch all chargers
-        chargers_res = db.client.table("chargers").select("*").execute()
-        if not chargers_res.data:
+        import numpy as np
+        import smart_schedule
+        from spatial_index import charger_index
+        from charger_catalog import charger_catalog
+        
+        # 1. All chargers, from the in-memory catalog
+        catalog = charger_catalog.snapshot()
+        if not len(catalog):
             raise HTTPException(status_code=404, detail="No chargers found")
-            
-        chargers = chargers_res.data
-        
-        # 2. Find Nearest Charger (Haversine)
-        def haversine(lat1, lon1, lat2, lon2):
-            try:
-                lat1, lon1, lat2, lon2 = map(float, [lat1, lon1, lat2, lon2])
-                R = 6371  # Earth radius in km
-                dlat = math.radians(lat2 - lat1)
-                dlon = math.radians(lon2 - lon1)
-                a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-                c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                return R * c
-            except:
-                return 999999 # Large distance if error
-
-        # Filter out chargers under maintenance
-        valid_chargers = [c for c in chargers if c.get('status') != 'Maintenance']
-        
-        if not valid_chargers:
-             raise HTTPException(status_code=404, detail="No available chargers found nearby")
-
-        nearest_charger = min(valid_chargers, key=lambda c: haversine(
-            req.lat, req.lng, 
-            (c.get('location') or {}).get('lat', 0), 
-            (c.get('location') or {}).get('lng', 0)
-        ))
-        
-        # 3. Get Solar Forecast for this location
-        forecast = await solar_ml.get_forecast(req.lat, req.lng, hours_ahead=24)
-        
-        # 4. Evaluate all available chargers to find the overall "best" option
-        best_overall = None
-        min_score = float('inf')
-
-        for charger in valid_chargers:
-            charger_lat = (charger.get('location') or {}).get('lat', 12.9716)
-            charger_lng = (charger.get('location') or {}).get('lng', 77.5946)
-            distance = haversine(req.lat, req.lng, charger_lat, charger_lng)
-            cost = charger.get('cost_per_kwh', 12.0)
-            
-            # Find the best available solar slot for THIS charger
-            charger_best_slot = None
-            max_eff = -1
-            
-            # Sort forecast to check high efficiency first
-            sorted_forecast = sorted(forecast, key=lambda x: x['efficiency'], reverse=True)
-            
-            for slot in sorted_forecast:
-                try: 
-                    # Recover relative index
-                    relative_idx = -1
-                    for i, ff in enumerate(forecast):
-                        if ff['hour'] == slot['hour'] and ff['weather'] == slot['weather']:
-                            relative_idx = i
-                            break
-                    
-                    if relative_idx == -1: continue
-                    
-                    # Ensure we look forward in time
-                    target_dt = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=relative_idx)
-                    start_time = target_dt.isoformat()
-                    end_time = (target_dt + timedelta(hours=2)).isoformat()
-                    
-                    # Check for overlaps for THIS specific charger
-                    overlaps = db.client.table("bookings")\
-                        .select("id")\
-                        .eq("charger_id", charger['id'])\
-                        .lt("start_time", end_time)\
-                        .gt("end_time", start_time)\
-                        .neq("status", "Cancelled")\
-                        .execute()
-                        
-                    if not overlaps.data:
-                        charger_best_slot = {
-                            "start_time": start_time,
-                            "end_time": end_time,
-                            "efficiency": slot['efficiency'],
-                            "weather": slot['weather']
-                        }
-                        break
-                except:
-                    continue
-            
-            if charger_best_slot:
-                # Calculate composite score (Lower is Better)
-                # Distance (km) * 10 
-                # + Cost * 5
-                # - Efficiency * 0.5 (negative weight because high efficiency should REDUCE score)
-                score = (distance * 10) + (cost * 5) - (charger_best_slot['efficiency'] * 0.5)
-                
-                if score < min_score:
-                    min_score = score
-                    best_overall = {
-                        "charger": charger,
-                        "best_slot": charger_best_slot,
-                        "score": score
-                    }
 
-        if not best_overall:
+        # 2. Forecast for this location
+        try:
+            forecast = await solar_ml.get_forecast(req.lat, req.lng, hours_ahead=24, columnar=True)
+        except InferenceOverloaded:
+            raise HTTPException(status_code=503, detail="Forecast service busy, please retry", headers={"Retry-After": "2"})
+        n_hours = len(forecast["hour"])
+        efficiency = np.array(forecast["efficiency"], dtype=float)
+        weights = smart_schedule.ScoreWeights(
+            distance=req.distance_weight, cost=req.cost_weight, efficiency=req.efficiency_weight
+        )
+        window_start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        window_end = window_start + timedelta(hours=n_hours + smart_schedule.SLOT_HOURS)
+
+        # Chargers not under maintenance: the spatial index places those with
+        # coordinates; the rest are always candidates, at the default location
+        in_service = smart_schedule.catalog_summary(catalog)
+        if in_service is None:
+            raise HTTPException(status_code=404, detail="No available chargers found nearby")
+        unplaced = [(c['id'], smart_schedule.fallback_distance(c, req.lat, req.lng)) for c in in_service.unplaced]
+
+        # 3. Nearest chargers first, widening until no charger further away
+        # could still make the top_n (or every charger has been scored)
+        k = smart_schedule.MAX_CANDIDATES
+        while True:
+            nearest = charger_index.nearest(req.lat, req.lng, k=k, exclude_statuses=('Maintenance',))
+            exhausted = len(nearest) < k
+            candidates = sorted(
+                [(cid, d) for cid, d in nearest if cid in catalog.by_id] + unplaced, key=lambda r: r[1]
+            )
+            valid_chargers = [catalog.by_id[charger_id] for charger_id, _ in candidates]
+            if not valid_chargers:
+                raise HTTPException(status_code=404, detail="No available chargers found nearby")
+
+            # 4. Availability for every candidate charger over the whole window:
+            # the occupancy index if it covers it, else one bookings query.
+            candidate_ids = [c['id'] for c in valid_chargers]
+            busy = occupancy_index.busy_view(candidate_ids, window_start, window_end)
+            if busy is None:
+                busy_res = await adb.get_busy_intervals(candidate_ids, window_start.isoformat(), window_end.isoformat())
+                if not busy_res["success"]:
+                    raise HTTPException(status_code=500, detail=busy_res["error"])
+                busy = busy_res["busy"]
+
+            # 5. Score every charger × hour pair in one matrix (lower is better)
+            distances = np.array([distance for _, distance in candidates], dtype=float)
+            costs = np.array([smart_schedule.charger_cost(c) for c in valid_chargers], dtype=float)
+            available = smart_schedule.availability_matrix(valid_chargers, busy, window_start, n_hours)
+            ranked = smart_schedule.rank_options(distances, costs, efficiency, available, weights, req.top_n)
+
+            if exhausted or not smart_schedule.may_improve(
+                    ranked, req.top_n, nearest[-1][1], in_service.min_cost, float(efficiency.max(initial=0.0)), weights):
+                break
+            k *= 4
+
+        if not ranked:
             raise HTTPException(status_code=404, detail="Could not find any available slot across all chargers")
 
+        options = []
+        for charger_idx, hour_idx, score in ranked:
+            target_dt = window_start + timedelta(hours=hour_idx)
+            options.append({
+                "charger": dict(valid_chargers[charger_idx]),
+                "best_slot": {
+                    "start_time": target_dt.isoformat(),
+                    "end_time": (target_dt + timedelta(hours=smart_schedule.SLOT_HOURS)).isoformat(),
+                    "efficiency": forecast["efficiency"][hour_idx],
+                    "weather": {
+                        "cloud_cover": forecast["cloud_cover"][hour_idx],
+                        "radiation": forecast["radiation"][hour_idx],
+                        "temp_c": forecast["temp_c"][hour_idx],
+                        "uv_index": forecast["uv_index"][hour_idx]
+                    }
+                },
+                "score": score
+            })
+
+        best_overall = options[0]
         return {
             "status": "success",
             "charger": best_overall['charger'],
             "best_slot": best_overall['best_slot'],
             "score": best_overall['score'],
+            "options": options,
             "message": "Found most cost-efficient and solar-friendly charging option"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Smart Schedule error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -382,29 +499,19 @@ class CancelBookingRequest(BaseModel):
     booking_id: int
 
 @app.post("/api/cancel-booking")
-def cancel_booking(request: CancelBookingRequest):
+async def cancel_booking(request: CancelBookingRequest):
     """Cancel a booking by updating its status to Cancelled"""
     try:
-        from supabase import create_client
-        import os
-        
-        supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_KEY", os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY"))
-        
-        if not supabase_url or not supabase_key:
-            raise HTTPException(status_code=500, detail="Supabase credentials not configured")
-        
-        supabase = create_client(supabase_url, supabase_key)
-        
-        # Update booking status to Cancelled
-        response = supabase.table("bookings").update(
-            {"status": "Cancelled"}
-        ).eq("id", request.booking_id).execute()
+        result = await adb.cancel_booking(request.booking_id)
         
-        if response.data:
+        if result["success"]:
             return {"status": "success", "message": "Booking cancelled successfully"}
-        else:
+        elif result["error"] == "Booking not found":
             raise HTTPException(status_code=404, detail="Booking not found")
+        else:
+            raise HTTPException(status_code=500, detail=result["error"])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -449,10 +556,9 @@ class RegisterRequest(BaseModel):
     admin_code: Optional[str] = None  # Secret code for staff access
 
 @app.post("/api/register")
-def register(request: RegisterRequest):
+async def register(request: RegisterRequest):
     """Register a new user with email verification"""
     try:
-        from database import db
         import uuid
         
         # Validate email format
@@ -477,7 +583,7 @@ def register(request: RegisterRequest):
         verification_token = str(uuid.uuid4())
         
         # Create user in Supabase
-        result = db.create_user(
+        result = await adb.create_user(
             email=request.email,
             password=request.password,
             full_name=request.full_name,
@@ -502,6 +608,8 @@ def register(request: RegisterRequest):
             
     except HTTPException:
         raise
+    except HasherOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -536,7 +644,7 @@ def add_charger(request: AddChargerRequest):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
             
-        if user.get("role") != "staff":
+        if user.role != "staff":
             raise HTTPException(status_code=403, detail="Access Denied: Staff only")
             
         # Proceed to add charger
@@ -588,13 +696,11 @@ class LoginRequest(BaseModel):
     password: str
 
 @app.post("/api/login")
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     """Login with email and password"""
     try:
-        from database import db
-        
-        # Get user from database
-        user = db.get_user_by_email(request.email)
+        # Get user from database (uncached: the only path that needs password_hash)
+        user = await adb.get_user_for_login(request.email)
         
         if not user:
             raise HTTPException(
@@ -603,38 +709,39 @@ def login(request: LoginRequest):
             )
         
         # Check if user is verified
-        if not user.get("is_verified", False):
+        if not user.is_verified:
             raise HTTPException(
                 status_code=403,
                 detail="Account not verified. Please check your email."
             )
         
         # Verify password
-        if not db.verify_password(request.password, user["password_hash"]):
+        if not await adb.verify_password(request.password, user.password_hash):
             raise HTTPException(
                 status_code=401,
                 detail="Invalid email or password"
             )
         
+        # Upgrade the stored hash if BCRYPT_ROUNDS changed since it was made
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                new_hash = await adb.hash_password(request.password)
+                if await adb.set_password_hash(user.id, new_hash):
+                    password_hasher.record_rehash()
+            except HasherOverloaded:
+                pass  # Try again on a later login
+        
         # Return user data (excluding password)
         return {
             "status": "success",
             "message": "Login successful",
-            "user": {
-                "id": user["id"],
-                "email": user["email"],
-                "full_name": user.get("full_name"),
-                "vehicle_model": user.get("vehicle_model"),
-                "battery_capacity": user.get("battery_capacity"),
-                "avatar_url": user.get("avatar_url"),
-                "created_at": user.get("created_at"),
-                "country": user.get("country"),
-                "role": user.get("role")
-            }
+            "user": user.session_payload()
         }
         
     except HTTPException:
         raise
+    except HasherOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Login error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -667,23 +774,13 @@ def verify_session(request: VerifySessionRequest):
         if not user:
             raise HTTPException(status_code=401, detail="Invalid session")
         
-        if not user.get("is_verified", False):
+        if not user.is_verified:
             raise HTTPException(status_code=403, detail="Account not verified")
         
         # Return user data
         return {
             "status": "success",
-            "user": {
-                "id": user["id"],
-                "email": user["email"],
-                "full_name": user.get("full_name"),
-                "vehicle_model": user.get("vehicle_model"),
-                "battery_capacity": user.get("battery_capacity"),
-                "avatar_url": user.get("avatar_url"),
-                "created_at": user.get("created_at"),
-                "country": user.get("country"),
-                "role": user.get("role")
-            }
+            "user": user.session_payload()
         }
         
     except HTTPException:
@@ -743,24 +840,25 @@ def update_profile(request: UpdateProfileRequest):
 class GetBookingsRequest(BaseModel):
     user_id: Any
     limit: Optional[int] = 5
+    cursor: Optional[str] = None
 
 @app.post("/api/bookings")
 def get_user_bookings(request: GetBookingsRequest):
-    """Get upcoming bookings for a user"""
+    """Get a page of upcoming bookings for a user; pass page.next_cursor back as cursor for the next"""
     try:
         from database import db
-        result = db.get_bookings(request.user_id, request.limit)
+        limit = clamp_limit(request.limit, default=5)
+        result = db.get_bookings(request.user_id, limit, request.cursor)
         
         if result["success"]:
-            return {
-                "status": "success",
-                "bookings": result["bookings"]
-            }
+            return envelope("bookings", result["bookings"], limit, result["next_cursor"])
         else:
             raise HTTPException(status_code=400, detail=result["error"])
             
     except HTTPException:
         raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching bookings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -794,28 +892,21 @@ async def chat_assistant(request: ChatRequest):
         conversation_id = request.conversation_id
         user_id = str(request.user_id) if request.user_id else None
 
+        # History rows are queued and written in the background (message_writer.py)
         if user_id and not conversation_id:
             # Create new conversation if not provided
-            try:
-                res = db.client.table("conversations").insert({
-                    "user_id": user_id,
-                    "title": request.message[:50] + "..."
-                }).execute()
-                if res.data:
-                    conversation_id = res.data[0]['id']
-            except Exception as e:
-                logger.error(f"Failed to create conversation: {e}")
+            conversation_id = message_writer.write("conversations", {
+                "user_id": user_id,
+                "title": request.message[:50] + "..."
+            })["id"]
 
         # 2. Save User Message
         if conversation_id:
-            try:
-                db.client.table("messages").insert({
-                    "conversation_id": conversation_id,
-                    "role": "user",
-                    "content": request.message
-                }).execute()
-            except Exception as e:
-                logger.error(f"Failed to save user message: {e}")
+            message_writer.write("messages", {
+                "conversation_id": conversation_id,
+                "role": "user",
+                "content": request.message
+            })
 
         # 3. Run Agent
         loop = asyncio.get_event_loop()
@@ -831,14 +922,11 @@ async def chat_assistant(request: ChatRequest):
 
         # 4. Save Assistant Response
         if conversation_id:
-            try:
-                db.client.table("messages").insert({
-                    "conversation_id": conversation_id,
-                    "role": "assistant",
-                    "content": str(result)
-                }).execute()
-            except Exception as e:
-                logger.error(f"Failed to save assistant message: {e}")
+            message_writer.write("messages", {
+                "conversation_id": conversation_id,
+                "role": "assistant",
+                "content": str(result)
+            })
 
         return {
             "status": "success",
@@ -853,19 +941,29 @@ async def chat_assistant(request: ChatRequest):
         }
 
 @app.get("/api/chat/history")
-async def get_chat_history(user_id: str):
-    """Get list of conversations for a user"""
+async def get_chat_history(user_id: str, limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None):
+    """Get a page of a user's conversations, newest first"""
     try:
-        res = db.client.table("conversations").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
-        return {"status": "success", "conversations": res.data}
+        limit = clamp_limit(limit)
+        result = await adb.get_conversations(user_id, limit, cursor)
+        if not result["success"]:
+            return {"status": "error", "detail": result["error"]}
+        return envelope("conversations", result["conversations"], limit, result["next_cursor"])
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
 @app.get("/api/chat/history/{conversation_id}")
-async def get_chat_messages(conversation_id: str):
-    """Get messages for a specific conversation"""
+async def get_chat_messages(conversation_id: str, limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None):
+    """Get the latest page of messages in chronological order; next_cursor pages back to older ones"""
     try:
-        res = db.client.table("messages").select("*").eq("conversation_id", conversation_id).order("created_at", desc=False).execute()
-        return {"status": "success", "messages": res.data}
+        limit = clamp_limit(limit)
+        result = await adb.get_messages(conversation_id, limit, cursor)
+        if not result["success"]:
+            return {"status": "error", "detail": result["error"]}
+        return envelope("messages", result["messages"], limit, result["next_cursor"])
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"status": "error", "detail": str(e)}
@@ -0,0 +1,258 @@
+"""
+Write-behind persistence for chat history
+/api/chat queues conversation and message rows here instead of inserting them
+inline; a background task writes everything queued as one bulk upsert per
+table every CHAT_WRITE_FLUSH_MS, or as soon as CHAT_WRITE_BATCH_ROWS rows are
+waiting, so chat latency no longer includes database writes.
+
+Rows carry their own id and created_at (set when queued), which keeps history
+in the order things were said and makes writes idempotent: a batch that is
+retried, or replayed after a crash, upserts with ignore_duplicates.
+
+Failures:
+- transient (network, 5xx): retried CHAT_WRITE_MAX_RETRIES times with
+  backoff, then the batch is spilled to a JSONL file in CHAT_WRITE_SPILL_DIR
+  (fsynced, written atomically) and replayed once writes succeed again, by
+  this or any other worker process. Spill files are named after their oldest
+  row's created_at and replayed in that order, and nothing newer is written
+  while any are waiting (newer batches are spilled behind them), so a message
+  never reaches the database before the conversation it belongs to;
+- bad rows (Postgres 22xxx/23xxx): the batch is written row by row and only
+  the rejected rows are dropped, with an error log.
+
+stop() (app shutdown) flushes whatever is queued; anything it can't write
+is spilled, not lost. Conversations and messages become visible to the
+history endpoints within one flush interval.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+from supabase_clients import supabase_clients
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = int(os.getenv("CHAT_WRITE_FLUSH_MS", "250")) / 1000
+BATCH_ROWS = int(os.getenv("CHAT_WRITE_BATCH_ROWS", "200"))
+MAX_RETRIES = int(os.getenv("CHAT_WRITE_MAX_RETRIES", "3"))
+MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", "10000"))
+SPILL_DIR = Path(os.getenv("CHAT_WRITE_SPILL_DIR", str(Path(__file__).parent / "chat_spill")))
+RETRY_BACKOFF = 0.2
+
+# Parents first, so messages never arrive before their conversation
+FLUSH_ORDER = ("conversations", "messages")
+
+
+def _is_data_error(e: APIError) -> bool:
+    """Rejected rows (bad input, constraint violations) rather than an unavailable database"""
+    return str(e.code or "")[:2] in ("22", "23")
+
+
+class MessageWriter:
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, batch_rows: int = BATCH_ROWS,
+                 max_retries: int = MAX_RETRIES, max_pending: int = MAX_PENDING, spill_dir: Path = SPILL_DIR):
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self.spill_dir = Path(spill_dir)
+        self._pending: List[Tuple[str, Dict[str, Any]]] = []
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"flushes": 0, "written_rows": 0, "retries": 0, "spilled_rows": 0,
+                       "replayed_rows": 0, "dropped_rows": 0, "last_flush_ms": None, "last_error": None}
+
+    # ---- producers -------------------------------------------------------
+
+    def write(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a row; fills in id and created_at if missing and returns it"""
+        if table not in FLUSH_ORDER:
+            raise ValueError(f"MessageWriter does not write to {table}")
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        if len(self._pending) >= self.max_pending:
+            # Writes are far behind: move the queue to disk, oldest first, rather than grow memory
+            batch, self._pending = self._pending + [(table, row)], []
+            self._spill(batch)
+            return row
+        self._pending.append((table, row))
+        if self._task is None:
+            self.start()
+        if len(self._pending) >= self.batch_rows:
+            self._wake.set()
+        return row
+
+    # ---- writing ---------------------------------------------------------
+
+    async def _upsert(self, client, table: str, rows: List[Dict[str, Any]]):
+        await client.table(table).upsert(rows, ignore_duplicates=True).execute()
+
+    async def _write_rows(self, batch: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Upsert a batch; returns how many rows were dropped as invalid"""
+        client = await supabase_clients.async_client()
+        dropped = 0
+        for table in FLUSH_ORDER:
+            rows = [row for t, row in batch if t == table]
+            if not rows:
+                continue
+            try:
+                await self._upsert(client, table, rows)
+            except APIError as e:
+                if not _is_data_error(e):
+                    raise
+                # Find the offending rows; the rest still get written
+                for row in rows:
+                    try:
+                        await self._upsert(client, table, [row])
+                    except APIError as row_error:
+                        if not _is_data_error(row_error):
+                            raise
+                        dropped += 1
+                        logger.error(f"Dropped {table} row {row.get('id')}: {row_error}")
+        return dropped
+
+    async def _write_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """Write with retries; False if the database stayed unavailable"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                dropped = await self._write_rows(batch)
+                self._stats["written_rows"] += len(batch) - dropped
+                self._stats["dropped_rows"] += dropped
+                self._stats["last_error"] = None
+                return True
+            except Exception as e:
+                self._stats["last_error"] = str(e)
+                if attempt == self.max_retries:
+                    logger.error(f"Chat history write failed after {attempt + 1} attempts: {e}")
+                    return False
+                self._stats["retries"] += 1
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+        return False
+
+    async def flush(self):
+        """Write everything queued so far behind any spilled rows, spilling what can't be written"""
+        async with self._flush_lock:
+            if self._has_spilled():
+                await self._replay()
+            while self._pending:
+                if self._has_spilled():
+                    # Older rows are still on disk: queue behind them, never ahead
+                    batch, self._pending = self._pending, []
+                    self._spill(batch)
+                    return
+                batch = self._pending[:self.batch_rows]
+                del self._pending[:len(batch)]
+                started = time.perf_counter()
+                try:
+                    written = await self._write_batch(batch)
+                except asyncio.CancelledError:
+                    self._pending[:0] = batch
+                    raise
+                self._stats["flushes"] += 1
+                self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                if not written:
+                    self._spill(batch)
+
+    # ---- spill files -----------------------------------------------------
+
+    def _has_spilled(self) -> bool:
+        return self.spill_dir.is_dir() and any(self.spill_dir.glob("*.jsonl"))
+
+    def _spill(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        # Named by the oldest row, so replaying in name order replays in the order rows were queued
+        try:
+            oldest = int(datetime.fromisoformat(batch[0][1]["created_at"]).timestamp() * 1_000_000) * 1000
+        except (KeyError, TypeError, ValueError):
+            oldest = time.time_ns()
+        path = self.spill_dir / f"{oldest:019d}-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for table, row in batch:
+                f.write(json.dumps({"table": table, "row": row}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._stats["spilled_rows"] += len(batch)
+        logger.warning(f"Spilled {len(batch)} chat history rows to {path.name}")
+
+    def _release_stale_claims(self):
+        """Hand back files claimed by worker processes that died mid-replay"""
+        for claimed in self.spill_dir.glob("*.jsonl.*.claimed"):
+            pid = int(claimed.suffixes[-2].lstrip("."))
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                os.replace(claimed, claimed.with_name(claimed.name.split(".jsonl.")[0] + ".jsonl"))
+            except PermissionError:
+                pass
+
+    async def replay_spilled(self):
+        """Write spilled batches back, oldest first; stops at the first failure"""
+        async with self._flush_lock:
+            await self._replay()
+
+    async def _replay(self):
+        if not self.spill_dir.is_dir():
+            return
+        self._release_stale_claims()
+        for path in sorted(self.spill_dir.glob("*.jsonl")):
+            claimed = path.with_name(f"{path.name}.{os.getpid()}.claimed")
+            try:
+                os.rename(path, claimed)   # another worker may get there first
+            except FileNotFoundError:
+                continue
+            with open(claimed, encoding="utf-8") as f:
+                batch = [(entry["table"], entry["row"]) for entry in map(json.loads, filter(str.strip, f))]
+            if not await self._write_batch(batch):
+                os.replace(claimed, path)
+                return
+            claimed.unlink()
+            self._stats["replayed_rows"] += len(batch)
+            logger.info(f"Replayed {len(batch)} spilled chat history rows from {path.name}")
+
+    # ---- lifecycle -------------------------------------------------------
+
+    async def _run(self):
+        await self.replay_spilled()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat history writer error: {e}")
+
+    def start(self):
+        """Start the flush task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="message-writer")
+
+    async def stop(self):
+        """Stop the flush task and write (or spill) everything still queued"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        spilled_files = len(list(self.spill_dir.glob("*.jsonl"))) if self.spill_dir.is_dir() else 0
+        return {"pending_rows": len(self._pending), "spilled_files": spilled_files, **self._stats}
+
+
+message_writer = MessageWriter()
@@ -0,0 +1,176 @@
+"""
+Versioned schema migrations
+Applies migrations/NNNN_name.sql in version order and records each one in
+public.schema_migrations, so every environment can tell which schema it is on
+and nothing is applied twice. Each migration runs in its own transaction
+together with its bookkeeping row; an advisory lock keeps two deploys from
+migrating at once.
+
+Applied migrations are checksummed: editing one after it shipped is an error,
+add a new migration instead. The migrations written before this runner are
+idempotent, so the first run against an existing database only records them.
+
+Talks to Postgres directly (Supabase: Project Settings -> Database ->
+Connection string), via psycopg (requirements-dev.txt).
+
+    python migrate.py status
+    python migrate.py up [--to VERSION] [--dry-run]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+# Arbitrary, fixed key for pg_advisory_lock
+LOCK_KEY = 7_040_044
+
+SCHEMA_MIGRATIONS_DDL = """
+create table if not exists public.schema_migrations (
+  version integer primary key,
+  name text not null,
+  checksum text not null,
+  applied_at timestamp with time zone default timezone('utc'::text, now()) not null
+)
+"""
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+    def __str__(self):
+        return f"{self.version:04d}_{self.name}"
+
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Migrations in a directory, ordered by version"""
+    migrations: Dict[int, Migration] = {}
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE.match(path.name)
+        if not match:
+            raise MigrationError(f"{path.name}: migration files must be named NNNN_name.sql")
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"{path.name}: version {version} is already used by {migrations[version].path.name}")
+        migrations[version] = Migration(version, match.group(2), path)
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def applied_versions(conn: psycopg.Connection) -> Dict[int, str]:
+    """version -> checksum of everything recorded in schema_migrations"""
+    exists = conn.execute("select to_regclass('public.schema_migrations')").fetchone()[0]
+    if exists is None:
+        return {}
+    return dict(conn.execute("select version, checksum from public.schema_migrations").fetchall())
+
+
+def check_applied(migrations: List[Migration], applied: Dict[int, str]):
+    changed = [str(m) for m in migrations if m.version in applied and applied[m.version] != m.checksum]
+    if changed:
+        raise MigrationError(f"Applied migrations were edited: {', '.join(changed)}. Add a new migration instead.")
+
+
+def migrate(dsn: str, directory: Path = MIGRATIONS_DIR, target: Optional[int] = None,
+            dry_run: bool = False) -> List[Migration]:
+    """Apply pending migrations up to `target` (inclusive); returns those applied"""
+    migrations = discover(directory)
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute("select pg_advisory_lock(%s)", [LOCK_KEY])
+        try:
+            applied = applied_versions(conn)
+            check_applied(migrations, applied)
+            pending = [m for m in migrations
+                       if m.version not in applied and (target is None or m.version <= target)]
+            if dry_run or not pending:
+                return pending
+            conn.execute(SCHEMA_MIGRATIONS_DDL)
+            for migration in pending:
+                logger.info(f"Applying {migration}")
+                try:
+                    with conn.transaction():
+                        conn.execute(migration.sql)
+                        conn.execute(
+                            "insert into public.schema_migrations (version, name, checksum) values (%s, %s, %s)",
+                            [migration.version, migration.name, migration.checksum],
+                        )
+                except psycopg.Error as e:
+                    raise MigrationError(f"{migration} failed: {e}") from e
+            return pending
+        finally:
+            conn.execute("select pg_advisory_unlock(%s)", [LOCK_KEY])
+
+
+def status(dsn: str, directory: Path = MIGRATIONS_DIR) -> List[dict]:
+    migrations = discover(directory)
+    with psycopg.connect(dsn) as conn:
+        applied = applied_versions(conn)
+    rows = []
+    for m in migrations:
+        if m.version not in applied:
+            state = "pending"
+        elif applied[m.version] != m.checksum:
+            state = "edited after apply"
+        else:
+            state = "applied"
+        rows.append({"migration": str(m), "state": state})
+    return rows
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["up", "status"])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="Postgres connection string (default: $DATABASE_URL)")
+    parser.add_argument("--dir", type=Path, default=MIGRATIONS_DIR)
+    parser.add_argument("--to", type=int, default=None, help="stop after this version")
+    parser.add_argument("--dry-run", action="store_true", help="list pending migrations without applying them")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("no database: pass --dsn or set DATABASE_URL")
+
+    try:
+        if args.command == "status":
+            for row in status(args.dsn, args.dir):
+                print(f"{row['migration']:<40} {row['state']}")
+            return
+        done = migrate(args.dsn, args.dir, target=args.to, dry_run=args.dry_run)
+    except MigrationError as e:
+        print(f"FAIL: {e}")
+        sys.exit(1)
+    if not done:
+        print("Schema is up to date")
+    elif args.dry_run:
+        print("Pending: " + ", ".join(str(m) for m in done))
+    else:
+        print(f"Applied {len(done)} migration(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+-- Core tables as the backend uses them (app-managed users with bigint ids,
+-- not Supabase auth). Existing databases already have these, so this is a
+-- no-op there; on a fresh database it gives the later migrations something
+-- to build on.
+
+create table if not exists public.users (
+  id bigint generated by default as identity primary key,
+  email text,
+  password_hash text,
+  full_name text,
+  avatar_url text,
+  vehicle_model text,
+  battery_capacity float,
+  verification_token text,
+  is_verified boolean default false,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create table if not exists public.chargers (
+  id bigint generated by default as identity primary key,
+  name text not null,
+  location jsonb,
+  status text check (status in ('Available', 'Occupied', 'Offline')) default 'Available',
+  cost_per_kwh float default 12.0,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create table if not exists public.bookings (
+  id bigint generated by default as identity primary key,
+  user_id bigint references public.users(id) not null,
+  charger_id bigint references public.chargers(id) not null,
+  start_time timestamp with time zone not null,
+  end_time timestamp with time zone not null,
+  energy_kwh float,
+  total_cost float,
+  status text check (status in ('Pending', 'Confirmed', 'Completed', 'Cancelled')) default 'Pending',
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
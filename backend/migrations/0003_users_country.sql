@@ -0,0 +1,3 @@
+-- Country drives currency and pricing display; existing users default to India
+alter table public.users
+add column if not exists country text default 'India';
@@ -0,0 +1,20 @@
+-- Track row changes on chargers so the backend charger catalog can poll a
+-- max(updated_at) watermark instead of re-downloading the table.
+
+ALTER TABLE public.chargers
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = timezone('utc'::text, now());
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chargers_set_updated_at ON public.chargers;
+CREATE TRIGGER chargers_set_updated_at
+  BEFORE UPDATE ON public.chargers
+  FOR EACH ROW EXECUTE PROCEDURE public.set_updated_at();
+
+create index if not exists idx_chargers_updated_at on public.chargers(updated_at desc);
@@ -0,0 +1,38 @@
+-- Make double-booking impossible at the database level and let the backend
+-- book a slot in one round trip.
+--
+-- Before applying, resolve any existing overlaps, otherwise the constraint
+-- cannot be created. This lists them:
+--
+--   select a.id, b.id, a.charger_id
+--   from public.bookings a join public.bookings b
+--     on a.charger_id = b.charger_id and a.id < b.id
+--    and a.status <> 'Cancelled' and b.status <> 'Cancelled'
+--    and tstzrange(a.start_time, a.end_time, '[)') && tstzrange(b.start_time, b.end_time, '[)');
+
+create extension if not exists btree_gist;
+
+-- Half-open [start, end) so back-to-back bookings don't conflict
+alter table public.bookings
+add column if not exists period tstzrange
+  generated always as (tstzrange(start_time, end_time, '[)')) stored;
+
+alter table public.bookings drop constraint if exists bookings_no_overlap;
+alter table public.bookings
+add constraint bookings_no_overlap
+  exclude using gist (charger_id with =, period with &&)
+  where (status <> 'Cancelled');
+
+-- Insert a booking from a JSON object with the bookings column names.
+-- Overlaps fail with SQLSTATE 23P01 (exclusion_violation), which the backend
+-- maps to HTTP 409.
+create or replace function public.book_slot(p_booking jsonb)
+returns setof public.bookings
+language sql
+as $$
+  insert into public.bookings (user_id, charger_id, start_time, end_time, energy_kwh, total_cost, status)
+  select r.user_id, r.charger_id, r.start_time, r.end_time, r.energy_kwh, r.total_cost,
+         coalesce(r.status, 'Confirmed')
+  from jsonb_populate_record(null::public.bookings, p_booking) as r
+  returning *;
+$$;
@@ -0,0 +1,64 @@
+-- Keep the hot bookings table small: finished bookings move to
+-- bookings_archive in batches (backend/booking_archiver.py calls
+-- archive_bookings), and clearing a user's history is one set-based call.
+
+-- Same columns as bookings (generated columns become plain copies) + archived_at
+create table if not exists public.bookings_archive (like public.bookings including defaults);
+alter table public.bookings_archive
+add column if not exists archived_at timestamp with time zone default timezone('utc'::text, now()) not null;
+
+create index if not exists idx_bookings_archive_user_id on public.bookings_archive(user_id);
+create index if not exists idx_bookings_archive_end_time on public.bookings_archive(end_time);
+
+-- Partial index the archiver scans; stays tiny because rows leave once matched
+create index if not exists idx_bookings_finished_end_time on public.bookings(end_time)
+  where status in ('Completed', 'Cancelled');
+
+-- Move up to p_batch_size Completed/Cancelled bookings that ended more than
+-- p_older_than_days ago. SKIP LOCKED lets several workers run it at once.
+-- Returns the number of rows moved.
+create or replace function public.archive_bookings(p_older_than_days integer, p_batch_size integer default 500)
+returns integer
+language plpgsql
+as $$
+declare
+  moved_count integer;
+begin
+  with batch as (
+    select id from public.bookings
+    where status in ('Completed', 'Cancelled')
+      and end_time < timezone('utc'::text, now()) - make_interval(days => p_older_than_days)
+    order by end_time
+    limit p_batch_size
+    for update skip locked
+  ), moved as (
+    delete from public.bookings b
+    using batch
+    where b.id = batch.id
+    returning b.*
+  )
+  insert into public.bookings_archive
+  select moved.*, timezone('utc'::text, now()) from moved;
+
+  get diagnostics moved_count = row_count;
+  return moved_count;
+end;
+$$;
+
+-- Delete a user's finished bookings from both tables in one statement each,
+-- one round trip. Returns the number of rows deleted.
+create or replace function public.clear_user_history(p_user_id public.bookings.user_id%type)
+returns integer
+language sql
+as $$
+  with hot as (
+    delete from public.bookings
+    where user_id = p_user_id and status in ('Completed', 'Cancelled')
+    returning 1
+  ), archived as (
+    delete from public.bookings_archive
+    where user_id = p_user_id
+    returning 1
+  )
+  select ((select count(*) from hot) + (select count(*) from archived))::integer;
+$$;
@@ -0,0 +1,20 @@
+-- Indexes for the filters the backend runs on every request. Each one is
+-- checked by backend/check_query_plans.py, which fails if any hot query
+-- falls back to a sequential scan.
+
+-- Overlap checks and the occupancy index: charger_id = ? and start_time < ? and end_time > ?
+create index if not exists idx_bookings_charger_time on public.bookings (charger_id, start_time, end_time);
+
+-- Upcoming bookings and history clearing: user_id = ? [and status in (...)]
+create index if not exists idx_bookings_user_status on public.bookings (user_id, status);
+
+-- Login / registration lookups and email verification
+create index if not exists idx_users_email on public.users (email);
+create index if not exists idx_users_verification_token on public.users (verification_token);
+
+-- Keyset pagination of chat history on (created_at, id); these cover the
+-- single-column indexes from 0005_chat_history.sql
+create index if not exists idx_conversations_user_created on public.conversations (user_id, created_at desc, id desc);
+create index if not exists idx_messages_conversation_created on public.messages (conversation_id, created_at desc, id desc);
+drop index if exists public.idx_conversations_user_id;
+drop index if exists public.idx_messages_conversation_id;
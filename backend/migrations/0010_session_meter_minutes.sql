@@ -0,0 +1,14 @@
+-- One row per charging session (booking) per minute of meter telemetry,
+-- written in bulk by backend/telemetry.py. Raw samples stay in memory; the
+-- stop action sums energy_kwh to bill the session.
+create table if not exists public.session_meter_minutes (
+  booking_id bigint not null references public.bookings(id) on delete cascade,
+  minute timestamp with time zone not null,
+  samples integer not null,
+  energy_kwh double precision not null,   -- energy delivered during this minute
+  meter_kwh double precision,             -- meter register at the end of the minute
+  power_kw_avg double precision,
+  power_kw_max double precision,
+  soc_percent double precision,           -- last state of charge reported in the minute
+  primary key (booking_id, minute)
+);
@@ -0,0 +1,51 @@
+-- Stop exposing the generated period column (0007) in booking rows: it came
+-- back from every select * / returning *, including the book_slot RPC, and
+-- reached API responses. The exclusion constraint now indexes the range
+-- expression itself, so bookings is back to its own columns.
+--
+-- Recreating the constraint rebuilds its GiST index under an exclusive lock
+-- on bookings; apply outside peak hours on large tables.
+
+alter table public.bookings drop constraint if exists bookings_no_overlap;
+alter table public.bookings
+add constraint bookings_no_overlap
+  exclude using gist (charger_id with =, tstzrange(start_time, end_time, '[)') with &&)
+  where (status <> 'Cancelled');
+
+alter table public.bookings drop column if exists period;
+
+-- bookings_archive copied period as a plain column (0008); archive_bookings
+-- inserts bookings rows positionally, so the two tables must match again.
+alter table public.bookings_archive drop column if exists period;
+
+-- Explicit columns, so whatever is added to bookings later stays out of the
+-- RPC result until it is listed here. The return type changes, hence drop.
+--
+-- Concurrent inserts of overlapping bookings can deadlock (40P01) while the
+-- exclusion constraint waits on each other's uncommitted rows, so calls for
+-- the same charger take a transaction-scoped advisory lock first and queue;
+-- the loser then gets the usual 23P01.
+drop function if exists public.book_slot(jsonb);
+create function public.book_slot(p_booking jsonb)
+returns table (
+  id bigint,
+  user_id bigint,
+  charger_id bigint,
+  start_time timestamp with time zone,
+  end_time timestamp with time zone,
+  energy_kwh double precision,
+  total_cost double precision,
+  status text,
+  created_at timestamp with time zone
+)
+language sql
+as $$
+  select pg_advisory_xact_lock(hashtextextended('book_slot:' || (p_booking->>'charger_id'), 0));
+
+  insert into public.bookings as b (user_id, charger_id, start_time, end_time, energy_kwh, total_cost, status)
+  select r.user_id, r.charger_id, r.start_time, r.end_time, r.energy_kwh, r.total_cost,
+         coalesce(r.status, 'Confirmed')
+  from jsonb_populate_record(null::public.bookings, p_booking) as r
+  returning b.id, b.user_id, b.charger_id, b.start_time, b.end_time, b.energy_kwh, b.total_cost,
+            b.status, b.created_at;
+$$;
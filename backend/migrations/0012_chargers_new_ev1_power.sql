@@ -0,0 +1,9 @@
+-- Data fix formerly applied by hand from repair_schema.sql / fix_charger_power.sql:
+-- "New EV1" is a 3.3 kW charger, not the 7.0 kW column default from 0004,
+-- which roughly doubled its quoted cost per hour (about 330 rupees, not 700).
+-- The schema half of those scripts is covered by 0001 and 0004. No-op where
+-- the charger does not exist or is already corrected.
+update public.chargers
+set power_kw = 3.3
+where name = 'New EV1'
+  and power_kw is distinct from 3.3;
@@ -0,0 +1,96 @@
+-- Keep per-minute meter data when its booking is archived. 0010 declared
+-- session_meter_minutes.booking_id "on delete cascade", so archive_bookings
+-- (0008) deleting a finished booking silently dropped the minutes billed for
+-- it. They now move to session_meter_minutes_archive together with the
+-- booking, and the foreign key refuses any other delete of a metered booking.
+
+create table if not exists public.session_meter_minutes_archive (like public.session_meter_minutes including defaults);
+alter table public.session_meter_minutes_archive
+add column if not exists archived_at timestamp with time zone default timezone('utc'::text, now()) not null;
+
+create index if not exists idx_session_meter_minutes_archive_booking
+  on public.session_meter_minutes_archive(booking_id, minute);
+
+alter table public.session_meter_minutes
+drop constraint if exists session_meter_minutes_booking_id_fkey;
+alter table public.session_meter_minutes
+add constraint session_meter_minutes_booking_id_fkey
+  foreign key (booking_id) references public.bookings(id) on delete restrict;
+
+-- As in 0008, plus the batch's meter minutes, in the same transaction. The
+-- batch is locked first; telemetry still being written for one of its
+-- bookings waits on that lock and then fails its foreign key (23503), which
+-- telemetry.py already treats as an unknown session.
+create or replace function public.archive_bookings(p_older_than_days integer, p_batch_size integer default 500)
+returns integer
+language plpgsql
+as $$
+declare
+  batch_ids bigint[];
+  moved_at timestamp with time zone := timezone('utc'::text, now());
+  moved_count integer;
+begin
+  select array_agg(id) into batch_ids
+  from (
+    select id from public.bookings
+    where status in ('Completed', 'Cancelled')
+      and end_time < timezone('utc'::text, now()) - make_interval(days => p_older_than_days)
+    order by end_time
+    limit p_batch_size
+    for update skip locked
+  ) batch;
+
+  if batch_ids is null then
+    return 0;
+  end if;
+
+  with moved as (
+    delete from public.session_meter_minutes m
+    where m.booking_id = any(batch_ids)
+    returning m.*
+  )
+  insert into public.session_meter_minutes_archive
+  select moved.*, moved_at from moved;
+
+  with moved as (
+    delete from public.bookings b
+    where b.id = any(batch_ids)
+    returning b.*
+  )
+  insert into public.bookings_archive
+  select moved.*, moved_at from moved;
+
+  get diagnostics moved_count = row_count;
+  return moved_count;
+end;
+$$;
+
+-- Clearing history is the one delete that should drop meter data too: the
+-- user's finished bookings and their minutes, hot and archived.
+create or replace function public.clear_user_history(p_user_id public.bookings.user_id%type)
+returns integer
+language plpgsql
+as $$
+declare
+  hot_count integer;
+  archived_count integer;
+begin
+  delete from public.session_meter_minutes m
+  using public.bookings b
+  where m.booking_id = b.id and b.user_id = p_user_id and b.status in ('Completed', 'Cancelled');
+
+  delete from public.bookings
+  where user_id = p_user_id and status in ('Completed', 'Cancelled');
+  get diagnostics hot_count = row_count;
+
+  delete from public.session_meter_minutes_archive m
+  using public.bookings_archive b
+  where m.booking_id = b.id and b.user_id = p_user_id;
+
+  delete from public.bookings_archive
+  where user_id = p_user_id;
+  get diagnostics archived_count = row_count;
+
+  return hot_count + archived_count;
+end;
+$$;
@@ -1,110 +1,174 @@
 
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 import logging
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-import math
+import solar_geometry
+from solar_training import build_model, generate_synthetic_data, load_latest
 logger = logging.getLogger(__name__)
 
+# Forecasts older than this are not served as a fallback under overload
+STALE_FORECAST_MAX_AGE = 3600
+STALE_FORECAST_CACHE_SIZE = 512
+
+
+class InferenceOverloaded(Exception):
+    """Raised when the inference pool has no queue capacity left"""
+
+
+class InferenceExecutor:
+    """
+    Bounded worker pool for CPU-bound model inference.
+    Keeps scikit-learn off the event loop and rejects work once
+    `max_pending` jobs are queued or running instead of growing without bound.
+    """
+    def __init__(self, max_workers: int = 2, max_pending: int = 32):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solar-inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "stale_served": 0,
+            "queued_seconds_total": 0.0,
+            "queued_seconds_max": 0.0,
+            "compute_seconds_total": 0.0,
+            "compute_seconds_max": 0.0,
+        }
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool; raises InferenceOverloaded when saturated"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise InferenceOverloaded(f"Inference queue full ({self._pending} pending)")
+            self._pending += 1
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._record(started - submitted, time.perf_counter() - started)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, timed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _record(self, queued: float, compute: float):
+        with self._lock:
+            s = self._stats
+            s["completed"] += 1
+            s["queued_seconds_total"] += queued
+            s["compute_seconds_total"] += compute
+            s["queued_seconds_max"] = max(s["queued_seconds_max"], queued)
+            s["compute_seconds_max"] = max(s["compute_seconds_max"], compute)
+
+    def record_stale(self):
+        with self._lock:
+            self._stats["stale_served"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            pending = self._pending
+        done = s["completed"] or 1
+        s.update({
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "queued_seconds_avg": s["queued_seconds_total"] / done,
+            "compute_seconds_avg": s["compute_seconds_total"] / done,
+        })
+        return s
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
 class SolarMLService:
-    def __init__(self):
-        self.model = None
-        self.is_trained = False
-        self._train_model()
-
-    def _calculate_solar_altitude(self, hour: int, lat: float = 12.9716):
-        """Estimate solar altitude angle (simple model for 12.97N Bangalore)"""
-        # Solar Noon is roughly 12:15, using 12:00 for simplicity
-        # Seasonal variation simplified: assume equinox-like path
-        # Altitude = 90 - abs(Lat - Declination)
-        # Declination ranges from -23.5 to +23.5. Assuming 0 for generic daily cycle.
-        # Max altitude at noon ~ 77-90 degrees depending on season
-        
-        # Simple cyclic model based on hour
-        # Sun is up roughly from 6:00 to 18:00
-        angle = (hour - 6) * (180 / 12) # 0 degrees at 6am, 180 at 6pm
-        if angle < 0 or angle > 180: return -1 # Below horizon
-        
-        # Sine wave peaked at 12:00 (90 degrees)
-        rad = math.radians(angle)
-        return math.sin(rad) * 90
+    def __init__(self, model=None, model_version: str = None):
+        self.model = model
+        self.model_version = model_version
+        self.is_trained = model is not None
+        self.executor = InferenceExecutor(
+            max_workers=int(os.getenv("SOLAR_INFERENCE_WORKERS", "2")),
+            max_pending=int(os.getenv("SOLAR_INFERENCE_MAX_PENDING", "32")),
+        )
+        # (lat, lng, hours_ahead) -> (computed_at, arrays); last good forecast per location
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+        if model is None:
+            self._train_model()
 
-    def _generate_synthetic_data(self, n_samples=3000):
+    def _generate_synthetic_data(self, n_samples=3000, seed=None):
         """Generate synthetic solar data for training with physical grounded features"""
-        hours = np.random.randint(0, 24, n_samples)
-        cloud_cover = np.random.uniform(0, 100, n_samples)
-        
-        records = []
-        for h, c in zip(hours, cloud_cover):
-            solar_alt_factor = max(0, self._calculate_solar_altitude(h) / 90)
-            
-            # theoretical max radiation (approx GHI)
-            theoretical_rad = solar_alt_factor * 1100 
-            
-            # Real radiation after clouds
-            # Cloud cover reduces GHI, but diffuse radiation might remain.
-            # Simple model:
-            radiation = theoretical_rad * (1 - (c * 0.75) / 100)
-            radiation += np.random.normal(0, 50) # Noise
-            radiation = max(0, radiation)
-            
-            # Efficiency calculation:
-            # Efficiency peaks at ~1000 W/m² (STC)
-            # But high heat reduces efficiency. 
-            # We'll stick to the requested simple driver: Radiation
-            
-            # Base efficiency based on radiation intensity
-            # Assume panels reach 100% of "rated output" at 1000 W/m²
-            # This 'efficiency' is actually 'Output Power %'
-            eff = (radiation / 1000.0) * 100
-            
-            # Cap at 100ish (some panels forecast >100% if >1000W/m2, but let's clip)
-            eff = np.clip(eff, 0, 100)
-            
-            records.append({
-                'hour': h,
-                'cloud_cover': c,
-                'radiation': radiation,
-                'efficiency': eff
-            })
-            
-        df = pd.DataFrame(records)
-        X = df[['hour', 'cloud_cover', 'radiation']]
-        y = df['efficiency'].values
-        return X, y
+        return generate_synthetic_data(n_samples, seed=seed)
 
     def _train_model(self):
-        """Train the Random Forest model"""
+        """Load the latest versioned model, or train a small one in-process"""
+        try:
+            model, manifest = load_latest()
+            if model is not None:
+                self.model = model
+                self.model_version = manifest["version"]
+                self.is_trained = True
+                logger.info(f"Loaded Solar ML Model version {self.model_version}")
+                return
+        except Exception as e:
+            logger.error(f"Failed to load versioned ML model, training fallback: {e}")
+
         try:
             logger.info("Training Solar ML Model with Radiation features...")
-            X_train, y_train = self._generate_synthetic_data(4000)
-            self.model = RandomForestRegressor(n_estimators=100, random_state=42)
+            X_train, y_train = self._generate_synthetic_data(4000, seed=42)
+            self.model = build_model(n_estimators=100, seed=42)
             self.model.fit(X_train, y_train)
+            self.model_version = "inline"
             self.is_trained = True
             logger.info("Solar ML Model trained successfully!")
         except Exception as e:
             logger.error(f"Failed to train ML model: {e}")
 
-    def predict_efficiency(self, hour: int, cloud_cover: float, radiation: float) -> float:
-        """Predict solar efficiency for a given condition"""
-        if not self.is_trained: return 0.0
+    def predict_efficiency_batch(self, hours, cloud_cover, radiation, solar_altitude=None) -> np.ndarray:
+        """Predict solar efficiency for arrays of conditions in a single model call"""
+        hours = np.asarray(hours)
+        if not self.is_trained or hours.size == 0:
+            return np.zeros(hours.shape, dtype=float)
         try:
-            input_data = pd.DataFrame([{
-                'hour': hour,
-                'cloud_cover': cloud_cover,
-                'radiation': radiation
-            }])
-            prediction = self.model.predict(input_data)[0]
+            input_data = pd.DataFrame({
+                'hour': hours,
+                'cloud_cover': np.asarray(cloud_cover, dtype=float),
+                'radiation': np.asarray(radiation, dtype=float)
+            })
+            prediction = np.clip(self.model.predict(input_data), 0, 100)
             
             # Physical safety: if sun is below horizon, efficiency MUST be 0
-            if self._calculate_solar_altitude(hour) <= 0: return 0.0
-            
-            return float(max(0, min(100, prediction)))
+            if solar_altitude is not None:
+                prediction[np.asarray(solar_altitude) <= 0] = 0.0
+            else:
+                prediction[input_data['radiation'].values <= 0] = 0.0
+            return prediction
         except Exception as e:
             logger.error(f"Prediction error: {e}")
-            return 0.0
+            return np.zeros(hours.shape, dtype=float)
+
+    def predict_efficiency(self, hour: int, cloud_cover: float, radiation: float, solar_altitude: float = None) -> float:
+        """Predict solar efficiency for a given condition"""
+        altitude = None if solar_altitude is None else [solar_altitude]
+        return float(self.predict_efficiency_batch([hour], [cloud_cover], [radiation], altitude)[0])
 
     async def fetch_real_weather(self, lat: float, lng: float, hours_ahead=48):
         """Fetch real weather forecast from Met.no (Meteorologisk institutt)"""
@@ -126,129 +190,153 @@ class SolarMLService:
             logger.error(f"Weather API error (Met.no): {e}")
             return None
 
-    async def get_forecast(self, lat: float = 12.9716, lng: float = 77.5946, hours_ahead=24):
+    async def get_forecast(self, lat: float = 12.9716, lng: float = 77.5946, hours_ahead=24, columnar: bool = False):
         """Get high-precision ML forecast using Met.no data"""
-        forecast = []
-        
         # Fetch from Met.no
         weather_json = await self.fetch_real_weather(lat, lng)
-        
-        now = datetime.now()
+        key = (round(lat, 2), round(lng, 2), hours_ahead)
+        try:
+            arrays = await self.executor.run(self.compute_forecast, weather_json, lat, lng, hours_ahead)
+        except InferenceOverloaded:
+            arrays = self._stale_forecast(key)
+            if arrays is None:
+                raise
+            logger.warning(f"ML: Inference pool saturated, serving stale forecast for {key}")
+            self.executor.record_stale()
+        else:
+            self._remember_forecast(key, arrays)
+        return self.forecast_columns(arrays) if columnar else self.forecast_rows(arrays)
+
+    def _remember_forecast(self, key, arrays: dict):
+        with self._recent_lock:
+            self._recent[key] = (time.monotonic(), arrays)
+            self._recent.move_to_end(key)
+            while len(self._recent) > STALE_FORECAST_CACHE_SIZE:
+                self._recent.popitem(last=False)
+
+    def _stale_forecast(self, key):
+        with self._recent_lock:
+            entry = self._recent.get(key)
+        if entry and time.monotonic() - entry[0] <= STALE_FORECAST_MAX_AGE:
+            return entry[1]
+        return None
+
+    def compute_forecast(self, weather_json, lat: float, lng: float, hours_ahead=24, now: datetime = None) -> dict:
+        """Build the forecast as parallel numpy arrays (one entry per hour)"""
+        now = now or datetime.now()
         
         if not weather_json or 'properties' not in weather_json:
              logger.warning("ML: No valid weather data from Met.no")
         
         timeseries = weather_json.get('properties', {}).get('timeseries', []) if weather_json else []
         
-        for i in range(hours_ahead):
-            target_dt = now + timedelta(hours=i)
-            # Met.no uses ISO timestamps in UTC usually (Z)
-            # We need to find the closest time series point
-            
-            # Simple matching: timestamps are like "2026-02-15T12:00:00Z"
-            # We construct our target ISO prefix
-            # Note: Met.no is strict on UTC. 
-            # Our input calc 'target_dt' is local system time (IST).
-            # So we should convert target_dt (IST) to UTC to match Met.no
-            
-            # Quick hack: Met.no compact time series are hourly.
-            # We just iterate and find the one closest to target_dt
-            
-            # Reset values
-            cloud_cover = 20.0
-            uv_index = 0.0
-            temp_c = 25.0
-            radiation = 0.0 
-            
-            # Find closest point
-            closest_point = None
-            min_diff = float('inf')
-            
-            # We need to render the target time efficiently
-            # Let's assume list is sorted.
-            # Convert target_dt to UTC? 
-            # Actually, standard ISO comparison works if we ignore timezone or unify it.
-            # Met.no returns Z time.
-            # Let's just do robust string matching for the hour if possible, or parsing.
-            
-            target_iso_hour = target_dt.strftime("%Y-%m-%dT%H") # Local time match? No, Met returns UTC.
-            # If server is IST (UTC+5:30), 12:00 IST is 06:30 UTC.
-            # We should probably match by "Hour in the sequence" relative to "Now"
-            # The API returns 'now' onwards.
-            # So index 'i' in the loop roughly corresponds to index 'i' in timeseries (hourly)
-            
-            if i < len(timeseries):
-                 closest_point = timeseries[i]
-            
-            if closest_point:
-                data = closest_point.get('data', {}).get('instant', {}).get('details', {})
-                next_1_hours = closest_point.get('data', {}).get('next_1_hours', {}).get('details', {})
-                
-                cloud_cover = float(data.get('cloud_area_fraction', 20))
-                temp_c = float(data.get('air_temperature', 25))
-                
-                # Met.no compact doesn't usually give UV directly in 'instant'. 
-                # We interpret strict Radiation/UV from Cloud Cover + Solar Altitude.
-                
-                h = target_dt.hour
-                solar_max = self._calculate_solar_altitude(h, lat) * 12 # Rough scaler for ~1000W/m2 peak
-                if solar_max < 0: solar_max = 0
-                
-                # Radiation is heavily affected by clouds
-                # Cloud fraction is 0-100
-                attenuation = 1.0 - ((cloud_cover / 100.0) * 0.85) # Clouds block up to 85% light
-                radiation = solar_max * attenuation
-                
-                # UV Index Calculation (Approximate)
-                # Clear sky max UV at noon ~ 11-12 in tropics
-                # Solar alt 90 -> UV 12
-                # Solar alt 45 -> UV 4-5
-                uv_max_clear = (self._calculate_solar_altitude(h, lat) / 90.0) * 12.0
-                if uv_max_clear < 0: uv_max_clear = 0
-                
-                # Attenuate UV by cloud cover (clouds block UV less than visible light, but still significant)
-                # Linear-ish reduction?
-                uv_index = uv_max_clear * (1 - (cloud_cover / 100.0) * 0.7)
-                
-                if uv_index < 0: uv_index = 0.0
-                
-                logger.info(f"ML: Met.no/Calc for {h}:00 -> Cloud: {cloud_cover}%, UV: {uv_index:.2f}, Rad: {radiation:.1f}")
-
-            # 3. Predict Solar Efficiency
-            eff = self.predict_efficiency(target_dt.hour, cloud_cover=cloud_cover, radiation=radiation)
-            
-            # 4. Calculate Grid Load
-            h = target_dt.hour
-            if 0 <= h < 6: base_load = 30 + (h * 2)
-            elif 6 <= h < 10: base_load = 50 + ((h-6) * 10)
-            elif 10 <= h < 17: base_load = 70
-            elif 17 <= h < 21: base_load = 80 + ((h-17) * 5)
-            else: base_load = 60 - ((h-21) * 10)
-            
-            temp_factor = 1.0
-            if temp_c > 25: temp_factor = 1 + ((temp_c - 25) * 0.05)
-            if temp_c < 10: temp_factor = 1 + ((10 - temp_c) * 0.03)
-            grid_load = min(100, base_load * temp_factor)
-            
-            is_today = target_dt.date() == datetime.now().date()
-            day_prefix = "Today" if is_today else "Tomorrow"
-            
+        # Met.no returns hourly points from 'now' onwards, so index i in the
+        # series roughly corresponds to hour i of the forecast window.
+        n = max(0, int(hours_ahead))
+        offsets = np.arange(n)
+        hours = (now.hour + offsets) % 24
+        day_offset = (now.hour + offsets) // 24
+        
+        points = [p.get('data', {}).get('instant', {}).get('details', {}) for p in timeseries[:n]]
+        has_weather = np.zeros(n, dtype=bool)
+        has_weather[:len(points)] = True
+        cloud_cover = np.full(n, 20.0)
+        temp_c = np.full(n, 25.0)
+        cloud_cover[:len(points)] = [float(d.get('cloud_area_fraction', 20)) for d in points]
+        temp_c[:len(points)] = [float(d.get('air_temperature', 25)) for d in points]
+        
+        # Sun position for the real UTC instant of each hour at this location
+        altitude = solar_geometry.hourly_altitude(
+            solar_geometry.utc_hours_from(now.astimezone(), n), lat, lng
+        ) if n else np.zeros(0)
+        
+        # Radiation is heavily affected by clouds (block up to 85% of light);
+        # UV is attenuated less than visible light.
+        cloud_fraction = cloud_cover / 100.0
+        radiation = np.where(has_weather, solar_geometry.clear_sky_ghi(altitude) * (1.0 - cloud_fraction * 0.85), 0.0)
+        uv_index = np.where(has_weather, solar_geometry.clear_sky_uv(altitude) * (1.0 - cloud_fraction * 0.7), 0.0)
+        
+        # Predict Solar Efficiency
+        eff = self.predict_efficiency_batch(hours, cloud_cover, radiation, altitude)
+        
+        # Calculate Grid Load
+        base_load = np.select(
+            [hours < 6, hours < 10, hours < 17, hours < 21],
+            [30 + hours * 2, 50 + (hours - 6) * 10, np.full(n, 70), 80 + (hours - 17) * 5],
+            60 - (hours - 21) * 10
+        )
+        temp_factor = np.where(temp_c > 25, 1 + (temp_c - 25) * 0.05,
+                               np.where(temp_c < 10, 1 + (10 - temp_c) * 0.03, 1.0))
+        grid_load = np.minimum(100, base_load * temp_factor)
+        
+        if n:
+            logger.debug(f"ML: Forecast for ({lat}, {lng}) -> peak altitude {altitude.max():.1f}°, peak efficiency {eff.max():.1f}%")
+        
+        return {
+            "start": now.replace(minute=0, second=0, microsecond=0),
+            "hour": hours,
+            "day_offset": day_offset,
+            "efficiency": eff,
+            "grid_load": grid_load,
+            "cloud_cover": cloud_cover,
+            "radiation": radiation,
+            "temp_c": temp_c,
+            "uv_index": uv_index,
+        }
+
+    @staticmethod
+    def forecast_rows(arrays: dict) -> list:
+        """Per-hour dict format (labels, nested weather) used by the dashboard"""
+        forecast = []
+        for i in range(len(arrays["hour"])):
+            h = int(arrays["hour"][i])
+            eff = float(arrays["efficiency"][i])
+            day_prefix = "Today" if arrays["day_offset"][i] == 0 else "Tomorrow"
             forecast.append({
                 "hour": h,
                 "efficiency": round(eff, 1),
-                "grid_load": round(grid_load, 1),
+                "grid_load": round(float(arrays["grid_load"][i]), 1),
                 "label": f"{h:02d}:00",
                 "full_label": f"{day_prefix} {h:02d}:00",
                 "is_peak": eff > 80,
                 "weather": {
-                    "cloud_cover": round(cloud_cover, 1),
-                    "radiation": round(radiation, 1),
-                    "temp_c": temp_c,
-                    "uv_index": round(uv_index, 1)
+                    "cloud_cover": round(float(arrays["cloud_cover"][i]), 1),
+                    "radiation": round(float(arrays["radiation"][i]), 1),
+                    "temp_c": float(arrays["temp_c"][i]),
+                    "uv_index": round(float(arrays["uv_index"][i]), 1)
                 }
             })
-            
         return forecast
 
-# Singleton instance
-solar_ml = SolarMLService()
+    @staticmethod
+    def forecast_columns(arrays: dict) -> dict:
+        """
+        Columnar format: parallel arrays, one entry per hour starting at `start`.
+        Labels are left to the client (hour + day_offset are enough).
+        """
+        return {
+            "start": arrays["start"].isoformat(),
+            "hour": arrays["hour"].tolist(),
+            "day_offset": arrays["day_offset"].tolist(),
+            "efficiency": arrays["efficiency"].round(1).tolist(),
+            "grid_load": arrays["grid_load"].round(1).tolist(),
+            "cloud_cover": arrays["cloud_cover"].round(1).tolist(),
+            "radiation": arrays["radiation"].round(1).tolist(),
+            "temp_c": arrays["temp_c"].tolist(),
+            "uv_index": arrays["uv_index"].round(1).tolist(),
+        }
+
+_solar_ml = None
+_solar_ml_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # The singleton loads (or trains) a model, so it is built when first
+    # imported by name; SolarMLService alone can be imported without it
+    global _solar_ml
+    if name != "solar_ml":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _solar_ml_lock:
+        if _solar_ml is None:
+            _solar_ml = SolarMLService()
+    return _solar_ml
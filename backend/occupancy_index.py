@@ -0,0 +1,260 @@
+"""
+Charger occupancy bitmap index
+One bitset per charger at 15-minute resolution over a rolling 14-day window,
+built from `bookings` at startup and kept current on every booking write this
+process makes. Availability questions become integer bit operations:
+
+    window free?            -> bits & window_mask == 0
+    first free run of L     -> AND the free mask with itself shifted, take lowest bit
+
+The index answers read-side estimates only (smart-schedule search). Slots
+are marked busy if a booking touches any part of them, and bookings written
+by other workers show up only at the next periodic reload, so it must never
+reject a booking: the write path leaves that to the bookings_no_overlap
+exclusion constraint.
+
+Charger and booking ids arrive as ints from the database and as numeric
+strings from some request bodies; _key folds both to one form before any
+lookup.
+"""
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from availability import parse_timestamp
+from repository import BookingSlot, columns
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 15
+WINDOW_DAYS = 14
+SLOT = timedelta(minutes=SLOT_MINUTES)
+SLOTS = WINDOW_DAYS * 24 * 60 // SLOT_MINUTES
+FULL_MASK = (1 << SLOTS) - 1
+RELOAD_INTERVAL = float(os.getenv("OCCUPANCY_RELOAD_SECONDS", "60"))
+PAGE_SIZE = 1000
+
+
+def _key(value: Any) -> Any:
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+class ChargerOccupancy:
+    """Read-only view of one charger's bitset, interchangeable with BusyIntervals"""
+    __slots__ = ("index", "bits", "origin")
+
+    def __init__(self, index: "OccupancyIndex", bits: int, origin: datetime):
+        self.index = index
+        self.bits = bits
+        self.origin = origin
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        mask = self.index._mask(self.origin, start, end)
+        return not (self.bits & mask)
+
+    def free_mask(self, slot_starts: np.ndarray, slot_ends: np.ndarray) -> np.ndarray:
+        return np.array([
+            self.is_free(s.astype(datetime), e.astype(datetime)) for s, e in zip(slot_starts, slot_ends)
+        ], dtype=bool)
+
+    def __len__(self):
+        return 1 if self.bits else 0
+
+
+class OccupancyIndex:
+    def __init__(self, reload_interval: float = RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._origin: Optional[datetime] = None
+        self._bits: Dict[Any, int] = {}
+        self._bookings: Dict[Any, Dict[Any, Tuple[datetime, datetime]]] = {}   # charger -> booking -> interval
+        self._booking_charger: Dict[Any, Any] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._origin is not None
+
+    # ---- slot arithmetic -------------------------------------------------
+
+    @staticmethod
+    def _window_origin(now: datetime = None) -> datetime:
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        return now.replace(minute=now.minute - now.minute % SLOT_MINUTES, second=0, microsecond=0) - timedelta(days=1)
+
+    @staticmethod
+    def _slot_range(origin: datetime, start: datetime, end: datetime) -> Tuple[int, int]:
+        lo = math.floor((start - origin) / SLOT)
+        hi = math.ceil((end - origin) / SLOT)
+        return max(lo, 0), min(hi, SLOTS)
+
+    def _mask(self, origin: datetime, start: datetime, end: datetime) -> int:
+        lo, hi = self._slot_range(origin, start, end)
+        if hi <= lo:
+            return 0
+        return ((1 << (hi - lo)) - 1) << lo
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        origin = self._origin
+        return origin is not None and start >= origin and end <= origin + SLOT * SLOTS
+
+    # ---- maintenance -----------------------------------------------------
+
+    def _recompute_locked(self, charger_id):
+        bits = 0
+        for start, end in self._bookings.get(charger_id, {}).values():
+            bits |= self._mask(self._origin, start, end)
+        if bits:
+            self._bits[charger_id] = bits
+        else:
+            self._bits.pop(charger_id, None)
+
+    def load(self, rows: Iterable[Dict[str, Any]], origin: datetime):
+        """Replace the index with the given booking rows"""
+        bookings: Dict[Any, Dict[Any, Tuple[datetime, datetime]]] = {}
+        booking_charger = {}
+        for row in rows:
+            if row.get("status") == "Cancelled":
+                continue
+            booking_id, charger_id = _key(row["id"]), _key(row["charger_id"])
+            interval = (parse_timestamp(row["start_time"]), parse_timestamp(row["end_time"]))
+            bookings.setdefault(charger_id, {})[booking_id] = interval
+            booking_charger[booking_id] = charger_id
+        with self._lock:
+            self._origin = origin
+            self._bookings = bookings
+            self._booking_charger = booking_charger
+            self._bits = {}
+            for charger_id in bookings:
+                self._recompute_locked(charger_id)
+
+    def upsert_booking(self, row: Dict[str, Any]):
+        """Apply a created/updated booking row (Cancelled rows are removed)"""
+        if row.get("status") == "Cancelled":
+            self.remove_booking(row["id"])
+            return
+        if self._origin is None:
+            return
+        booking_id, charger_id = _key(row["id"]), _key(row["charger_id"])
+        interval = (parse_timestamp(row["start_time"]), parse_timestamp(row["end_time"]))
+        with self._lock:
+            previous = self._booking_charger.get(booking_id)
+            if previous is not None and previous != charger_id:
+                self._bookings.get(previous, {}).pop(booking_id, None)
+                self._recompute_locked(previous)
+            self._bookings.setdefault(charger_id, {})[booking_id] = interval
+            self._booking_charger[booking_id] = charger_id
+            self._bits[charger_id] = self._bits.get(charger_id, 0) | self._mask(self._origin, *interval)
+
+    def remove_booking(self, booking_id: Any):
+        with self._lock:
+            charger_id = self._booking_charger.pop(_key(booking_id), None)
+            if charger_id is None:
+                return
+            self._bookings.get(charger_id, {}).pop(_key(booking_id), None)
+            self._recompute_locked(charger_id)
+
+    # ---- queries ---------------------------------------------------------
+
+    def is_free(self, charger_id: Any, start, end) -> Optional[bool]:
+        """True/False, or None if the window is outside the indexed range"""
+        start, end = parse_timestamp(start), parse_timestamp(end)
+        if not self.covers(start, end):
+            return None
+        return not (self._bits.get(_key(charger_id), 0) & self._mask(self._origin, start, end))
+
+    def first_free(self, charger_id: Any, duration: timedelta, not_before, not_after=None) -> Optional[datetime]:
+        """Start of the first free slot-aligned window of `duration`, or None"""
+        origin = self._origin
+        if origin is None:
+            return None
+        not_before = max(parse_timestamp(not_before), origin)
+        not_after = parse_timestamp(not_after) if not_after is not None else origin + SLOT * SLOTS
+        length = math.ceil(duration / SLOT)
+        first = math.ceil((not_before - origin) / SLOT)
+        last = min(math.floor((not_after - origin) / SLOT), SLOTS) - length  # last allowed start slot
+        if length <= 0 or last < first:
+            return None
+
+        # runs has bit p set iff slots p .. p+length-1 are all free
+        runs = ~self._bits.get(_key(charger_id), 0) & FULL_MASK
+        covered = 1
+        while covered < length:
+            step = min(covered, length - covered)
+            runs &= runs >> step
+            covered += step
+        runs &= ((1 << (last - first + 1)) - 1) << first
+        if not runs:
+            return None
+        position = (runs & -runs).bit_length() - 1
+        return origin + SLOT * position
+
+    def busy_view(self, charger_ids: Iterable[Any], window_start, window_end) -> Optional[Dict[Any, ChargerOccupancy]]:
+        """Per-charger views for smart-schedule, or None if the window isn't covered"""
+        if not self.covers(parse_timestamp(window_start), parse_timestamp(window_end)):
+            return None
+        with self._lock:
+            origin = self._origin
+            return {
+                cid: ChargerOccupancy(self, self._bits[_key(cid)], origin)
+                for cid in charger_ids if _key(cid) in self._bits
+            }
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def reload(self):
+        """Rebuild from the bookings table for a freshly rolled window"""
+        from database import db
+        origin = self._window_origin()
+        window_end = origin + SLOT * SLOTS
+        rows, offset = [], 0
+        while True:
+            res = db.client.table("bookings")\
+                .select(columns(BookingSlot))\
+                .gt("end_time", origin.isoformat())\
+                .lt("start_time", window_end.isoformat())\
+                .neq("status", "Cancelled")\
+                .order("id")\
+                .range(offset, offset + PAGE_SIZE - 1)\
+                .execute()
+            page = res.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        self.load(rows, origin)
+        logger.info(f"Occupancy index loaded: {len(rows)} bookings on {len(self._bits)} chargers")
+
+    def _run(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Occupancy index reload failed: {e}")
+
+    def start(self):
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error(f"Occupancy index initial load failed: {e}")
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="occupancy-index-reload", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+occupancy_index = OccupancyIndex()
@@ -0,0 +1,417 @@
+"""
+OCPP 1.6-J gateway
+Chargers connect to ws://<host>/ocpp/<charger id> with the "ocpp1.6"
+subprotocol and speak the JSON flavour of OCPP 1.6. Supported messages
+(charge point -> central system):
+
+    BootNotification, Heartbeat, StatusNotification,
+    StartTransaction, StopTransaction, MeterValues
+
+Anything else gets a NotImplemented CALLERROR; central-system-initiated calls
+(RemoteStartTransaction, ...) are not part of this subset.
+
+Mapping onto the backend:
+- charge point id = chargers.id; unknown ids are refused at the handshake
+- idTag = users.id; a transaction is a charging session, i.e. the same
+  Confirmed booking /api/charge/control creates, and transactionId is its
+  booking id. A session started from the app is picked up when the car is
+  plugged in; stopping bills metered energy exactly like action=stop, or
+  meterStop - meterStart when the connection saw the start. Transactions are
+  checked against the database when this worker doesn't track them: only a
+  running session on the sending charger can be metered or stopped
+- meterStart / MeterValues / meterStop feed telemetry.py
+- StatusNotification sets chargers.status (Available / Occupied / Offline).
+  Changes are coalesced and written every OCPP_STATUS_FLUSH_SECONDS with one
+  update per status; a dropped connection marks the charger Offline
+
+Each connection is one coroutine with a small ChargePoint record, so a worker
+holds thousands of them; ocpp_simulator.py load-tests it.
+
+Tunables (env):
+    OCPP_HEARTBEAT_SECONDS     interval returned by BootNotification (default 300)
+    OCPP_STATUS_FLUSH_SECONDS  charger status write interval (default 1)
+    OCPP_PASSWORD              if set, chargers must send HTTP Basic auth with
+                               their id and this password (security profile 1)
+"""
+import asyncio
+import base64
+import hmac
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from async_database import adb
+from charger_catalog import charger_catalog
+from charging_sessions import charging_sessions
+from telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+SUBPROTOCOL = "ocpp1.6"
+HEARTBEAT_INTERVAL = int(os.getenv("OCPP_HEARTBEAT_SECONDS", "300"))
+IDLE_TIMEOUT = 2 * HEARTBEAT_INTERVAL + 60   # silent this long = dead connection
+STATUS_FLUSH_INTERVAL = float(os.getenv("OCPP_STATUS_FLUSH_SECONDS", "1"))
+STATUS_WRITE_CHUNK = 500
+PASSWORD = os.getenv("OCPP_PASSWORD") or None
+
+CALL, CALLRESULT, CALLERROR = 2, 3, 4
+
+# OCPP ChargePointStatus -> chargers.status
+CHARGER_STATUS = {
+    "Available": "Available",
+    "Preparing": "Occupied",
+    "Charging": "Occupied",
+    "SuspendedEVSE": "Occupied",
+    "SuspendedEV": "Occupied",
+    "Finishing": "Occupied",
+    "Reserved": "Occupied",
+    "Unavailable": "Offline",
+    "Faulted": "Offline",
+}
+
+ENERGY = "Energy.Active.Import.Register"   # default measurand
+POWER = "Power.Active.Import"
+SOC = "SoC"
+DEFAULT_UNITS = {ENERGY: "Wh", POWER: "W", SOC: "Percent"}
+UNIT_SCALE = {"Wh": 0.001, "kWh": 1.0, "W": 0.001, "kW": 1.0, "Percent": 1.0}
+
+
+class CallError(Exception):
+    def __init__(self, code: str, description: str = ""):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+
+
+def _epoch(timestamp: Optional[str]) -> float:
+    if not timestamp:
+        return time.time()
+    dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _require(payload: Dict[str, Any], *fields: str):
+    missing = [f for f in fields if f not in payload]
+    if missing:
+        raise CallError("FormationViolation", f"Missing {', '.join(missing)}")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _call_error(unique_id: str, code: str, description: str) -> str:
+    return json.dumps([CALLERROR, unique_id, code, description, {}])
+
+
+class ChargePoint:
+    """One connected charger"""
+    __slots__ = ("id", "charger_id", "websocket", "connected_at", "last_seen", "vendor", "model", "transaction_id",
+                 "meter_start")
+
+    def __init__(self, charge_point_id: str, charger_id: Any, websocket: WebSocket):
+        self.id = charge_point_id
+        self.charger_id = charger_id
+        self.websocket = websocket
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.vendor: Optional[str] = None
+        self.model: Optional[str] = None
+        self.transaction_id: Optional[int] = None
+        self.meter_start: Optional[float] = None   # kWh register at StartTransaction
+
+
+class OcppGateway:
+    def __init__(self, status_flush_interval: float = STATUS_FLUSH_INTERVAL):
+        self.status_flush_interval = status_flush_interval
+        self._connections: Dict[str, ChargePoint] = {}
+        self._pending_status: Dict[Any, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._handlers = {
+            "BootNotification": self._boot_notification,
+            "Heartbeat": self._heartbeat,
+            "StatusNotification": self._status_notification,
+            "StartTransaction": self._start_transaction,
+            "StopTransaction": self._stop_transaction,
+            "MeterValues": self._meter_values,
+        }
+        self._messages = {action: 0 for action in self._handlers}
+        self._stats = {"connections_total": 0, "connections_rejected": 0, "call_errors": 0,
+                       "transactions_started": 0, "transactions_stopped": 0, "status_writes": 0,
+                       "last_status_flush_ms": None, "last_error": None}
+
+    # ---- connections -----------------------------------------------------
+
+    def _authorized(self, websocket: WebSocket, charge_point_id: str) -> bool:
+        if PASSWORD is None:
+            return True
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "basic":
+            return False
+        try:
+            user, _, password = base64.b64decode(credentials).decode().partition(":")
+        except ValueError:
+            return False
+        return user == charge_point_id and hmac.compare_digest(password, PASSWORD)
+
+    async def serve(self, websocket: WebSocket, charge_point_id: str):
+        """Run one charge point connection until it drops"""
+        charger = charger_catalog.get(charge_point_id)
+        if (charger is None or SUBPROTOCOL not in websocket.scope.get("subprotocols", ())
+                or not self._authorized(websocket, charge_point_id)):
+            self._stats["connections_rejected"] += 1
+            await websocket.close(code=1008)
+            return
+        await websocket.accept(subprotocol=SUBPROTOCOL)
+        cp = ChargePoint(charge_point_id, charger["id"], websocket)
+        previous = self._connections.get(charge_point_id)
+        self._connections[charge_point_id] = cp
+        self._stats["connections_total"] += 1
+        if previous is not None:
+            # Reconnected before the old socket timed out: the newest one wins
+            await self._close(previous, code=1000)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(websocket.receive(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.info(f"OCPP {charge_point_id}: silent for {IDLE_TIMEOUT}s, closing")
+                    await self._close(cp, code=1001)
+                    break
+                if message["type"] == "websocket.disconnect":
+                    break
+                cp.last_seen = time.monotonic()
+                text = message.get("text")
+                if text is None:
+                    text = (message.get("bytes") or b"").decode("utf-8", "replace")
+                reply = await self.handle(cp, text)
+                if reply is not None:
+                    await websocket.send_text(reply)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.warning(f"OCPP {charge_point_id}: connection error: {type(e).__name__} {e}")
+        finally:
+            if self._connections.get(charge_point_id) is cp:
+                del self._connections[charge_point_id]
+                self._pending_status[cp.charger_id] = "Offline"
+
+    async def _close(self, cp: ChargePoint, code: int):
+        if cp.websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await cp.websocket.close(code=code)
+            except Exception:
+                pass
+
+    # ---- messages --------------------------------------------------------
+
+    async def handle(self, cp: ChargePoint, text: str) -> Optional[str]:
+        """Process one OCPP-J frame; returns the reply frame, if any"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            logger.warning(f"OCPP {cp.id}: unparseable frame")
+            return None
+        if not isinstance(message, list) or len(message) < 3 or message[0] != CALL:
+            return None   # CALLRESULT/CALLERROR: we never send calls
+        unique_id = str(message[1])
+        if len(message) != 4 or not isinstance(message[2], str) or not isinstance(message[3], dict):
+            self._stats["call_errors"] += 1
+            return _call_error(unique_id, "FormationViolation", "Expected [2, uniqueId, action, payload]")
+        action, payload = message[2], message[3]
+        handler = self._handlers.get(action)
+        if handler is None:
+            self._stats["call_errors"] += 1
+            return _call_error(unique_id, "NotImplemented", f"{action} is not supported")
+        self._messages[action] += 1
+        try:
+            result = await handler(cp, payload)
+        except CallError as e:
+            self._stats["call_errors"] += 1
+            return _call_error(unique_id, e.code, e.description)
+        except KeyError as e:
+            self._stats["call_errors"] += 1
+            return _call_error(unique_id, "FormationViolation", f"{action} is missing {e}")
+        except (TypeError, ValueError) as e:
+            self._stats["call_errors"] += 1
+            return _call_error(unique_id, "TypeConstraintViolation", f"Invalid {action}: {e}")
+        except Exception as e:
+            self._stats["call_errors"] += 1
+            logger.error(f"OCPP {cp.id} {action} failed: {e}")
+            return _call_error(unique_id, "InternalError", str(e))
+        return json.dumps([CALLRESULT, unique_id, result])
+
+    async def _session(self, cp: ChargePoint, transaction_id: int) -> Optional[Dict[str, Any]]:
+        """The running session behind a transaction on this charger, else None (unknown, finished, another charger's)"""
+        if transaction_id <= 0:
+            return None
+        session = charging_sessions.get(transaction_id) or await adb.get_charging_session(transaction_id)
+        if session is None or str(session["charger_id"]) != str(cp.charger_id):
+            return None
+        return session
+
+    async def _boot_notification(self, cp: ChargePoint, payload: Dict[str, Any]) -> Dict[str, Any]:
+        _require(payload, "chargePointVendor", "chargePointModel")
+        cp.vendor = str(payload["chargePointVendor"])
+        cp.model = str(payload["chargePointModel"])
+        return {"status": "Accepted", "currentTime": _now_iso(), "interval": HEARTBEAT_INTERVAL}
+
+    async def _heartbeat(self, cp: ChargePoint, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"currentTime": _now_iso()}
+
+    async def _status_notification(self, cp: ChargePoint, payload: Dict[str, Any]) -> Dict[str, Any]:
+        _require(payload, "connectorId", "errorCode", "status")
+        status = CHARGER_STATUS.get(payload["status"])
+        if status is None:
+            raise CallError("PropertyConstraintViolation", f"Unknown status {payload['status']}")
+        self._pending_status[cp.charger_id] = status
+        return {}
+
+    async def _start_transaction(self, cp: ChargePoint, payload: Dict[str, Any]) -> Dict[str, Any]:
+        _require(payload, "connectorId", "idTag", "meterStart", "timestamp")
+        id_tag = str(payload["idTag"])
+        meter_start = float(payload["meterStart"])
+        started = _epoch(payload["timestamp"])
+
+        user = await adb.get_user_by_id(id_tag) if id_tag.isdigit() else None
+        if not user:
+            return {"transactionId": 0, "idTagInfo": {"status": "Invalid"}}
+        session = charging_sessions.for_user(id_tag)
+        if session is not None and str(session["charger_id"]) != str(cp.charger_id):
+            return {"transactionId": 0, "idTagInfo": {"status": "ConcurrentTx"}}
+        if session is None:
+            result = await adb.start_charging_session(user.id, cp.charger_id)
+            if result.get("conflict"):
+                return {"transactionId": 0, "idTagInfo": {"status": "Blocked"}}
+            if not result["success"]:
+                raise CallError("InternalError", result["error"])
+            session = result["session"]
+            self._stats["transactions_started"] += 1
+        # else: started from the app (/api/charge/control) before plugging in
+
+        cp.transaction_id = session["id"]
+        cp.meter_start = meter_start / 1000
+        await telemetry.resume([session["id"]])
+        telemetry.ingest(session["id"], [started], [None], [meter_start / 1000])
+        return {"transactionId": session["id"], "idTagInfo": {"status": "Accepted"}}
+
+    async def _stop_transaction(self, cp: ChargePoint, payload: Dict[str, Any]) -> Dict[str, Any]:
+        _require(payload, "transactionId", "meterStop", "timestamp")
+        transaction_id = int(payload["transactionId"])
+        meter_stop = float(payload["meterStop"])
+        stopped = _epoch(payload["timestamp"])
+        meter_start = None
+        if cp.transaction_id == transaction_id:
+            cp.transaction_id, meter_start, cp.meter_start = None, cp.meter_start, None
+        session = await self._session(cp, transaction_id)
+        if session is None:
+            return {"idTagInfo": {"status": "Invalid"}}
+
+        await telemetry.resume([transaction_id])
+        self._ingest_meter_values(transaction_id, payload.get("transactionData") or [])
+        telemetry.ingest(transaction_id, [stopped], [None], [meter_stop / 1000])
+        # Both register readings are known: bill their difference
+        registered = meter_stop / 1000 - meter_start if meter_start is not None else None
+        usage = await telemetry.bill(session, registered if registered is not None and registered >= 0 else None)
+        result = await adb.complete_charging_session(transaction_id, usage, charger_id=cp.charger_id)
+        if result["success"]:
+            self._stats["transactions_stopped"] += 1
+        return {"idTagInfo": {"status": "Accepted"}}
+
+    async def _meter_values(self, cp: ChargePoint, payload: Dict[str, Any]) -> Dict[str, Any]:
+        _require(payload, "connectorId", "meterValue")
+        transaction_id = int(payload.get("transactionId") or cp.transaction_id or 0)
+        if await self._session(cp, transaction_id) is not None:
+            await telemetry.resume([transaction_id])
+            self._ingest_meter_values(transaction_id, payload["meterValue"])
+        return {}
+
+    def _ingest_meter_values(self, transaction_id: int, meter_values: List[Dict[str, Any]]):
+        """OCPP MeterValue list -> one telemetry batch (totals only, per-phase values skipped)"""
+        ts, power, energy, soc = [], [], [], []
+        for meter_value in meter_values:
+            readings = {ENERGY: None, POWER: None, SOC: None}
+            for sampled in meter_value["sampledValue"]:
+                measurand = sampled.get("measurand", ENERGY)
+                scale = UNIT_SCALE.get(sampled.get("unit", DEFAULT_UNITS.get(measurand)))
+                if measurand in readings and scale is not None and sampled.get("phase") is None:
+                    readings[measurand] = float(sampled["value"]) * scale
+            ts.append(_epoch(meter_value["timestamp"]))
+            energy.append(readings[ENERGY])
+            power.append(readings[POWER])
+            soc.append(readings[SOC])
+        if ts:
+            telemetry.ingest(transaction_id, ts, power, energy, soc)
+
+    # ---- charger status --------------------------------------------------
+
+    async def flush_status(self):
+        """Write queued status changes, one update per distinct status"""
+        pending, self._pending_status = self._pending_status, {}
+        changes: Dict[str, List[Any]] = {}
+        for charger_id, status in pending.items():
+            current = charger_catalog.get(charger_id)
+            if current is None or current.get("status") != status:
+                changes.setdefault(status, []).append(charger_id)
+        if not changes:
+            return
+        started = time.perf_counter()
+        for status, charger_ids in changes.items():
+            for i in range(0, len(charger_ids), STATUS_WRITE_CHUNK):
+                chunk = charger_ids[i:i + STATUS_WRITE_CHUNK]
+                result = await adb.update_charger_statuses(chunk, status)
+                if result["success"]:
+                    self._stats["status_writes"] += 1
+                    continue
+                self._stats["last_error"] = result["error"]
+                for charger_id in chunk:
+                    self._pending_status.setdefault(charger_id, status)   # retry unless superseded
+        self._stats["last_status_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    # ---- lifecycle -------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.status_flush_interval)
+            try:
+                await self.flush_status()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"OCPP status flush error: {e}")
+
+    def start(self):
+        """Start the status writer on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="ocpp-status")
+
+    async def stop(self):
+        """Close every charger connection and write the resulting statuses"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for cp in list(self._connections.values()):
+            await self._close(cp, code=1001)
+            self._pending_status[cp.charger_id] = "Offline"
+        self._connections.clear()
+        await self.flush_status()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self._connections),
+            "charging": sum(1 for cp in self._connections.values() if cp.transaction_id is not None),
+            "messages": dict(self._messages),
+            "pending_status_writes": len(self._pending_status),
+            **self._stats,
+        }
+
+
+ocpp_gateway = OcppGateway()
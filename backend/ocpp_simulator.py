@@ -0,0 +1,230 @@
+"""
+Local OCPP 1.6-J charger simulator
+Opens one WebSocket per virtual charger against the gateway (ocpp_gateway.py)
+and plays a charger's life: BootNotification, StatusNotification, periodic
+Heartbeats, and charging sessions (StartTransaction, MeterValues every
+--meter-interval seconds, StopTransaction). Prints per-message round-trip
+latency percentiles and error counts at the end, for load-testing a worker.
+
+Virtual charger i uses charge point id first_id + i and idTag (user id)
+first_user + i % users, so the ids must exist. For a local run against the
+SQLite backend:
+
+    python local_store.py seed --path bench.sqlite3 --chargers 5000 --users 5000 --bookings-per-charger 0
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bench.sqlite3 uvicorn main:app
+    python ocpp_simulator.py --chargers 5000 --duration 120
+
+Each side needs a file descriptor per connection; the simulator raises its
+own soft limit, the server may need `ulimit -n`.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import resource
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+SUBPROTOCOL = "ocpp1.6"
+CALL, CALLRESULT, CALLERROR = 2, 3, 4
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Stats:
+    def __init__(self):
+        self.latency_ms: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.connected = 0
+        self.connect_failures = 0
+        self.sessions = 0
+
+    def observe(self, action: str, ms: float):
+        self.latency_ms.setdefault(action, []).append(ms)
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def report(self, elapsed: float):
+        print(f"\n{self.connected} chargers connected ({self.connect_failures} failed), "
+              f"{self.sessions} sessions, {elapsed:.1f}s")
+        print(f"{'message':<20}{'count':>9}{'per s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for action, samples in sorted(self.latency_ms.items()):
+            samples.sort()
+
+            def pct(q: float) -> float:
+                return samples[min(len(samples) - 1, int(q * len(samples)))]
+            print(f"{action:<20}{len(samples):>9}{len(samples) / elapsed:>9.0f}"
+                  f"{pct(0.5):>9.1f}{pct(0.95):>9.1f}{pct(0.99):>9.1f}{samples[-1]:>9.1f}")
+        if self.errors:
+            print("errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(self.errors.items())))
+
+
+class VirtualChargePoint:
+    def __init__(self, charge_point_id: str, id_tag: str, args: argparse.Namespace, stats: Stats):
+        self.id = charge_point_id
+        self.id_tag = id_tag
+        self.args = args
+        self.stats = stats
+        self.rng = random.Random(charge_point_id)
+        self.meter_wh = self.rng.randint(0, 1_000_000)
+        self.ws = None
+        self._ids = itertools.count(1)
+        self._waiting: Dict[str, asyncio.Future] = {}
+
+    async def call(self, action: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Send a CALL and wait for its result; None on CALLERROR or timeout"""
+        unique_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[unique_id] = future
+        started = time.perf_counter()
+        await self.ws.send(json.dumps([CALL, unique_id, action, payload]))
+        try:
+            kind, result = await asyncio.wait_for(future, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.stats.error(f"{action}:timeout")
+            return None
+        finally:
+            self._waiting.pop(unique_id, None)
+        self.stats.observe(action, (time.perf_counter() - started) * 1000)
+        if kind == CALLERROR:
+            self.stats.error(f"{action}:{result}")
+            return None
+        return result
+
+    async def _read(self):
+        async for frame in self.ws:
+            message = json.loads(frame)
+            if message[0] == CALL:
+                # The gateway sends no calls in this subset
+                await self.ws.send(json.dumps([CALLERROR, message[1], "NotImplemented", "", {}]))
+                continue
+            future = self._waiting.get(message[1])
+            if future is not None and not future.done():
+                future.set_result((CALLRESULT, message[2]) if message[0] == CALLRESULT else (CALLERROR, message[2]))
+
+    async def _heartbeats(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.call("Heartbeat", {})
+
+    async def _status(self, status: str):
+        await self.call("StatusNotification", {"connectorId": 1, "errorCode": "NoError", "status": status,
+                                               "timestamp": _now_iso()})
+
+    async def _session(self, deadline: float):
+        started = await self.call("StartTransaction", {"connectorId": 1, "idTag": self.id_tag,
+                                                       "meterStart": self.meter_wh, "timestamp": _now_iso()})
+        if started is None or started["idTagInfo"]["status"] != "Accepted":
+            if started is not None:
+                self.stats.error(f"StartTransaction:{started['idTagInfo']['status']}")
+            return
+        transaction_id = started["transactionId"]
+        self.stats.sessions += 1
+        await self._status("Charging")
+        power_w = self.rng.choice([3300, 7000, 11000, 22000])
+        soc = self.rng.uniform(10, 60)
+        end = min(deadline, time.monotonic() + self.args.session_seconds * self.rng.uniform(0.5, 1.5))
+        while time.monotonic() < end:
+            await asyncio.sleep(self.args.meter_interval)
+            self.meter_wh += round(power_w * self.args.meter_interval / 3600)
+            soc = min(100.0, soc + power_w * self.args.meter_interval / 3600 / 600)
+            await self.call("MeterValues", {"connectorId": 1, "transactionId": transaction_id, "meterValue": [{
+                "timestamp": _now_iso(),
+                "sampledValue": [
+                    {"value": str(self.meter_wh), "measurand": "Energy.Active.Import.Register", "unit": "Wh"},
+                    {"value": str(power_w), "measurand": "Power.Active.Import", "unit": "W"},
+                    {"value": f"{soc:.1f}", "measurand": "SoC", "unit": "Percent"},
+                ],
+            }]})
+        await self.call("StopTransaction", {"transactionId": transaction_id, "meterStop": self.meter_wh,
+                                            "timestamp": _now_iso(), "reason": "Local"})
+        await self._status("Available")
+
+    async def run(self, deadline: float):
+        headers = {}
+        if self.args.password:
+            token = base64.b64encode(f"{self.id}:{self.args.password}".encode()).decode()
+            headers["Authorization"] = f"Basic {token}"
+        try:
+            self.ws = await websockets.connect(f"{self.args.url.rstrip('/')}/{self.id}", subprotocols=[SUBPROTOCOL],
+                                               additional_headers=headers, open_timeout=self.args.timeout,
+                                               ping_interval=None, max_queue=None)
+        except Exception as e:
+            self.stats.connect_failures += 1
+            self.stats.error(f"connect:{type(e).__name__}")
+            return
+        self.stats.connected += 1
+        reader = asyncio.create_task(self._read())
+        heartbeats = None
+        try:
+            boot = await self.call("BootNotification", {"chargePointVendor": "Simulator", "chargePointModel": "Virtual"})
+            if boot is None:
+                return
+            heartbeats = asyncio.create_task(self._heartbeats(self.args.heartbeat or boot["interval"]))
+            await self._status("Available")
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.rng.expovariate(1 / self.args.idle_seconds))
+                if time.monotonic() >= deadline:
+                    break
+                await self._session(deadline)
+        except websockets.ConnectionClosed:
+            self.stats.error("connection_closed")
+        finally:
+            tasks = [task for task in (heartbeats, reader) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.ws.close()
+
+
+def _raise_fd_limit(wanted: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+
+async def simulate(args: argparse.Namespace):
+    _raise_fd_limit(args.chargers + 1024)
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.duration
+    tasks = []
+    for i in range(args.chargers):
+        cp = VirtualChargePoint(str(args.first_id + i), str(args.first_user + i % args.users), args, stats)
+        tasks.append(asyncio.create_task(cp.run(deadline)))
+        if args.ramp and (i + 1) % args.ramp == 0:
+            await asyncio.sleep(1)   # --ramp new connections per second
+    await asyncio.gather(*tasks)
+    stats.report(time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ocpp")
+    parser.add_argument("--chargers", type=int, default=100)
+    parser.add_argument("--first-id", type=int, default=1, help="charge point id of the first virtual charger")
+    parser.add_argument("--users", type=int, default=None, help="distinct idTags (default: one per charger)")
+    parser.add_argument("--first-user", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--ramp", type=int, default=500, help="connections opened per second (0 = all at once)")
+    parser.add_argument("--idle-seconds", type=float, default=10, help="mean pause between sessions")
+    parser.add_argument("--session-seconds", type=float, default=30, help="mean session length")
+    parser.add_argument("--meter-interval", type=float, default=5)
+    parser.add_argument("--heartbeat", type=float, default=None, help="override the interval from BootNotification")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--password", default=None, help="OCPP_PASSWORD of the gateway, if set")
+    args = parser.parse_args()
+    args.users = args.users or args.chargers
+    asyncio.run(simulate(args))
+
+
+if __name__ == "__main__":
+    main()
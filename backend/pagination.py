@@ -0,0 +1,84 @@
+"""
+Keyset pagination helpers
+Pages are addressed by an opaque cursor holding the (sort value, id) of the
+last row served, so fetching page N costs the same as page 1 and rows inserted
+meanwhile don't shift pages. Every paginated endpoint answers with
+
+    {"status": "success", <items key>: [...], "page": {"limit", "has_more", "next_cursor"}}
+
+Usage with a PostgREST query:
+
+    query = after(query, "created_at", decode_cursor(cursor), desc=True)
+    rows = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data
+    rows, next_cursor = split_page(rows, limit, "created_at")
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that weren't produced by encode_cursor"""
+
+
+def clamp_limit(limit: Optional[int], default: int = DEFAULT_LIMIT) -> int:
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_LIMIT)
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Any, Any]]:
+    """(sort value, id) from a cursor, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    return sort_value, row_id
+
+
+def _quote(value: Any) -> str:
+    # Timestamps contain ':' and '.', which PostgREST's or=() syntax reserves
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def after(query, sort_column: str, position: Optional[Tuple[Any, Any]], desc: bool = False,
+          id_column: str = "id"):
+    """Restrict a query to rows strictly after `position` in (sort_column, id) order"""
+    if position is None:
+        return query
+    sort_value, row_id = position
+    op = "lt" if desc else "gt"
+    return query.or_(
+        f"{sort_column}.{op}.{_quote(sort_value)},"
+        f"and({sort_column}.eq.{_quote(sort_value)},{id_column}.{op}.{_quote(row_id)})"
+    )
+
+
+def split_page(rows: Optional[Sequence[Dict[str, Any]]], limit: int, sort_column: str,
+               id_column: str = "id") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a limit+1 fetch to one page and build the cursor for the next"""
+    rows = list(rows or [])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[sort_column], last[id_column])
+
+
+def envelope(items_key: str, items: List[Any], limit: int, next_cursor: Optional[str]) -> Dict[str, Any]:
+    return {
+        "status": "success",
+        items_key: items,
+        "page": {"limit": limit, "has_more": next_cursor is not None, "next_cursor": next_cursor},
+    }
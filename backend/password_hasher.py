@@ -0,0 +1,171 @@
+"""
+Password hashing service
+Runs bcrypt in a dedicated, bounded process pool so a login storm can't
+starve FastAPI's shared threadpool (or the GIL) for every other route.
+
+- BCRYPT_ROUNDS sets the cost for new hashes; hashes made at another cost
+  report needs_rehash() and are upgraded on the next successful login
+- PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_PENDING bound the pool and its
+  queue; work beyond max_pending is rejected with HasherOverloaded
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+class HasherOverloaded(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+# Worker-side functions: top level so they pickle into the pool processes.
+# Each returns (result, compute_seconds) so the parent can split queue time
+# from bcrypt time.
+
+def _hash(password: bytes, rounds: int):
+    started = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+    return hashed, time.perf_counter() - started
+
+
+def _check(password: bytes, hashed: bytes):
+    started = time.perf_counter()
+    try:
+        ok = bcrypt.checkpw(password, hashed)
+    except ValueError:
+        ok = False  # malformed hash
+    return ok, time.perf_counter() - started
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..."), or None if unparseable"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, max_workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "hashed": 0,
+            "verified": 0,
+            "rehashed": 0,
+            "rejected": 0,
+            "queued_seconds_total": 0.0,
+            "queued_seconds_max": 0.0,
+            "compute_seconds_total": 0.0,
+            "compute_seconds_max": 0.0,
+        }
+
+    def _submit(self, kind: str, fn, *args) -> Future:
+        """Submit to the pool; the returned future resolves to fn's result only"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HasherOverloaded(f"Password hashing queue full ({self._pending} pending)")
+            self._pending += 1
+            if self._pool is None:
+                # spawn: forking a threaded server process is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            pool = self._pool
+
+        submitted = time.perf_counter()
+        result: Future = Future()
+
+        def done(inner: Future):
+            with self._lock:
+                self._pending -= 1
+            try:
+                value, compute = inner.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            self._record(kind, time.perf_counter() - submitted - compute, compute)
+            result.set_result(value)
+
+        try:
+            pool.submit(fn, *args).add_done_callback(done)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return result
+
+    def _record(self, kind: str, queued: float, compute: float):
+        with self._lock:
+            s = self._stats
+            s[kind] += 1
+            s["queued_seconds_total"] += queued
+            s["compute_seconds_total"] += compute
+            s["queued_seconds_max"] = max(s["queued_seconds_max"], queued)
+            s["compute_seconds_max"] = max(s["compute_seconds_max"], compute)
+
+    # ---- blocking API (scripts, sync code paths) -------------------------
+
+    def hash(self, password: str) -> str:
+        return self._submit("hashed", _hash, password.encode('utf-8'), self.rounds).result()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._submit("verified", _check, password.encode('utf-8'), hashed.encode('utf-8')).result()
+
+    # ---- async API (endpoints) -------------------------------------------
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit("hashed", _hash, password.encode('utf-8'), self.rounds))
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(
+            self._submit("verified", _check, password.encode('utf-8'), hashed.encode('utf-8'))
+        )
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if the hash was made with a different cost than configured"""
+        return hash_rounds(hashed) != self.rounds
+
+    def record_rehash(self):
+        with self._lock:
+            self._stats["rehashed"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            pending = self._pending
+        done = (s["hashed"] + s["verified"]) or 1
+        s.update({
+            "rounds": self.rounds,
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "queued_seconds_avg": s["queued_seconds_total"] / done,
+            "compute_seconds_avg": s["compute_seconds_total"] / done,
+        })
+        return s
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,466 @@
+"""
+Query logic shared by database.Database and async_database.AsyncDatabase
+Each operation is written once, as a generator that builds its PostgREST
+queries and yields them unexecuted; the response (or the exception) is sent
+back in at the yield. The two classes only drive it: run() calls execute(),
+arun() awaits it, so the sync and async surfaces can't drift apart.
+
+    def _cancel_booking(self, client, booking_id):
+        response = yield client.table("bookings").update(...).eq("id", booking_id)
+        ...
+        return {"success": True, "booking": response.data[0]}
+
+Yielding a list of queries gets a list of responses back (arun runs them
+concurrently).
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Generator, List, Optional
+
+from postgrest.exceptions import APIError
+
+from availability import group_busy_intervals
+from charger_catalog import charger_catalog
+from charging_sessions import charging_sessions
+from occupancy_index import occupancy_index
+from pagination import after, decode_cursor, split_page
+from repository import (Booking, Conversation, Message, UserProfile, column_missing, columns,
+                        field_names, from_row, from_rows, projection)
+from user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+# Max charger ids per bookings availability query
+BUSY_QUERY_CHUNK = 500
+
+# Postgres / PostgREST error codes
+EXCLUSION_VIOLATION = "23P01"   # bookings_no_overlap
+RPC_MISSING = "PGRST202"
+
+FINISHED_STATUSES = ["Completed", "Cancelled"]
+
+SLOT_TAKEN = {
+    "success": False,
+    "conflict": True,
+    "error": "This time slot is already occupied. Please select another time or charger."
+}
+
+Operation = Generator[Any, Any, Any]
+
+
+def run(operation: Operation) -> Any:
+    """Drive an operation with blocking execute() calls"""
+    try:
+        pending = next(operation)
+        while True:
+            try:
+                if isinstance(pending, list):
+                    response = [query.execute() for query in pending]
+                else:
+                    response = pending.execute()
+            except Exception as e:
+                pending = operation.throw(e)
+            else:
+                pending = operation.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+async def arun(operation: Operation) -> Any:
+    """Drive an operation on an async client, awaiting each execute()"""
+    try:
+        pending = next(operation)
+        while True:
+            try:
+                if isinstance(pending, list):
+                    response = await asyncio.gather(*(query.execute() for query in pending))
+                else:
+                    response = await pending.execute()
+            except Exception as e:
+                pending = operation.throw(e)
+            else:
+                pending = operation.send(response)
+    except StopIteration as done:
+        return done.value
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class DatabaseQueries:
+    def __init__(self):
+        # Cleared if the book_slot RPC hasn't been migrated yet
+        self._book_slot_rpc = True
+
+    # ---- users -------------------------------------------------------------
+
+    def _set_password_hash(self, client, user_id: Any, hashed: str) -> Operation:
+        try:
+            response = yield client.table("users").update({"password_hash": hashed}).eq("id", user_id)
+            return bool(response.data)
+        except Exception as e:
+            logger.error(f"Error updating password hash: {e}")
+            return False
+
+    def _create_user(self, client, user_data: Dict[str, Any]) -> Operation:
+        try:
+            response = yield client.table("users").insert(user_data)
+            user_cache.invalidate(email=user_data["email"])
+            if response.data:
+                return {"success": True, "user": response.data[0]}
+            else:
+                return {"success": False, "error": "Failed to create user"}
+        except Exception as e:
+            return create_user_failed(e)
+
+    def _get_user_by(self, client, column: str, value: Any, model=UserProfile) -> Operation:
+        while True:
+            try:
+                response = yield client.table("users").select(projection("users", field_names(model)))\
+                    .eq(column, value)
+                break
+            except APIError as e:
+                if not column_missing("users", e):
+                    raise
+        if response.data and len(response.data) > 0:
+            user = from_row(model, response.data[0])
+            user_cache.put(user)
+            return user
+        return None
+
+    def _find_user(self, client, column: str, value: Any, model=UserProfile, what: str = "user") -> Operation:
+        try:
+            return (yield from self._get_user_by(client, column, value, model))
+        except Exception as e:
+            logger.error(f"Error fetching {what}: {e}")
+            return None
+
+    def _get_user_by_email(self, client, email: str) -> Operation:
+        user = user_cache.get_by_email(email)
+        if user is not None:
+            return user
+        return (yield from self._find_user(client, "email", email))
+
+    def _get_user_by_id(self, client, user_id: Any) -> Operation:
+        user = user_cache.get_by_id(user_id)
+        if user is not None:
+            return user
+        return (yield from self._find_user(client, "id", user_id, what="user by ID"))
+
+    def _verify_user(self, client, token: str) -> Operation:
+        try:
+            response = yield client.table("users").update({"is_verified": True}).eq("verification_token", token)
+            for user in response.data or []:
+                user_cache.invalidate(user_id=user.get("id"), email=user.get("email"))
+            return bool(response.data)
+        except Exception as e:
+            logger.error(f"Error verifying user: {e}")
+            return False
+
+    def _update_user(self, client, email: str, updates: Dict[str, Any]) -> Operation:
+        try:
+            # Prevent updating sensitive fields directly
+            updates = {k: v for k, v in updates.items() if k not in ("password_hash", "id", "email")}
+            response = yield client.table("users").update(updates).eq("email", email)
+            user_cache.invalidate(email=email)
+            if response.data and len(response.data) > 0:
+                return {"success": True, "user": response.data[0]}
+            else:
+                return {"success": False, "error": "User not found or update failed"}
+        except Exception as e:
+            logger.error(f"Error updating user: {e}")
+            return {"success": False, "error": str(e)}
+
+    # ---- chargers ----------------------------------------------------------
+
+    def _add_charger(self, client, charger_data: Dict[str, Any]) -> Operation:
+        try:
+            response = yield client.table("chargers").insert(charger_data)
+            if response.data:
+                charger_catalog.apply_upsert(response.data[0])
+                return {"success": True, "charger": response.data[0]}
+            else:
+                return {"success": False, "error": "Failed to add charger"}
+        except Exception as e:
+            logger.error(f"Error adding charger: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _update_charger_status(self, client, charger_id: Any, status: str) -> Operation:
+        try:
+            response = yield client.table("chargers").update({"status": status}).eq("id", charger_id)
+            if response.data:
+                charger_catalog.apply_upsert(response.data[0])
+                return {"success": True, "charger": response.data[0]}
+            else:
+                return {"success": False, "error": "Charger not found"}
+        except Exception as e:
+            logger.error(f"Error updating charger status: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _update_charger_statuses(self, client, charger_ids: List[Any], status: str) -> Operation:
+        try:
+            response = yield client.table("chargers").update({"status": status}).in_("id", charger_ids)
+            charger_catalog.apply_upserts(response.data or [])
+            return {"success": True, "updated": len(response.data or [])}
+        except Exception as e:
+            logger.error(f"Error updating charger statuses: {e}")
+            return {"success": False, "error": str(e)}
+
+    # ---- bookings and charging sessions ------------------------------------
+
+    def _cancel_booking(self, client, booking_id: Any) -> Operation:
+        try:
+            response = yield client.table("bookings").update({"status": "Cancelled"}).eq("id", booking_id)
+            if response.data:
+                _track_booking(response.data[0])
+                return {"success": True, "booking": response.data[0]}
+            else:
+                return {"success": False, "error": "Booking not found"}
+        except Exception as e:
+            logger.error(f"Error cancelling booking: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _start_charging_session(self, client, user_id: Any, charger_id: Any) -> Operation:
+        # Aware UTC: a naive local time is read as UTC by Postgres, which put
+        # sessions hours into the future (or past) on non-UTC hosts
+        started = datetime.now(timezone.utc)
+        booking_data = {
+            "user_id": user_id,
+            "charger_id": charger_id,
+            "start_time": started.isoformat(),
+            "end_time": (started + timedelta(hours=1)).isoformat(),
+            "status": "Confirmed",
+            "total_cost": 0.0,
+            "energy_kwh": 0.0
+        }
+        try:
+            response = yield client.table("bookings").insert(booking_data)
+            if response.data:
+                _track_booking(response.data[0])
+                return {"success": True, "session": response.data[0]}
+            else:
+                return {"success": False, "error": "Failed to start charging"}
+        except APIError as e:
+            if e.code == EXCLUSION_VIOLATION:
+                return dict(SLOT_TAKEN)
+            logger.error(f"Error starting charging session: {e}")
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"Error starting charging session: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _get_charging_session(self, client, booking_id: Any) -> Operation:
+        try:
+            response = yield client.table("bookings")\
+                .select(columns(Booking))\
+                .eq("id", booking_id)\
+                .eq("status", "Confirmed")\
+                .lte("start_time", _utc_now())\
+                .limit(1)
+            if not response.data:
+                return None
+            charging_sessions.upsert_booking(response.data[0])
+            return response.data[0]
+        except Exception as e:
+            logger.error(f"Error fetching charging session: {e}")
+            return None
+
+    def _get_active_session(self, client, user_id: Any) -> Operation:
+        response = yield client.table("bookings")\
+            .select(columns(Booking))\
+            .eq("user_id", user_id)\
+            .eq("status", "Confirmed")\
+            .lte("start_time", _utc_now())\
+            .order("id")\
+            .limit(1)
+        if not response.data:
+            return None
+        charging_sessions.upsert_booking(response.data[0])
+        return response.data[0]
+
+    def _complete_charging_session(self, client, booking_id: Any, usage: Dict[str, float],
+                                   charger_id: Any = None) -> Operation:
+        try:
+            # Only if it is still running, so a stale session can't be completed twice
+            query = client.table("bookings").update({
+                "status": "Completed",
+                "end_time": _utc_now(),
+                **usage
+            }).eq("id", booking_id).eq("status", "Confirmed")
+            if charger_id is not None:
+                query = query.eq("charger_id", charger_id)
+            response = yield query
+            if response.data:
+                _track_booking(response.data[0])
+                return {"success": True, "booking": response.data[0]}
+            else:
+                if charger_id is None:
+                    # Stopped elsewhere; on a charger mismatch the session isn't ours to drop
+                    charging_sessions.remove_booking(booking_id)
+                return {"success": False, "error": "No active charging session"}
+        except Exception as e:
+            logger.error(f"Error completing charging session: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _get_bookings(self, client, user_id: Any, limit: int, cursor: Optional[str]) -> Operation:
+        position = decode_cursor(cursor)
+        try:
+            # Bookings that haven't ended yet, keyset-paginated on (start_time, id)
+            query = client.table("bookings")\
+                .select(columns(Booking))\
+                .eq("user_id", user_id)\
+                .gte("end_time", _utc_now())
+            response = yield after(query, "start_time", position)\
+                .order("start_time", desc=False)\
+                .order("id", desc=False)\
+                .limit(limit + 1)
+            rows, next_cursor = split_page(response.data, limit, "start_time")
+            return {"success": True, "bookings": from_rows(Booking, rows), "next_cursor": next_cursor}
+        except Exception as e:
+            logger.error(f"Error fetching bookings: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _create_booking_if_available(self, client, booking_data: Dict[str, Any]) -> Operation:
+        try:
+            if self._book_slot_rpc:
+                try:
+                    response = yield client.rpc("book_slot", {"p_booking": booking_data})
+                except APIError as e:
+                    if e.code != RPC_MISSING:
+                        raise
+                    logger.warning("book_slot RPC not found; run migrate.py (0007_bookings_no_overlap). Using check-then-insert.")
+                    self._book_slot_rpc = False
+            if not self._book_slot_rpc:
+                # Pre-migration path: overlap select, then insert
+                # Overlap: New Start < Existing End AND New End > Existing Start
+                overlaps = yield client.table("bookings")\
+                    .select("id")\
+                    .eq("charger_id", booking_data["charger_id"])\
+                    .lt("start_time", booking_data["end_time"])\
+                    .gt("end_time", booking_data["start_time"])\
+                    .neq("status", "Cancelled")
+                if overlaps.data:
+                    logger.info(f"Booking overlap found: {overlaps.data}")
+                    return dict(SLOT_TAKEN)
+                response = yield client.table("bookings").insert(booking_data)
+
+            if response.data:
+                _track_booking(response.data[0])
+                return {"success": True, "booking": response.data[0]}
+            else:
+                return {"success": False, "error": "Failed to create booking"}
+        except APIError as e:
+            if e.code == EXCLUSION_VIOLATION:
+                logger.info(f"Booking overlap rejected by database for charger {booking_data.get('charger_id')}")
+                return dict(SLOT_TAKEN)
+            logger.error(f"Error creating booking: {e}")
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"Error creating booking: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _get_busy_intervals(self, client, charger_ids: List[Any], window_start: str, window_end: str) -> Operation:
+        try:
+            # Chunk the id list so the PostgREST URL stays a sane length
+            responses = yield [
+                client.table("bookings")
+                    .select("charger_id, start_time, end_time")
+                    .in_("charger_id", charger_ids[i:i + BUSY_QUERY_CHUNK])
+                    .lt("start_time", window_end)
+                    .gt("end_time", window_start)
+                    .neq("status", "Cancelled")
+                for i in range(0, len(charger_ids), BUSY_QUERY_CHUNK)
+            ]
+            rows = [row for response in responses for row in (response.data or [])]
+            return {"success": True, "busy": group_busy_intervals(rows)}
+        except Exception as e:
+            logger.error(f"Error fetching busy intervals: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _clear_user_history(self, client, user_id: Any) -> Operation:
+        try:
+            try:
+                response = yield client.rpc("clear_user_history", {"p_user_id": user_id})
+                count = response.data or 0
+            except APIError as e:
+                if e.code != RPC_MISSING:
+                    raise
+                # Pre-migration: no archive table yet, one DELETE on bookings
+                response = yield client.table("bookings").delete()\
+                    .eq("user_id", user_id)\
+                    .in_("status", FINISHED_STATUSES)
+                count = len(response.data or [])
+            logger.info(f"Total deleted for {user_id}: {count}")
+            return {"success": True, "count": count}
+        except Exception as e:
+            logger.error(f"Error clearing history: {e}")
+            return {"success": False, "error": str(e)}
+
+    # ---- chat history ------------------------------------------------------
+
+    def _get_conversations(self, client, user_id: Any, limit: int, cursor: Optional[str]) -> Operation:
+        position = decode_cursor(cursor)
+        try:
+            query = client.table("conversations").select(columns(Conversation)).eq("user_id", user_id)
+            response = yield after(query, "created_at", position, desc=True)\
+                .order("created_at", desc=True)\
+                .order("id", desc=True)\
+                .limit(limit + 1)
+            rows, next_cursor = split_page(response.data, limit, "created_at")
+            return {"success": True, "conversations": from_rows(Conversation, rows), "next_cursor": next_cursor}
+        except Exception as e:
+            logger.error(f"Error fetching conversations: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _get_messages(self, client, conversation_id: str, limit: int, cursor: Optional[str]) -> Operation:
+        position = decode_cursor(cursor)
+        try:
+            query = client.table("messages").select(columns(Message)).eq("conversation_id", conversation_id)
+            response = yield after(query, "created_at", position, desc=True)\
+                .order("created_at", desc=True)\
+                .order("id", desc=True)\
+                .limit(limit + 1)
+            rows, next_cursor = split_page(response.data, limit, "created_at")
+            rows.reverse()
+            return {"success": True, "messages": from_rows(Message, rows), "next_cursor": next_cursor}
+        except Exception as e:
+            logger.error(f"Error fetching messages: {e}")
+            return {"success": False, "error": str(e)}
+
+
+def new_user(email: str, password_hash: str, full_name: str, verification_token: str, vehicle_model: str = None,
+             battery_capacity: float = None, avatar_url: str = None, country: str = "India",
+             role: str = "user") -> Dict[str, Any]:
+    """users row for create_user, optional fields only when provided"""
+    user_data = {
+        "email": email,
+        "password_hash": password_hash,
+        "full_name": full_name,
+        "verification_token": verification_token,
+        "is_verified": False,
+        "country": country,
+        "role": role
+    }
+    if vehicle_model:
+        user_data["vehicle_model"] = vehicle_model
+    if battery_capacity is not None:
+        user_data["battery_capacity"] = battery_capacity
+    if avatar_url:
+        user_data["avatar_url"] = avatar_url
+    return user_data
+
+
+def create_user_failed(e: Exception) -> Dict[str, Any]:
+    """create_user's answer to an error hashing or inserting"""
+    error_msg = str(e)
+    if "duplicate key" in error_msg.lower() or "unique" in error_msg.lower():
+        return {"success": False, "error": "Email already registered"}
+    return {"success": False, "error": error_msg}
+
+
+def _track_booking(row: Dict[str, Any]):
+    """Push a written booking into the in-memory indexes"""
+    occupancy_index.upsert_booking(row)
+    charging_sessions.upsert_booking(row)
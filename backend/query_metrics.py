@@ -0,0 +1,264 @@
+"""
+Per-query instrumentation
+supabase_clients wraps every client it hands out in InstrumentedClient, so
+each table()/rpc() chain's execute() is timed wherever it was built (main.py,
+agents.py, database.py, the background jobs). Per table and operation it
+records duration, rows returned, response bytes and failures by error class
+(exception type plus the Postgres/PostgREST code), and publishes histograms on
+/api/metrics. Response bytes come from the HTTP response itself (Content-Length,
+else the body read), passed over by the httpx hooks from response_hooks() that
+supabase_clients installs; the local backends have no HTTP response, so they
+report no bytes.
+
+Queries slower than SLOW_QUERY_MS are logged with the route that issued them,
+taken from RouteContextMiddleware ("background" outside a request).
+
+Tunables (env):
+    QUERY_METRICS     set to 0 to hand out unwrapped clients
+    SLOW_QUERY_MS     slow-query log threshold (default 500)
+"""
+import inspect
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("QUERY_METRICS", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+current_route: ContextVar[str] = ContextVar("current_route", default="background")
+
+# Body size of the last HTTP response in this thread/task, set by the response hooks
+_response_bytes: ContextVar[Optional[int]] = ContextVar("response_bytes", default=None)
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are reported as bucket upper bounds"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)   # last bucket is +Inf
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.total:
+            return None
+        rank, seen = q * self.total, 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{b}": c for b, c in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class _QueryStats:
+    __slots__ = ("count", "errors", "duration_ms", "rows", "bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.errors: Dict[str, int] = {}
+        self.duration_ms = Histogram(DURATION_BUCKETS_MS)
+        self.rows = Histogram(ROW_BUCKETS)
+        self.bytes = Histogram(BYTE_BUCKETS)
+
+
+def error_class(e: BaseException) -> str:
+    code = getattr(e, "code", None)
+    return f"{type(e).__name__}:{code}" if code else type(e).__name__
+
+
+def _response_size(response) -> None:
+    size = response.headers.get("content-length")
+    _response_bytes.set(int(size) if size is not None else len(response.read()))
+
+
+async def _aresponse_size(response) -> None:
+    size = response.headers.get("content-length")
+    _response_bytes.set(int(size) if size is not None else len(await response.aread()))
+
+
+def response_hooks(asynchronous: bool = False) -> Dict[str, list]:
+    """httpx event_hooks that hand each response's size to the query being timed"""
+    if not ENABLED:
+        return {}
+    return {"response": [_aresponse_size if asynchronous else _response_size]}
+
+
+class QueryMetrics:
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _QueryStats] = {}
+        self.slow_queries = 0
+
+    def record(self, table: str, operation: str, started: float, response: Any = None,
+               error: Optional[BaseException] = None, size: Optional[int] = None):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        data = getattr(response, "data", None)
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        key = f"{table}.{operation}"
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _QueryStats()
+            stats.count += 1
+            stats.duration_ms.observe(elapsed_ms)
+            if error is not None:
+                name = error_class(error)
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+            else:
+                stats.rows.observe(rows)
+                if size is not None:
+                    stats.bytes.observe(size)
+            if elapsed_ms >= self.slow_query_ms:
+                self.slow_queries += 1
+        if elapsed_ms >= self.slow_query_ms:
+            outcome = f"error={error_class(error)}" if error is not None else f"rows={rows} bytes={size}"
+            logger.warning(f"Slow query {key} took {elapsed_ms:.0f}ms ({outcome}) route={current_route.get()}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "slow_query_ms": self.slow_query_ms,
+                "slow_queries": self.slow_queries,
+                "queries": {
+                    key: {
+                        "count": s.count,
+                        "errors": dict(s.errors),
+                        "duration_ms": s.duration_ms.snapshot(),
+                        "rows": s.rows.snapshot(),
+                        "bytes": s.bytes.snapshot(),
+                    }
+                    for key, s in sorted(self._stats.items())
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.slow_queries = 0
+
+
+query_metrics = QueryMetrics()
+
+
+# ---- client wrappers ---------------------------------------------------------
+
+class _TracedQuery:
+    """Follows a request-builder chain and times its execute()"""
+    __slots__ = ("_builder", "_table", "_operation")
+
+    def __init__(self, builder, table: str, operation: str):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+        operation = name if name in OPERATIONS else self._operation
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _TracedQuery(result, self._table, operation)
+            return result
+        return call
+
+    def execute(self):
+        started = time.perf_counter()
+        _response_bytes.set(None)
+        try:
+            result = self._builder.execute()
+        except Exception as e:
+            query_metrics.record(self._table, self._operation, started, error=e)
+            raise
+        if inspect.isawaitable(result):
+            return self._finish(result, started)
+        query_metrics.record(self._table, self._operation, started, response=result, size=_response_bytes.get())
+        return result
+
+    async def _finish(self, pending, started: float):
+        # The hook runs inside this task, so its value is visible here once the request returns
+        _response_bytes.set(None)
+        try:
+            response = await pending
+        except Exception as e:
+            query_metrics.record(self._table, self._operation, started, error=e)
+            raise
+        query_metrics.record(self._table, self._operation, started, response=response, size=_response_bytes.get())
+        return response
+
+
+class InstrumentedClient:
+    """Wraps a Supabase Client/AsyncClient (or a local store client)"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str) -> _TracedQuery:
+        return _TracedQuery(self._client.table(name), name, "select")
+
+    def from_(self, name: str) -> _TracedQuery:
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, *args, **kwargs) -> _TracedQuery:
+        return _TracedQuery(self._client.rpc(fn, params or {}, *args, **kwargs), fn, "rpc")
+
+    def __getattr__(self, name: str):
+        # auth, storage, ... pass straight through
+        return getattr(self._client, name)
+
+
+def instrument(client):
+    return InstrumentedClient(client) if ENABLED else client
+
+
+class RouteContextMiddleware:
+    """ASGI middleware that tags everything a request does with its route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        method = scope["method"] if scope["type"] == "http" else "WS"
+        token = current_route.set(f"{method} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
@@ -0,0 +1,171 @@
+"""
+Column projections and compact row models
+Each use case declares the columns it actually reads as a frozen, slotted
+dataclass; queries select exactly those columns instead of "*", and rows come
+back as these objects rather than dicts. Credentials only ever travel in
+UserCredentials, which only the login path asks for.
+
+    res = db.client.table("bookings").select(columns(Booking)).eq(...).execute()
+    bookings = from_rows(Booking, res.data)
+
+FastAPI serializes dataclasses directly, so rows can be returned from
+endpoints as-is; use as_dict() where a plain dict is needed (json.dumps).
+
+Some columns only exist once an optional migration is applied (see
+OPTIONAL_COLUMNS). "select *" used to tolerate their absence, so queries on
+those tables build their list with projection() and, when Postgres answers
+42703, call column_missing() and retry: the column is left out from then on
+and rows fall back to the model defaults.
+"""
+import logging
+import re
+import threading
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+UNDEFINED_COLUMN = "42703"
+# table -> columns added by migrations a database may not have run yet
+OPTIONAL_COLUMNS = {
+    "users": ("role", "country", "is_verified"),          # 0002, 0003, 0001 (absent from setup_tables.sql)
+    "chargers": ("power_kw", "updated_at"),               # 0004, 0006
+}
+_missing_lock = threading.Lock()
+_missing: Dict[str, Set[str]] = {}
+
+
+@lru_cache(maxsize=None)
+def field_names(model: type) -> Tuple[str, ...]:
+    return tuple(f.name for f in fields(model))
+
+
+@lru_cache(maxsize=None)
+def columns(model: type) -> str:
+    """PostgREST select list for a row model"""
+    return ", ".join(field_names(model))
+
+
+def projection(table: str, names: Iterable[str]) -> str:
+    """Select list for `names`, minus optional columns this database lacks"""
+    missing = _missing.get(table, ())
+    return ", ".join(name for name in names if name not in missing)
+
+
+def has_column(table: str, name: str) -> bool:
+    return name not in _missing.get(table, ())
+
+
+def column_missing(table: str, error: BaseException) -> bool:
+    """
+    Record an optional column reported missing by a 42703 error on `table`;
+    True if one was recorded and the query should be retried.
+    """
+    if getattr(error, "code", None) != UNDEFINED_COLUMN:
+        return False
+    message = str(getattr(error, "message", None) or error)
+    with _missing_lock:
+        missing = _missing.setdefault(table, set())
+        for name in OPTIONAL_COLUMNS.get(table, ()):
+            if name not in missing and re.search(rf"\b{name}\b", message):
+                missing.add(name)
+                logger.warning(f"Column {table}.{name} missing; run migrate.py. Selecting without it.")
+                return True
+    return False
+
+
+def from_row(model: Type[T], row: Dict[str, Any]) -> T:
+    """Build a row model from a PostgREST row, ignoring extra keys"""
+    return model(**{name: row[name] for name in field_names(model) if name in row})
+
+
+def from_rows(model: Type[T], rows: Optional[Iterable[Dict[str, Any]]]) -> List[T]:
+    return [from_row(model, row) for row in rows or ()]
+
+
+def as_dict(obj) -> Dict[str, Any]:
+    return {name: getattr(obj, name) for name in field_names(type(obj))}
+
+
+# ---- users -----------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    """Everything the app shows or checks about a user, minus credentials"""
+    id: Any
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    vehicle_model: Optional[str] = None
+    battery_capacity: Optional[float] = None
+    avatar_url: Optional[str] = None
+    created_at: Optional[str] = None
+    country: Optional[str] = None
+    role: Optional[str] = None
+    is_verified: bool = False
+
+    def session_payload(self) -> Dict[str, Any]:
+        """User fields returned by /api/login and /api/verify-session (never credentials)"""
+        return {name: getattr(self, name) for name in field_names(UserProfile) if name != "is_verified"}
+
+
+@dataclass(frozen=True, slots=True)
+class UserCredentials(UserProfile):
+    """Login path only"""
+    password_hash: Optional[str] = None
+
+    def profile(self) -> UserProfile:
+        return UserProfile(**{name: getattr(self, name) for name in field_names(UserProfile)})
+
+
+# ---- bookings --------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class BookingSlot:
+    """Just enough to place a booking on a charger's timeline"""
+    id: Any
+    charger_id: Any
+    start_time: str
+    end_time: str
+    status: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class Booking:
+    """Booking as shown to its owner"""
+    id: Any
+    user_id: Any = None
+    charger_id: Any = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    status: Optional[str] = None
+    energy_kwh: Optional[float] = None
+    total_cost: Optional[float] = None
+    created_at: Optional[str] = None
+
+
+# ---- chargers --------------------------------------------------------------
+# Chargers stay mappings (the catalog, spatial index and agents read them with
+# .get), so they only get a projection. power_kw and updated_at are optional
+# (OPTIONAL_COLUMNS).
+
+CHARGER_FIELDS = ("id", "name", "location", "status", "cost_per_kwh", "power_kw", "created_at", "updated_at")
+
+
+# ---- chat ------------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Conversation:
+    id: Any
+    title: Optional[str] = None
+    created_at: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class Message:
+    id: Any
+    role: Optional[str] = None
+    content: Optional[str] = None
+    created_at: Optional[str] = None
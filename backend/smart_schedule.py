@@ -0,0 +1,126 @@
+"""
+Smart schedule scoring
+Scores every (charger, forecast hour) pair at once as a NumPy matrix:
+    score = distance_km * w_distance + cost_per_kwh * w_cost - efficiency * w_efficiency
+Lower is better. Cells whose 2-hour slot overlaps an existing booking are
+masked out before picking the best options.
+
+Candidates come nearest first in rounds of MAX_CANDIDATES (growing each
+round); a round is final once no charger further away could score better
+than the options already found (see may_improve).
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from availability import EMPTY
+from spatial_index import charger_coordinates, haversine_km
+
+SLOT_HOURS = 2
+DEFAULT_COST_PER_KWH = 12.0
+# Chargers considered in the first round, nearest first
+MAX_CANDIDATES = 50
+# Fallback location used when a charger has no coordinates
+DEFAULT_LAT = 12.9716
+DEFAULT_LNG = 77.5946
+# Distance used when a charger's coordinates can't be parsed
+UNKNOWN_DISTANCE_KM = 999999.0
+
+
+@dataclass
+class ScoreWeights:
+    distance: float = 10.0
+    cost: float = 5.0
+    efficiency: float = 0.5
+
+
+class InService(NamedTuple):
+    """Chargers not under maintenance, summarised for candidate selection"""
+    unplaced: Tuple[Dict[str, Any], ...]   # no usable coordinates, so not in the spatial index
+    min_cost: float
+
+
+_summary_lock = threading.Lock()
+_summary: Tuple[Any, Optional[InService]] = (None, None)   # (catalog snapshot, summary)
+
+
+def charger_cost(charger: Dict[str, Any]) -> float:
+    cost = charger.get('cost_per_kwh')
+    return cost if cost is not None else DEFAULT_COST_PER_KWH
+
+
+def catalog_summary(catalog) -> Optional[InService]:
+    """InService for a charger catalog snapshot (cached per snapshot); None if every charger is in maintenance"""
+    global _summary
+    cached, summary = _summary
+    if cached is catalog:
+        return summary
+    in_service = [c for c in catalog.chargers if c.get('status') != 'Maintenance']
+    summary = None
+    if in_service:
+        summary = InService(
+            unplaced=tuple(c for c in in_service if charger_coordinates(c) is None),
+            min_cost=min(charger_cost(c) for c in in_service),
+        )
+    with _summary_lock:
+        _summary = (catalog, summary)
+    return summary
+
+
+def fallback_distance(charger: Dict[str, Any], lat: float, lng: float) -> float:
+    """Distance to a charger the spatial index holds no position for"""
+    location = charger.get('location') or {}
+    try:
+        charger_lat = float(location.get('lat', DEFAULT_LAT))
+        charger_lng = float(location.get('lng', DEFAULT_LNG))
+    except (AttributeError, TypeError, ValueError):
+        return UNKNOWN_DISTANCE_KM
+    return float(haversine_km(lat, lng, charger_lat, charger_lng))
+
+
+def availability_matrix(chargers: List[Dict[str, Any]], busy: Dict[Any, Any],
+                        window_start: datetime, n_hours: int) -> np.ndarray:
+    """Boolean chargers × hours matrix: True where the slot starting that hour is free"""
+    slot_starts = np.datetime64(window_start, "s") + np.arange(n_hours) * np.timedelta64(3600, "s")
+    slot_ends = slot_starts + np.timedelta64(SLOT_HOURS * 3600, "s")
+    mask = np.ones((len(chargers), n_hours), dtype=bool)
+    for i, charger in enumerate(chargers):
+        intervals = busy.get(charger['id'], EMPTY)
+        if len(intervals):
+            mask[i] = intervals.free_mask(slot_starts, slot_ends)
+    return mask
+
+
+def rank_options(distances: np.ndarray, costs: np.ndarray, efficiency: np.ndarray,
+                 available: np.ndarray, weights: ScoreWeights = None, top_n: int = 1):
+    """
+    Return up to top_n (charger_index, hour_index, score) tuples, best first,
+    with at most one slot per charger.
+    """
+    weights = weights or ScoreWeights()
+    charger_part = distances * weights.distance + costs * weights.cost
+    scores = charger_part[:, None] - efficiency[None, :] * weights.efficiency
+    scores = np.where(available, scores, np.inf)
+
+    # Best hour per charger, then best chargers overall. argmin and the stable
+    # sort both keep the earliest hour / first charger on ties.
+    best_hour = np.argmin(scores, axis=1)
+    best_score = scores[np.arange(len(scores)), best_hour]
+    order = np.argsort(best_score, kind="stable")[:max(1, top_n)]
+    return [(int(c), int(best_hour[c]), float(best_score[c])) for c in order if np.isfinite(best_score[c])]
+
+
+def may_improve(ranked: List[tuple], top_n: int, frontier_km: float, min_cost: float,
+                max_efficiency: float, weights: ScoreWeights) -> bool:
+    """
+    Whether a charger at frontier_km or further could still enter the top_n:
+    true while fewer than top_n options were found, or while the best score
+    such a charger could reach (cheapest cost, best hour) beats the last one.
+    """
+    if len(ranked) < max(1, top_n):
+        return True
+    bound = frontier_km * weights.distance + min_cost * weights.cost - max_efficiency * weights.efficiency
+    return bound < ranked[-1][2]
@@ -0,0 +1,119 @@
+"""
+Solar geometry helpers
+Vectorized sun position (declination, equation of time, hour angle) using the
+NOAA fractional-year approximations. Accurate to a fraction of a degree, which
+is far better than the forecast inputs it feeds.
+"""
+from datetime import date, datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+
+# Latitude/longitude are snapped to bands of this size (degrees) for the
+# per-day lookup tables. 0.25° is ~28 km and ~1 minute of solar time.
+BAND_DEG = 0.25
+
+# Minimal value used when clamping sin(altitude) to avoid division by zero
+_MIN_SIN_ALT = 1e-6
+
+
+def _fractional_year(day_of_year, utc_hours):
+    """Fractional year angle (radians) used by the NOAA equations"""
+    return 2.0 * np.pi / 365.0 * (day_of_year - 1 + (utc_hours - 12.0) / 24.0)
+
+
+def declination(day_of_year, utc_hours=12.0):
+    """Solar declination in radians"""
+    g = _fractional_year(np.asarray(day_of_year, dtype=float), np.asarray(utc_hours, dtype=float))
+    return (0.006918 - 0.399912 * np.cos(g) + 0.070257 * np.sin(g)
+            - 0.006758 * np.cos(2 * g) + 0.000907 * np.sin(2 * g)
+            - 0.002697 * np.cos(3 * g) + 0.00148 * np.sin(3 * g))
+
+
+def equation_of_time(day_of_year, utc_hours=12.0):
+    """Equation of time in minutes"""
+    g = _fractional_year(np.asarray(day_of_year, dtype=float), np.asarray(utc_hours, dtype=float))
+    return 229.18 * (0.000075 + 0.001868 * np.cos(g) - 0.032077 * np.sin(g)
+                     - 0.014615 * np.cos(2 * g) - 0.040849 * np.sin(2 * g))
+
+
+def solar_altitude_from_parts(day_of_year, utc_hours, lat, lng):
+    """
+    Solar altitude in degrees (negative below the horizon).
+    All arguments broadcast against each other.
+    """
+    utc_hours = np.asarray(utc_hours, dtype=float)
+    decl = declination(day_of_year, utc_hours)
+    eqt = equation_of_time(day_of_year, utc_hours)
+
+    # True solar time (minutes) -> hour angle (degrees, 0 at solar noon)
+    true_solar_minutes = utc_hours * 60.0 + eqt + 4.0 * np.asarray(lng, dtype=float)
+    hour_angle = np.radians(true_solar_minutes / 4.0 - 180.0)
+
+    lat_rad = np.radians(np.asarray(lat, dtype=float))
+    sin_alt = np.sin(lat_rad) * np.sin(decl) + np.cos(lat_rad) * np.cos(decl) * np.cos(hour_angle)
+    return np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+
+
+def solar_altitude(times_utc, lat, lng):
+    """Solar altitude in degrees for an array of UTC numpy datetime64 values"""
+    times = np.asarray(times_utc, dtype="datetime64[s]")
+    days = times.astype("datetime64[D]")
+    utc_hours = (times - days).astype(np.int64) / 3600.0
+    years = times.astype("datetime64[Y]")
+    day_of_year = (days - years.astype("datetime64[D]")).astype(np.int64) + 1
+    return solar_altitude_from_parts(day_of_year, utc_hours, lat, lng)
+
+
+def _band(value: float) -> float:
+    return round(round(float(value) / BAND_DEG) * BAND_DEG, 4)
+
+
+@lru_cache(maxsize=4096)
+def _day_table(day_ordinal: int, lat_band: float, lng_band: float) -> np.ndarray:
+    """Hourly (UTC 00:00-23:00) solar altitude for one day and one location band"""
+    d = date.fromordinal(day_ordinal)
+    day_of_year = d.timetuple().tm_yday
+    table = solar_altitude_from_parts(day_of_year, np.arange(24, dtype=float), lat_band, lng_band)
+    table.setflags(write=False)
+    return table
+
+
+def day_table(day: date, lat: float, lng: float) -> np.ndarray:
+    """Cached hourly altitude table (read-only) for a UTC day at the given location band"""
+    return _day_table(day.toordinal(), _band(lat), _band(lng))
+
+
+def hourly_altitude(times_utc, lat: float, lng: float) -> np.ndarray:
+    """
+    Solar altitude (degrees) at the start of each timestamp's UTC hour, served
+    from the per-day tables. Forecast windows only ever touch 2-3 days.
+    """
+    times = np.asarray(times_utc, dtype="datetime64[h]")
+    days = times.astype("datetime64[D]")
+    hours = (times - days).astype(np.int64)
+
+    unique_days, day_idx = np.unique(days, return_inverse=True)
+    tables = np.stack([day_table(d.item(), lat, lng) for d in unique_days])
+    return tables[day_idx, hours]
+
+
+def clear_sky_ghi(altitude_deg) -> np.ndarray:
+    """Clear-sky global horizontal irradiance (W/m²), Haurwitz model"""
+    sin_alt = np.sin(np.radians(np.asarray(altitude_deg, dtype=float)))
+    sin_alt = np.maximum(sin_alt, _MIN_SIN_ALT)
+    ghi = 1098.0 * sin_alt * np.exp(-0.057 / sin_alt)
+    return np.where(np.asarray(altitude_deg) > 0, ghi, 0.0)
+
+
+def clear_sky_uv(altitude_deg) -> np.ndarray:
+    """Approximate clear-sky UV index (~12 with the sun overhead)"""
+    sin_alt = np.clip(np.sin(np.radians(np.asarray(altitude_deg, dtype=float))), 0.0, 1.0)
+    return 12.0 * sin_alt ** 2.0
+
+
+def utc_hours_from(start: datetime, n_hours: int) -> np.ndarray:
+    """Array of n consecutive hourly UTC datetime64 values starting at `start`"""
+    if start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(start, "s") + np.arange(n_hours) * np.timedelta64(3600, "s")
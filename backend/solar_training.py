@@ -0,0 +1,175 @@
+"""
+Solar ML training pipeline
+Generates synthetic training data with array operations, trains the solar
+efficiency model, evaluates it on a held-out set and writes a versioned model
+artifact plus metrics. Request-serving code only ever loads the result.
+
+Usage:
+    python solar_training.py --samples 2000000 --seed 7 --n-estimators 200
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import solar_geometry
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ['hour', 'cloud_cover', 'radiation']
+MODELS_DIR = Path(os.getenv("SOLAR_MODEL_DIR", Path(__file__).parent / "models"))
+LATEST_MANIFEST = "latest.json"
+
+
+def generate_synthetic_data(n_samples: int = 3000, seed=None, latitude_range=(-60.0, 65.0)):
+    """
+    Generate synthetic solar data for training with physically grounded features.
+    Samples hour of (solar) day, day of year, latitude and cloud cover, then
+    derives radiation from clear-sky irradiance and cloud attenuation.
+    """
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(0, 24, n_samples)
+    cloud_cover = rng.uniform(0, 100, n_samples)
+    day_of_year = rng.integers(1, 366, n_samples)
+    lat = rng.uniform(latitude_range[0], latitude_range[1], n_samples)
+
+    # Local solar hour == UTC hour at longitude 0
+    altitude = solar_geometry.solar_altitude_from_parts(day_of_year, hours, lat, 0.0)
+    theoretical_rad = solar_geometry.clear_sky_ghi(altitude)
+
+    # Cloud cover reduces GHI, but diffuse radiation remains
+    radiation = theoretical_rad * (1 - (cloud_cover * 0.75) / 100)
+    radiation += rng.normal(0, 50, n_samples)  # Noise
+    radiation = np.maximum(0, radiation)
+
+    # 'Efficiency' is output power % of rated output, reached at 1000 W/m² (STC)
+    efficiency = np.clip((radiation / 1000.0) * 100, 0, 100)
+
+    X = pd.DataFrame({'hour': hours, 'cloud_cover': cloud_cover, 'radiation': radiation}, columns=FEATURES)
+    return X, efficiency
+
+
+def build_model(n_estimators: int = 100, max_depth=None, seed: int = 42, n_jobs=None):
+    """Random Forest regressor used by SolarMLService"""
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=seed, n_jobs=n_jobs)
+
+
+def evaluate_model(model, X, y) -> dict:
+    """Regression error metrics on an evaluation set"""
+    pred = np.clip(model.predict(X), 0, 100)
+    err = pred - y
+    ss_tot = float(np.sum((y - y.mean()) ** 2))
+    return {
+        "mae": float(np.mean(np.abs(err))),
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "r2": 1.0 - float(np.sum(err ** 2)) / ss_tot if ss_tot else 0.0,
+        "n_eval": int(len(y)),
+    }
+
+
+def train(samples: int, seed: int, n_estimators: int = 100, max_depth=None,
+          eval_samples: int = 20000, n_jobs=None):
+    """Generate data, fit and evaluate. Returns (model, metrics)."""
+    t0 = time.perf_counter()
+    X_train, y_train = generate_synthetic_data(samples, seed=seed)
+    gen_seconds = time.perf_counter() - t0
+
+    model = build_model(n_estimators=n_estimators, max_depth=max_depth, seed=seed, n_jobs=n_jobs)
+    t0 = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - t0
+
+    # Held-out set from an independent stream
+    X_eval, y_eval = generate_synthetic_data(eval_samples, seed=seed + 1)
+    metrics = evaluate_model(model, X_eval, y_eval)
+    metrics.update({
+        "n_train": int(samples),
+        "seed": int(seed),
+        "params": {"n_estimators": n_estimators, "max_depth": max_depth},
+        "generate_seconds": round(gen_seconds, 3),
+        "train_seconds": round(train_seconds, 3),
+    })
+    return model, metrics
+
+
+def save_artifact(model, metrics: dict, output_dir: Path = MODELS_DIR, version: str = None) -> Path:
+    """Write model + metrics under a version tag and point the manifest at it"""
+    import joblib
+    import sklearn
+
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model_file = f"solar_rf-{version}.joblib"
+    # Serving predicts small batches; per-call worker fan-out only adds overhead
+    model.set_params(n_jobs=None)
+    joblib.dump(model, output_dir / model_file, compress=3)
+
+    manifest = {
+        "version": version,
+        "model_file": model_file,
+        "features": FEATURES,
+        "sklearn_version": sklearn.__version__,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "metrics": metrics,
+    }
+    with open(output_dir / f"solar_rf-{version}.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Atomic swap of the "latest" pointer
+    tmp = output_dir / f".{LATEST_MANIFEST}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, output_dir / LATEST_MANIFEST)
+    return output_dir / model_file
+
+
+def load_latest(models_dir: Path = MODELS_DIR):
+    """Load the model referenced by the latest manifest. Returns (model, manifest) or (None, None)."""
+    manifest_path = Path(models_dir) / LATEST_MANIFEST
+    if not manifest_path.exists():
+        return None, None
+    import joblib
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    model = joblib.load(Path(models_dir) / manifest["model_file"])
+    return model, manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and version the solar efficiency model")
+    parser.add_argument("--samples", type=int, default=200000, help="Training rows to generate")
+    parser.add_argument("--eval-samples", type=int, default=20000, help="Held-out evaluation rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel fit workers (-1 = all cores)")
+    parser.add_argument("--output-dir", default=str(MODELS_DIR))
+    parser.add_argument("--version", default=None, help="Version tag (default: UTC timestamp)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Training on {args.samples} synthetic rows (seed={args.seed})...")
+    model, metrics = train(
+        samples=args.samples,
+        seed=args.seed,
+        n_estimators=args.n_estimators,
+        max_depth=args.max_depth,
+        eval_samples=args.eval_samples,
+        n_jobs=args.n_jobs,
+    )
+    path = save_artifact(model, metrics, Path(args.output_dir), args.version)
+    logger.info(f"Saved {path}")
+    print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
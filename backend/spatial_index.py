@@ -0,0 +1,188 @@
+"""
+Charger spatial index
+Ball tree (haversine metric) over charger coordinates for k-nearest and
+within-radius lookups, plus the shared great-circle distance helper.
+
+The tree itself is immutable, so changes are applied incrementally: moved,
+removed or re-statused chargers are tombstoned, new positions go to a small
+linearly-scanned delta, and the tree is rebuilt once the delta grows past a
+threshold.
+"""
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+REBUILD_THRESHOLD = 256
+
+
+def haversine_km(lat, lng, lats, lngs) -> np.ndarray:
+    """Great-circle distance (km) from one point to arrays of points"""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def charger_coordinates(charger: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(lat, lng) from a charger row (JSON location or top-level keys), or None"""
+    loc = charger.get('location')
+    if isinstance(loc, dict):
+        lat = loc.get('lat', loc.get('latitude'))
+        lng = loc.get('lng', loc.get('longitude'))
+    else:
+        lat = charger.get('latitude') or charger.get('lat') or charger.get('Latitude')
+        lng = charger.get('longitude') or charger.get('lng') or charger.get('Longitude')
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+class ChargerSpatialIndex:
+    def __init__(self, rebuild_threshold: int = REBUILD_THRESHOLD):
+        self.rebuild_threshold = rebuild_threshold
+        self._lock = threading.Lock()
+        self._entries: Dict[Any, Tuple[float, float, Any]] = {}   # id -> (lat, lng, status), live state
+        self._tree = None
+        self._tree_ids: List[Any] = []
+        self._tree_entries: Dict[Any, Tuple[float, float, Any]] = {}  # state as of the last build
+        self._tree_status_counts = Counter()
+        self._stale = set()      # tree ids whose tree entry no longer matches
+        self._delta = {}         # id -> (lat, lng, status) not represented in the tree
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, chargers: Iterable[Dict[str, Any]]):
+        """Replace the index contents with the given charger rows"""
+        entries = {}
+        for charger in chargers:
+            coords = charger_coordinates(charger)
+            if coords is not None:
+                entries[charger['id']] = (coords[0], coords[1], charger.get('status'))
+        with self._lock:
+            self._entries = entries
+            self._rebuild_locked()
+
+    def sync(self, chargers: Iterable[Dict[str, Any]]):
+        """Apply the difference between the index and a full charger listing"""
+        seen = set()
+        for charger in chargers:
+            seen.add(charger['id'])
+            self.upsert(charger)
+        for charger_id in [cid for cid in self._entries if cid not in seen]:
+            self.remove(charger_id)
+
+    def upsert(self, charger: Dict[str, Any]):
+        """Add a charger or apply a location/status change"""
+        coords = charger_coordinates(charger)
+        if coords is None:
+            self.remove(charger['id'])
+            return
+        charger_id = charger['id']
+        entry = (coords[0], coords[1], charger.get('status'))
+        with self._lock:
+            if self._entries.get(charger_id) == entry:
+                return
+            self._entries[charger_id] = entry
+            if self._tree_entries.get(charger_id) == entry:
+                # Changed back to what the tree already holds
+                self._stale.discard(charger_id)
+                self._delta.pop(charger_id, None)
+            else:
+                if charger_id in self._tree_entries:
+                    self._stale.add(charger_id)
+                self._delta[charger_id] = entry
+            self._maybe_rebuild_locked()
+
+    def remove(self, charger_id: Any):
+        with self._lock:
+            if self._entries.pop(charger_id, None) is None:
+                return
+            self._delta.pop(charger_id, None)
+            if charger_id in self._tree_entries:
+                self._stale.add(charger_id)
+            self._maybe_rebuild_locked()
+
+    def _maybe_rebuild_locked(self):
+        if len(self._stale) + len(self._delta) > self.rebuild_threshold:
+            self._rebuild_locked()
+
+    def _rebuild_locked(self):
+        from sklearn.neighbors import BallTree
+
+        ids = list(self._entries)
+        self._tree_ids = ids
+        self._tree_entries = dict(self._entries)
+        self._tree_status_counts = Counter(e[2] for e in self._tree_entries.values())
+        self._stale = set()
+        self._delta = {}
+        if ids:
+            coords = np.radians([[self._entries[i][0], self._entries[i][1]] for i in ids])
+            self._tree = BallTree(coords, metric="haversine")
+        else:
+            self._tree = None
+
+    def _snapshot(self):
+        with self._lock:
+            return (self._tree, self._tree_ids, self._tree_entries, self._tree_status_counts,
+                    set(self._stale), dict(self._delta))
+
+    @staticmethod
+    def _keep(entry, exclude_statuses) -> bool:
+        return not exclude_statuses or entry[2] not in exclude_statuses
+
+    def nearest(self, lat: float, lng: float, k: int = 5,
+                exclude_statuses: Iterable[str] = ()) -> List[Tuple[Any, float]]:
+        """k nearest chargers as (charger_id, distance_km), closest first"""
+        exclude_statuses = set(exclude_statuses)
+        tree, tree_ids, tree_entries, status_counts, stale, delta = self._snapshot()
+        results = []
+        if tree is not None and k > 0:
+            # Over-fetch by the number of entries that may be filtered out
+            excluded = sum(status_counts[s] for s in exclude_statuses)
+            fetch = min(len(tree_ids), k + len(stale) + excluded)
+            dist, idx = tree.query(np.radians([[lat, lng]]), k=fetch)
+            for d, i in zip(dist[0], idx[0]):
+                charger_id = tree_ids[i]
+                if charger_id in stale or not self._keep(tree_entries[charger_id], exclude_statuses):
+                    continue
+                results.append((charger_id, float(d * EARTH_RADIUS_KM)))
+        results.extend(self._scan_delta(delta, lat, lng, exclude_statuses))
+        results.sort(key=lambda r: r[1])
+        return results[:k]
+
+    def within(self, lat: float, lng: float, radius_km: float,
+               exclude_statuses: Iterable[str] = ()) -> List[Tuple[Any, float]]:
+        """All chargers within radius_km as (charger_id, distance_km), closest first"""
+        exclude_statuses = set(exclude_statuses)
+        tree, tree_ids, tree_entries, _, stale, delta = self._snapshot()
+        results = []
+        if tree is not None:
+            idx, dist = tree.query_radius(np.radians([[lat, lng]]), r=radius_km / EARTH_RADIUS_KM,
+                                          return_distance=True)
+            for d, i in zip(dist[0], idx[0]):
+                charger_id = tree_ids[i]
+                if charger_id in stale or not self._keep(tree_entries[charger_id], exclude_statuses):
+                    continue
+                results.append((charger_id, float(d * EARTH_RADIUS_KM)))
+        results.extend(r for r in self._scan_delta(delta, lat, lng, exclude_statuses) if r[1] <= radius_km)
+        results.sort(key=lambda r: r[1])
+        return results
+
+    def _scan_delta(self, delta, lat, lng, exclude_statuses) -> List[Tuple[Any, float]]:
+        items = [(cid, e) for cid, e in delta.items() if self._keep(e, exclude_statuses)]
+        if not items:
+            return []
+        dists = haversine_km(lat, lng, np.array([e[0] for _, e in items]), np.array([e[1] for _, e in items]))
+        return [(cid, float(d)) for (cid, _), d in zip(items, dists)]
+
+
+# Shared instance, kept in step with the chargers table
+charger_index = ChargerSpatialIndex()
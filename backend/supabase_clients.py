@@ -0,0 +1,156 @@
+"""
+Shared Supabase client registry
+One sync Client and one AsyncClient per process, each on a pooled httpx client
+(keep-alive, HTTP/2 when the h2 package is installed), so no request path pays
+for a new HTTP session or TLS handshake. Database, AsyncDatabase and the
+maintenance scripts all get their clients here; the app lifespan opens the
+async client at startup and closes everything on shutdown.
+
+STORAGE_BACKEND picks what the clients talk to:
+    supabase    the Supabase project in NEXT_PUBLIC_SUPABASE_URL (default)
+    sqlite      local_store.LocalStore on the file at SQLITE_PATH
+    memory      local_store.LocalStore in memory, empty on every start
+The local backends need no credentials or network; see local_store.py.
+
+Every client handed out is wrapped by query_metrics.instrument, which times
+each query for /api/metrics and the slow-query log; the httpx clients carry
+its response hooks, which report each response's size.
+
+Tunables (env):
+    SUPABASE_MAX_CONNECTIONS    pool size per client (default 100)
+    SUPABASE_MAX_KEEPALIVE      idle connections kept open (default 20)
+    SUPABASE_KEEPALIVE_EXPIRY   seconds an idle connection is kept (default 30)
+    SUPABASE_TIMEOUT            request timeout in seconds (default 30)
+    SUPABASE_HTTP2              set to 0 to force HTTP/1.1
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from query_metrics import instrument, response_hooks
+from supabase import (AsyncClient, AsyncClientOptions, Client, ClientOptions,
+                      acreate_client, create_client)
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables from parent directory before reading tunables
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+HTTP2 = os.getenv("SUPABASE_HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+
+STORAGE_BACKENDS = ("supabase", "sqlite", "memory")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", str(Path(__file__).parent / "local_store.sqlite3"))
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}, got {STORAGE_BACKEND!r}")
+
+
+def credentials() -> Tuple[str, str]:
+    """Supabase URL and service key from the environment"""
+    supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
+    if not supabase_url or not supabase_key:
+        raise ValueError("Missing Supabase credentials in environment variables")
+    return supabase_url, supabase_key
+
+
+def _http_settings() -> dict:
+    return {
+        "http2": HTTP2,
+        "follow_redirects": True,
+        "timeout": TIMEOUT,
+        "limits": httpx.Limits(max_connections=MAX_CONNECTIONS,
+                               max_keepalive_connections=MAX_KEEPALIVE,
+                               keepalive_expiry=KEEPALIVE_EXPIRY),
+    }
+
+
+class SupabaseClients:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client: Optional[Client] = None
+        self._http: Optional[httpx.Client] = None
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._async_client: Optional[AsyncClient] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._store = None
+
+    @property
+    def is_local(self) -> bool:
+        return STORAGE_BACKEND != "supabase"
+
+    def local_store(self):
+        """The process-wide LocalStore (local backends only), opened on first use"""
+        with self._lock:
+            if self._store is None:
+                from local_store import LocalStore
+                self._store = LocalStore(":memory:" if STORAGE_BACKEND == "memory" else SQLITE_PATH)
+        return self._store
+
+    def client(self) -> Client:
+        """The shared sync client, created on first use"""
+        if self._client is None and self.is_local:
+            from local_store import LocalClient
+            self._client = instrument(LocalClient(self.local_store()))
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    supabase_url, supabase_key = credentials()
+                    self._http = httpx.Client(**_http_settings(), event_hooks=response_hooks())
+                    options = ClientOptions(httpx_client=self._http, postgrest_client_timeout=TIMEOUT)
+                    self._client = instrument(create_client(supabase_url, supabase_key, options=options))
+                    logger.info(f"Supabase client opened (http2={HTTP2}, max {MAX_CONNECTIONS} connections)")
+        return self._client
+
+    async def async_client(self) -> AsyncClient:
+        """The shared async client, created on first use"""
+        if self._async_client is None and self.is_local:
+            from local_store import LocalAsyncClient
+            self._async_client = instrument(LocalAsyncClient(self.local_store()))
+        if self._async_client is None:
+            if self._async_lock is None:
+                self._async_lock = asyncio.Lock()
+            async with self._async_lock:
+                if self._async_client is None:
+                    supabase_url, supabase_key = credentials()
+                    self._async_http = httpx.AsyncClient(**_http_settings(),
+                                                         event_hooks=response_hooks(asynchronous=True))
+                    options = AsyncClientOptions(httpx_client=self._async_http, postgrest_client_timeout=TIMEOUT)
+                    self._async_client = instrument(await acreate_client(supabase_url, supabase_key, options=options))
+                    logger.info(f"Async Supabase client opened (http2={HTTP2}, max {MAX_CONNECTIONS} connections)")
+        return self._async_client
+
+    @property
+    def current_async(self) -> AsyncClient:
+        """The async client if already opened (e.g. by the app lifespan)"""
+        if self._async_client is None:
+            raise RuntimeError("Async Supabase client is not open")
+        return self._async_client
+
+    def close(self):
+        """Close the sync client's connections"""
+        with self._lock:
+            http, self._http, self._client = self._http, None, None
+        if http is not None:
+            http.close()
+
+    async def aclose(self):
+        """Close every pooled connection (app shutdown)"""
+        http, self._async_http, self._async_client = self._async_http, None, None
+        if http is not None:
+            await http.aclose()
+        self.close()
+
+
+supabase_clients = SupabaseClients()
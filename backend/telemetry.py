@@ -0,0 +1,475 @@
+"""
+Charger meter telemetry
+POST /api/telemetry takes batched meter samples (power, energy register, SoC)
+per charging session (= booking id) as parallel arrays. Each session keeps its
+raw samples in a numpy ring buffer (grown on demand up to
+TELEMETRY_RING_SAMPLES, then overwriting the oldest); ingesting a batch is a
+handful of vectorised array operations, with no per-sample Python work, so one
+worker absorbs tens of thousands of samples per second.
+
+Energy is accounted on ingest, per sample: the trapezoidal integral of power
+(gaps capped at TELEMETRY_MAX_GAP_SECONDS) for samples without a meter
+register, and for a register reading its increase over the previous reading
+less the power-integrated energy already counted in between. The register
+stays authoritative (a 7 kWh meterStart..meterStop session bills 7 kWh however
+many power-only MeterValues arrived), and the correction can make a minute's
+energy negative when power over-estimated. Samples older than the newest one
+already seen for the session are dropped as duplicates/late arrivals.
+
+A background task closes finished minutes every TELEMETRY_FLUSH_SECONDS,
+reduces them to one row per session and minute (samples, energy, meter
+register, average/max power, last SoC), and bulk-upserts the rows into
+session_meter_minutes. A minute closes once a later sample arrives, or after
+TELEMETRY_IDLE_SECONDS without samples. finish() (the stop action) closes the
+session and returns its delivered energy; sessions metered by another worker
+are summed from session_meter_minutes.
+
+A session this worker doesn't hold (metered elsewhere, before a restart, or
+evicted after EVICT_SECONDS without samples) is resumed from its written
+minutes before new samples are ingested for it: energy so far and the last
+register reading, so the next reading is billed as a delta from there instead
+of starting a new baseline.
+
+All state lives on the event loop thread: ingest, flush and finish are only
+called from async endpoints and tasks.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from postgrest.exceptions import APIError
+
+from supabase_clients import supabase_clients
+
+logger = logging.getLogger(__name__)
+
+RING_SAMPLES = int(os.getenv("TELEMETRY_RING_SAMPLES", "4096"))
+FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "5"))
+IDLE_SECONDS = float(os.getenv("TELEMETRY_IDLE_SECONDS", "120"))
+MAX_GAP_SECONDS = float(os.getenv("TELEMETRY_MAX_GAP_SECONDS", "300"))
+MAX_SESSIONS = int(os.getenv("TELEMETRY_MAX_SESSIONS", "20000"))
+MAX_PENDING_ROWS = int(os.getenv("TELEMETRY_MAX_PENDING_ROWS", "100000"))
+INITIAL_RING_SAMPLES = 64   # rings start small and double up to RING_SAMPLES
+WRITE_CHUNK_ROWS = 1000
+RESUME_CHUNK = 200   # sessions per session_meter_minutes lookup
+EVICT_SECONDS = 3600.0   # forget sessions that were never stopped
+
+TABLE = "session_meter_minutes"
+MINUTE = 60.0
+FOREIGN_KEY_VIOLATION = "23503"   # session_id is not a booking
+
+# Ring buffer columns
+TS, POWER, DELTA, METER, SOC = range(5)
+
+
+def _forward_fill(values: np.ndarray, previous: float) -> np.ndarray:
+    """Replace NaNs with the last valid value before them (or `previous`)"""
+    values = np.concatenate(([previous], values))
+    index = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return values[index][1:]
+
+
+def _minute_iso(minute: int) -> str:
+    return datetime.fromtimestamp(minute * MINUTE, timezone.utc).isoformat()
+
+
+def _minute_of(iso: str) -> int:
+    return int(datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp() // MINUTE)
+
+
+class SessionMeter:
+    """Ring buffer and running totals for one charging session"""
+    __slots__ = ("session_id", "capacity", "ring", "head", "tail", "last_ts", "last_power", "last_meter", "last_soc",
+                 "unmetered_kwh", "energy_kwh", "samples", "overwritten", "last_seen", "last_row")
+
+    def __init__(self, session_id: int, capacity: int = RING_SAMPLES):
+        self.session_id = session_id
+        self.capacity = capacity
+        self.ring = np.empty((min(INITIAL_RING_SAMPLES, capacity), 5), dtype=np.float64)
+        self.head = 0            # samples written so far
+        self.tail = 0            # samples already reduced into minute rows
+        self.last_ts = -math.inf
+        self.last_power = math.nan
+        self.last_meter = math.nan
+        self.last_soc = math.nan
+        self.unmetered_kwh = 0.0   # power-integrated energy since the last meter reading
+        self.energy_kwh = 0.0
+        self.samples = 0
+        self.overwritten = 0
+        self.last_seen = time.monotonic()
+        self.last_row: Optional[Dict[str, Any]] = None
+
+    def append(self, ts: np.ndarray, power: np.ndarray, meter: np.ndarray, soc: np.ndarray) -> int:
+        """Add a batch (parallel float arrays, NaN = not reported); returns samples kept"""
+        order = np.argsort(ts, kind="stable")
+        ts, power, meter, soc = ts[order], power[order], meter[order], soc[order]
+        # Strictly increasing and newer than anything seen before
+        keep = np.isfinite(ts) & (ts > np.maximum.accumulate(np.concatenate(([self.last_ts], ts[:-1]))))
+        if not keep.all():
+            ts, power, meter, soc = ts[keep], power[keep], meter[keep], soc[keep]
+        n = len(ts)
+        if not n:
+            return 0
+
+        # Energy per sample: power integrated over the gap, or for a meter reading
+        # the register increase less what power already counted since the previous one
+        prev_ts = np.concatenate(([self.last_ts], ts[:-1]))
+        dt = np.clip(np.nan_to_num(ts - prev_ts, posinf=0.0), 0.0, MAX_GAP_SECONDS)
+        power_filled = _forward_fill(power, self.last_power)
+        prev_power = np.concatenate(([self.last_power], power_filled[:-1]))
+        prev_power = np.where(np.isnan(prev_power), power_filled, prev_power)
+        integrated = np.nan_to_num((power_filled + prev_power) / 2 * dt / 3600)
+        meter_filled = _forward_fill(meter, self.last_meter)
+        prev_meter = np.concatenate(([self.last_meter], meter_filled[:-1]))
+        metered = meter - prev_meter
+        has_meter = ~np.isnan(meter)
+        counted = self.unmetered_kwh + np.cumsum(np.where(has_meter, 0.0, integrated))
+        readings = np.flatnonzero(has_meter)
+        since_reading = counted[readings] - np.concatenate(([0.0], counted[readings[:-1]]))
+        metered[readings] -= since_reading
+        # A first reading or a register reset starts a new baseline: keep the power estimate
+        valid = np.isfinite(metered) & (meter - prev_meter >= 0)
+        delta = np.where(valid, metered, integrated)
+
+        block = np.column_stack((ts, power, delta, meter, soc))
+        self._reserve(self.head - self.tail + n)
+        capacity = len(self.ring)
+        if n > capacity:
+            block = block[-capacity:]
+        positions = np.arange(self.head + n - len(block), self.head + n) % capacity
+        self.ring[positions] = block
+        self.head += n
+        if self.head - self.tail > capacity:
+            self.overwritten += self.head - self.tail - capacity
+            self.tail = self.head - capacity
+
+        self.last_ts = float(ts[-1])
+        self.last_power = float(power_filled[-1])
+        self.last_meter = float(meter_filled[-1])
+        self.unmetered_kwh = float(counted[-1] - (counted[readings[-1]] if len(readings) else 0.0))
+        soc_filled = _forward_fill(soc, self.last_soc)
+        self.last_soc = float(soc_filled[-1])
+        self.energy_kwh += float(delta.sum())
+        self.samples += n
+        self.last_seen = time.monotonic()
+        return n
+
+    def restore(self, rows: List[Dict[str, Any]]):
+        """Continue from the minute rows already written for this session, oldest first"""
+        if not rows:
+            return
+        self.energy_kwh = float(sum(row["energy_kwh"] for row in rows))
+        metered = [i for i, row in enumerate(rows) if row["meter_kwh"] is not None]
+        if metered:
+            self.last_meter = float(rows[metered[-1]]["meter_kwh"])
+            # Minutes after the last register reading were power-integrated only
+            self.unmetered_kwh = float(sum(row["energy_kwh"] for row in rows[metered[-1] + 1:]))
+        if rows[-1]["soc_percent"] is not None:
+            self.last_soc = float(rows[-1]["soc_percent"])
+        # Samples up to the end of the last written minute were counted already
+        # (StopTransaction resends them as transactionData)
+        self.last_ts = (_minute_of(rows[-1]["minute"]) + 1) * MINUTE - 1e-3
+
+    def _reserve(self, wanted: int):
+        """Grow the ring (keeping buffered samples in place) to hold `wanted` samples, up to capacity"""
+        size = len(self.ring)
+        if wanted <= size or size >= self.capacity:
+            return
+        while size < wanted:
+            size *= 2
+        ring = np.empty((min(size, self.capacity), 5), dtype=np.float64)
+        buffered = np.arange(self.tail, self.head)
+        ring[buffered % len(ring)] = self.ring[buffered % len(self.ring)]
+        self.ring = ring
+
+    def close_minutes(self, until: float = math.inf) -> List[Dict[str, Any]]:
+        """Reduce buffered samples from minutes starting before `until` (epoch s) into rows"""
+        if self.head == self.tail:
+            return []
+        pending = self.ring[np.arange(self.tail, self.head) % len(self.ring)]
+        minutes = np.floor(pending[:, TS] / MINUTE).astype(np.int64)
+        count = len(pending) if until == math.inf else int(np.searchsorted(minutes, math.floor(until / MINUTE)))
+        if not count:
+            return []
+        pending, minutes = pending[:count], minutes[:count]
+        self.tail += count
+
+        starts = np.flatnonzero(np.concatenate(([True], minutes[1:] != minutes[:-1])))
+        ends = np.concatenate((starts[1:], [count])) - 1
+        power = pending[:, POWER]
+        reported = ~np.isnan(power)
+        power_sum = np.add.reduceat(np.where(reported, power, 0.0), starts)
+        power_count = np.add.reduceat(reported.astype(np.int64), starts)
+        power_max = np.fmax.reduceat(power, starts)
+        energy = np.add.reduceat(pending[:, DELTA], starts)
+        meter = _forward_fill(pending[:, METER], math.nan)[ends]
+        soc = _forward_fill(pending[:, SOC], math.nan)[ends]
+
+        def value(x: float, digits: int) -> Optional[float]:
+            return None if math.isnan(x) else round(float(x), digits)
+
+        rows = []
+        for i, start in enumerate(starts):
+            rows.append({
+                "booking_id": self.session_id,
+                "minute": int(minutes[start]),
+                "samples": int(ends[i] - start + 1),
+                "energy_kwh": round(float(energy[i]), 6),
+                "meter_kwh": value(meter[i], 6),
+                "power_kw_avg": value(power_sum[i] / power_count[i], 3) if power_count[i] else None,
+                "power_kw_max": value(power_max[i], 3),
+                "soc_percent": value(soc[i], 2),
+            })
+        # A minute closed by idling can receive more samples later: merge into the row already sent
+        last = self.last_row
+        if last is not None and rows[0]["minute"] == last["minute"]:
+            rows[0] = self._merge(last, rows[0])
+        self.last_row = rows[-1]
+        return rows
+
+    @staticmethod
+    def _merge(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+        merged = dict(new)
+        merged["samples"] = old["samples"] + new["samples"]
+        merged["energy_kwh"] = round(old["energy_kwh"] + new["energy_kwh"], 6)
+        averages = [(r["power_kw_avg"], r["samples"]) for r in (old, new) if r["power_kw_avg"] is not None]
+        if averages:
+            merged["power_kw_avg"] = round(sum(a * n for a, n in averages) / sum(n for _, n in averages), 3)
+        maxima = [r["power_kw_max"] for r in (old, new) if r["power_kw_max"] is not None]
+        merged["power_kw_max"] = max(maxima) if maxima else None
+        for key in ("meter_kwh", "soc_percent"):
+            if merged[key] is None:
+                merged[key] = old[key]
+        return merged
+
+    def live(self) -> Dict[str, Any]:
+        return {
+            "energy_kwh": round(self.energy_kwh, 3),
+            "power_kw": None if math.isnan(self.last_power) else self.last_power,
+            "soc_percent": None if math.isnan(self.last_soc) else self.last_soc,
+            "last_sample_at": datetime.fromtimestamp(self.last_ts, timezone.utc).isoformat(),
+            "samples": self.samples,
+        }
+
+
+class Telemetry:
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, idle_seconds: float = IDLE_SECONDS,
+                 max_sessions: int = MAX_SESSIONS, max_pending_rows: int = MAX_PENDING_ROWS):
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_pending_rows = max_pending_rows
+        self._sessions: Dict[int, SessionMeter] = {}
+        self._rows: List[Dict[str, Any]] = []
+        self._write_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"samples_accepted": 0, "samples_late": 0, "samples_rejected": 0, "samples_overwritten": 0,
+                       "sessions_resumed": 0, "rows_written": 0, "rows_dropped": 0, "flushes": 0, "last_flush_ms": None, "last_error": None}
+
+    # ---- ingest ----------------------------------------------------------
+
+    def ingest(self, session_id: int, ts: Sequence[float], power_kw: Sequence[Optional[float]],
+               energy_kwh: Optional[Sequence[Optional[float]]] = None,
+               soc: Optional[Sequence[Optional[float]]] = None) -> int:
+        """
+        Add samples for one session. `ts` is epoch seconds; the other arrays are
+        parallel to it, with None for values a sample didn't report. Returns the
+        number of samples kept. Raises ValueError on mismatched array lengths.
+        """
+        n = len(ts)
+        for name, values in (("power_kw", power_kw), ("energy_kwh", energy_kwh), ("soc", soc)):
+            if values is not None and len(values) != n:
+                raise ValueError(f"{name} has {len(values)} values for {n} timestamps")
+        if not n:
+            return 0
+        meter = self._sessions.get(session_id)
+        if meter is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._stats["samples_rejected"] += n
+                return 0
+            meter = self._sessions[session_id] = SessionMeter(session_id)
+
+        missing = np.full(n, np.nan)
+        overwritten = meter.overwritten
+        kept = meter.append(
+            np.asarray(ts, dtype=np.float64),
+            np.asarray(power_kw, dtype=np.float64),
+            np.asarray(energy_kwh, dtype=np.float64) if energy_kwh is not None else missing,
+            np.asarray(soc, dtype=np.float64) if soc is not None else missing,
+        )
+        self._stats["samples_accepted"] += kept
+        self._stats["samples_late"] += n - kept
+        self._stats["samples_overwritten"] += meter.overwritten - overwritten
+        return kept
+
+    async def resume(self, session_ids: Sequence[Any]):
+        """
+        Rebuild the meters of sessions this worker doesn't hold from their
+        session_meter_minutes, before ingesting samples for them
+        """
+        missing = list({int(session_id) for session_id in session_ids} - self._sessions.keys())
+        if not missing:
+            return
+        rows: Dict[int, List[Dict[str, Any]]] = {}
+        try:
+            client = await supabase_clients.async_client()
+            for i in range(0, len(missing), RESUME_CHUNK):
+                res = await client.table(TABLE)\
+                    .select("booking_id,minute,energy_kwh,meter_kwh,soc_percent")\
+                    .in_("booking_id", missing[i:i + RESUME_CHUNK])\
+                    .order("minute")\
+                    .execute()
+                for row in res.data or []:
+                    rows.setdefault(int(row["booking_id"]), []).append(row)
+        except Exception as e:
+            logger.error(f"Telemetry resume failed for {len(missing)} sessions: {e}")
+            return
+        for session_id in missing:
+            # Samples may have arrived while the rows were loading: keep that meter
+            if session_id not in self._sessions and len(self._sessions) < self.max_sessions:
+                meter = self._sessions[session_id] = SessionMeter(session_id)
+                meter.restore(rows.get(session_id, []))
+        self._stats["sessions_resumed"] += len(rows)
+
+    def live(self, session_id: Any) -> Optional[Dict[str, Any]]:
+        """Running totals for a session metered by this worker"""
+        meter = self._sessions.get(int(session_id))
+        return meter.live() if meter is not None and meter.samples else None
+
+    # ---- writing ---------------------------------------------------------
+
+    def _queue(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self._rows.append(dict(row, minute=_minute_iso(row["minute"])))
+        overflow = len(self._rows) - self.max_pending_rows
+        if overflow > 0:
+            del self._rows[:overflow]
+            self._stats["rows_dropped"] += overflow
+            logger.error(f"Telemetry writes are behind: dropped {overflow} oldest minute rows")
+
+    async def _upsert(self, client, rows: List[Dict[str, Any]]):
+        await client.table(TABLE).upsert(rows, on_conflict="booking_id,minute").execute()
+
+    async def _write_chunk(self, client, rows: List[Dict[str, Any]]):
+        try:
+            await self._upsert(client, rows)
+            self._stats["rows_written"] += len(rows)
+        except APIError as e:
+            if e.code != FOREIGN_KEY_VIOLATION:
+                raise
+            # Samples for ids that aren't bookings: drop those sessions, keep the rest
+            for booking_id in {r["booking_id"] for r in rows}:
+                session_rows = [r for r in rows if r["booking_id"] == booking_id]
+                try:
+                    await self._upsert(client, session_rows)
+                    self._stats["rows_written"] += len(session_rows)
+                except APIError as row_error:
+                    if row_error.code != FOREIGN_KEY_VIOLATION:
+                        raise
+                    self._sessions.pop(booking_id, None)
+                    self._stats["rows_dropped"] += len(session_rows)
+                    logger.warning(f"Dropped telemetry for unknown session {booking_id}")
+
+    async def _write_pending(self):
+        async with self._write_lock:
+            while self._rows:
+                chunk = self._rows[:WRITE_CHUNK_ROWS]
+                del self._rows[:len(chunk)]
+                try:
+                    client = await supabase_clients.async_client()
+                    await self._write_chunk(client, chunk)
+                except BaseException as e:
+                    self._rows[:0] = chunk   # retried on the next flush
+                    if not isinstance(e, Exception):
+                        raise
+                    self._stats["last_error"] = str(e)
+                    logger.error(f"Telemetry write failed, {len(self._rows)} rows pending: {e}")
+                    return
+            self._stats["last_error"] = None
+
+    async def flush(self, close_all: bool = False):
+        """Close finished minutes of every session and write them"""
+        started = time.perf_counter()
+        now = time.monotonic()
+        for session_id, meter in list(self._sessions.items()):
+            idle = now - meter.last_seen
+            until = math.inf if close_all or idle > self.idle_seconds else meter.last_ts
+            self._queue(meter.close_minutes(until))
+            if idle > EVICT_SECONDS and meter.head == meter.tail:
+                del self._sessions[session_id]
+        await self._write_pending()
+        self._stats["flushes"] += 1
+        self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    async def finish(self, session_id: Any) -> Optional[float]:
+        """
+        Close a session and write its remaining minutes. Returns the energy
+        delivered in kWh, or None if the session never reported telemetry.
+        """
+        meter = self._sessions.pop(int(session_id), None)
+        if meter is not None and (meter.samples or meter.energy_kwh):
+            self._queue(meter.close_minutes())
+            await self._write_pending()
+            return meter.energy_kwh
+        # Metered by another worker (or before a restart), never resumed here
+        client = await supabase_clients.async_client()
+        res = await client.table(TABLE).select("energy_kwh").eq("booking_id", session_id).execute()
+        if not res.data:
+            return None
+        return sum(r["energy_kwh"] for r in res.data)
+
+    async def bill(self, session: Dict[str, Any], energy_kwh: Optional[float] = None) -> Dict[str, float]:
+        """
+        Finish a session and price its energy at the charger's cost_per_kwh.
+        `energy_kwh` overrides the metered total when the caller knows it exactly.
+        """
+        from charger_catalog import charger_catalog
+        from smart_schedule import DEFAULT_COST_PER_KWH
+        metered = await self.finish(session["id"])
+        if energy_kwh is None:
+            energy_kwh = metered or 0.0
+        charger = charger_catalog.get(session["charger_id"]) or {}
+        rate = charger.get("cost_per_kwh") if charger.get("cost_per_kwh") is not None else DEFAULT_COST_PER_KWH
+        return {"energy_kwh": round(energy_kwh, 3), "total_cost": round(energy_kwh * rate, 2)}
+
+    # ---- lifecycle -------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Telemetry flush error: {e}")
+
+    def start(self):
+        """Start the flush task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="telemetry-flush")
+
+    async def stop(self):
+        """Stop the flush task and write every open minute"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush(close_all=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "buffered_samples": sum(m.head - m.tail for m in self._sessions.values()),
+            "pending_rows": len(self._rows),
+            **self._stats,
+        }
+
+
+telemetry = Telemetry()
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# The backend is a flat set of modules run from this directory (uvicorn main:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# In-memory local store instead of Supabase, and cheap password hashes for seeding
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+
+@pytest.fixture
+def store():
+    """A fresh seeded LocalStore behind supabase_clients, with the caches rebuilt from it"""
+    from charger_catalog import charger_catalog
+    from charging_sessions import charging_sessions
+    from local_store import LocalStore
+    from supabase_clients import supabase_clients
+    from telemetry import telemetry
+    from user_cache import user_cache
+
+    store = LocalStore()
+    store.seed(chargers=3, users=2, bookings_per_charger=0)
+    supabase_clients._store = store
+    supabase_clients._client = supabase_clients._async_client = None
+    user_cache.clear()
+    charger_catalog.invalidate()
+    charging_sessions.reload()
+    telemetry._sessions.clear()
+    telemetry._rows.clear()
+    yield store
+
+
+@pytest.fixture
+def anyio_backend():
+    # The backend runs on uvicorn's asyncio loop only
+    return "asyncio"
@@ -0,0 +1,52 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from local_store import LocalClient, LocalStore
+
+
+@pytest.fixture
+def client():
+    store = LocalStore()
+    store.seed(chargers=1, users=1, bookings_per_charger=0)
+    return LocalClient(store)
+
+
+def finished_booking(client, status="Completed"):
+    booking = client.table("bookings").insert({
+        "user_id": 1, "charger_id": 1, "status": status,
+        "start_time": "2020-01-01T10:00:00Z", "end_time": "2020-01-01T11:00:00Z",
+    }).execute().data[0]
+    client.table("session_meter_minutes").insert([
+        {"booking_id": booking["id"], "minute": f"2020-01-01T10:0{m}:00Z", "samples": 6, "energy_kwh": 0.1}
+        for m in range(3)
+    ]).execute()
+    return booking
+
+
+def test_archiving_moves_meter_minutes_with_the_booking(client):
+    booking = finished_booking(client)
+    assert client.rpc("archive_bookings", {"p_older_than_days": 1}).execute().data == 1
+
+    assert client.table("bookings").select("id").execute().data == []
+    assert client.table("session_meter_minutes").select("booking_id").execute().data == []
+    archived = client.table("session_meter_minutes_archive").select("*").execute().data
+    assert [row["booking_id"] for row in archived] == [booking["id"]] * 3
+    assert sum(row["energy_kwh"] for row in archived) == pytest.approx(0.3)
+    assert all(row["archived_at"] for row in archived)
+
+
+def test_metered_booking_cannot_be_deleted_directly(client):
+    booking = finished_booking(client)
+    with pytest.raises(APIError):
+        client.table("bookings").delete().eq("id", booking["id"]).execute()
+    assert len(client.table("session_meter_minutes").select("minute").execute().data) == 3
+
+
+def test_clearing_history_drops_meter_minutes_hot_and_archived(client):
+    finished_booking(client)
+    client.rpc("archive_bookings", {"p_older_than_days": 1}).execute()
+    finished_booking(client, status="Cancelled")
+
+    assert client.rpc("clear_user_history", {"p_user_id": 1}).execute().data == 2
+    assert client.table("session_meter_minutes").select("minute").execute().data == []
+    assert client.table("session_meter_minutes_archive").select("minute").execute().data == []
@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from availability import parse_timestamp
+from supabase_clients import supabase_clients
+
+
+@pytest.fixture
+def kolkata_tz(monkeypatch):
+    """Run the test with the process in a UTC+05:30 local time zone"""
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def client(store):
+    with TestClient(main.app) as c:
+        yield c
+
+
+def control(client, **body):
+    response = client.post("/api/charge/control", json={"user_id": "1", **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_session_lifecycle_in_non_utc_timezone(kolkata_tz, client):
+    assert time.localtime().tm_gmtoff == 19800
+
+    started = control(client, action="start", charger_id=2)
+    assert started["is_charging"] is True
+    start_time = parse_timestamp(started["session"]["start_time"])
+    utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+    assert abs(start_time - utc_now) < timedelta(minutes=1)
+
+    status = control(client, action="status")
+    assert status["is_charging"] is True
+    assert status["session"]["id"] == started["session"]["id"]
+
+    stopped = control(client, action="stop")
+    assert stopped["message"] == "Charging stopped"
+    assert control(client, action="status")["is_charging"] is False
+
+    booking = supabase_clients.client().table("bookings").select("*")\
+        .eq("id", started["session"]["id"]).execute().data[0]
+    assert booking["status"] == "Completed"
+    assert parse_timestamp(booking["start_time"]) <= parse_timestamp(booking["end_time"])
+    assert parse_timestamp(booking["end_time"]) - utc_now < timedelta(minutes=1)
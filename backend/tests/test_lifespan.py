@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+import main
+from charger_catalog import charger_catalog
+from charging_sessions import charging_sessions
+from occupancy_index import occupancy_index
+from supabase_clients import supabase_clients
+
+
+def test_shutdown_closes_the_clients_after_the_background_threads(store, monkeypatch):
+    calls = []
+    for name, component in [("charging_sessions", charging_sessions), ("occupancy_index", occupancy_index),
+                            ("charger_catalog", charger_catalog)]:
+        def stop(stop=component.stop, name=name):
+            calls.append((name, supabase_clients._async_client is not None))
+            stop()
+        monkeypatch.setattr(component, "stop", stop)
+    aclose = supabase_clients.aclose
+
+    async def closing():
+        calls.append(("aclose", True))
+        await aclose()
+    monkeypatch.setattr(supabase_clients, "aclose", closing)
+
+    with TestClient(main.app):
+        pass
+    assert calls == [("charging_sessions", True), ("occupancy_index", True), ("charger_catalog", True),
+                     ("aclose", True)]
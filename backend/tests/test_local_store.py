@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from postgrest.exceptions import APIError
+
+from local_store import LocalClient, LocalStore
+
+T0 = datetime(2026, 10, 19, 8, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def client():
+    store = LocalStore()
+    store.seed(chargers=2, users=2, bookings_per_charger=0)
+    yield LocalClient(store)
+    store.close()
+
+
+def booking(charger_id, start_hour, hours=1, status="Confirmed", user_id=1, **extra):
+    return {"user_id": user_id, "charger_id": charger_id, "status": status,
+            "start_time": (T0 + timedelta(hours=start_hour)).isoformat(),
+            "end_time": (T0 + timedelta(hours=start_hour + hours)).isoformat(), **extra}
+
+
+def ids(response):
+    return [row["id"] for row in response.data]
+
+
+def error_code(call):
+    with pytest.raises(APIError) as e:
+        call()
+    return e.value.code
+
+
+def test_filters(client):
+    client.table("bookings").insert([
+        booking(1, 0), booking(1, 2, status="Completed", energy_kwh=5.0),
+        booking(2, 0, user_id=2), booking(2, 3, status="Cancelled"),
+    ]).execute()
+    bookings = lambda: client.table("bookings").select("id").order("id")
+    find = lambda query: ids(query.execute())
+
+    assert find(bookings().eq("charger_id", 1)) == [1, 2]
+    assert find(bookings().neq("status", "Confirmed")) == [2, 4]
+    assert find(bookings().in_("status", ["Completed", "Cancelled"]).eq("user_id", 1)) == [2, 4]
+    assert find(bookings().in_("status", [])) == []
+    assert find(bookings().is_("energy_kwh", "null")) == [1, 3, 4]
+    # Timestamps compare as instants whatever offset the filter is written in
+    assert find(bookings().gte("start_time", "2026-10-19T15:30:00+05:30")) == [2, 4]
+    assert find(bookings().gt("start_time", "2026-10-19T10:00:00")) == [4]
+    assert find(bookings().or_('status.eq.Cancelled,and(charger_id.eq.1,start_time.lt."2026-10-19T09:00:00+00:00")')) == [1, 4]
+
+
+def test_order_limit_range_and_count(client):
+    client.table("bookings").insert([
+        booking(1, 0, energy_kwh=3.0), booking(1, 1), booking(1, 2, energy_kwh=1.0), booking(1, 3, energy_kwh=2.0),
+    ]).execute()
+
+    ordered = client.table("bookings").select("id").order("energy_kwh").execute()
+    assert ids(ordered) == [3, 4, 1, 2]    # nulls last ascending, first descending, as in Postgres
+    assert ids(client.table("bookings").select("id").order("energy_kwh", desc=True).execute()) == [2, 1, 4, 3]
+    assert ids(client.table("bookings").select("id").order("id").limit(2).execute()) == [1, 2]
+    page = client.table("bookings").select("id", count="exact").order("id").range(1, 2).execute()
+    assert ids(page) == [2, 3] and page.count == 4
+
+
+def test_embed_and_column_errors(client):
+    client.table("bookings").insert(booking(2, 0)).execute()
+
+    rows = client.table("bookings").select("id, start_time, chargers(name)").execute().data
+    assert rows == [{"id": 1, "start_time": "2026-10-19T08:00:00+00:00", "chargers": {"name": "Charger 2"}}]
+    assert error_code(lambda: client.table("bookings").select("id, nope").execute()) == "42703"
+    assert error_code(lambda: client.table("bookings").select("id").eq("nope", 1).execute()) == "42703"
+    assert error_code(lambda: client.table("nope").select("*").execute()) == "42P01"
+    assert error_code(lambda: client.rpc("nope", {}).execute()) == "PGRST202"
+
+
+def test_overlap_constraint(client):
+    client.table("bookings").insert(booking(1, 0, hours=2)).execute()
+
+    assert error_code(lambda: client.table("bookings").insert(booking(1, 1)).execute()) == "23P01"
+    # A failing batch leaves nothing behind
+    assert error_code(lambda: client.table("bookings").insert([booking(2, 0), booking(1, 1)]).execute()) == "23P01"
+    assert ids(client.table("bookings").select("id").execute()) == [1]
+    # Touching ends, other chargers and cancelled bookings don't clash
+    client.table("bookings").insert([booking(1, 2), booking(2, 1), booking(1, 1, status="Cancelled")]).execute()
+    assert error_code(lambda: client.table("bookings").update({"status": "Confirmed"}).eq("id", 4).execute()) == "23P01"
+    assert error_code(lambda: client.rpc("book_slot", {"p_booking": booking(2, 1)}).execute()) == "23P01"
+    assert client.rpc("book_slot", {"p_booking": booking(2, 5, status=None)}).execute().data[0]["status"] == "Confirmed"
+    assert error_code(lambda: client.table("bookings").insert(booking(2, 8, hours=-1)).execute()) == "22000"
+
+
+def test_constraint_errors(client):
+    assert error_code(lambda: client.table("users").insert({"email": "user1@example.com"}).execute()) == "23505"
+    assert error_code(lambda: client.table("bookings").insert(booking(99, 0)).execute()) == "23503"
+    assert error_code(lambda: client.table("chargers").insert({"name": "x", "status": "Broken"}).execute()) == "23514"
+    assert error_code(lambda: client.table("bookings").insert(booking(1, 0, start_time="soon")).execute()) == "22007"
+
+
+def test_upsert(client):
+    client.table("bookings").insert(booking(1, 0)).execute()
+    minutes = client.table("session_meter_minutes")
+    row = {"booking_id": 1, "minute": T0.isoformat(), "samples": 60, "energy_kwh": 0.1}
+
+    assert len(minutes.upsert(row, on_conflict="booking_id,minute").execute().data) == 1
+    # ignore_duplicates keeps the stored row and returns nothing for it
+    assert minutes.upsert({**row, "samples": 1}, on_conflict="booking_id,minute", ignore_duplicates=True).execute().data == []
+    # a merge updates the non-key columns from the new row
+    merged = minutes.upsert({**row, "energy_kwh": 0.2}, on_conflict="booking_id,minute").execute().data
+    assert merged[0]["energy_kwh"] == 0.2 and merged[0]["samples"] == 60
+    assert len(client.table("session_meter_minutes").select("*").execute().data) == 1
+    # the default conflict target is the primary key
+    client.table("chargers").upsert({"id": 1, "name": "Renamed"}).execute()
+    assert client.table("chargers").select("name").eq("id", 1).execute().data == [{"name": "Renamed"}]
@@ -0,0 +1,126 @@
+import json
+import os
+
+import pytest
+
+import message_writer
+from message_writer import MessageWriter
+from supabase_clients import supabase_clients
+
+pytestmark = pytest.mark.anyio
+
+
+class Down:
+    def table(self, name):
+        raise ConnectionError("database unavailable")
+
+
+@pytest.fixture
+def writer(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(message_writer, "RETRY_BACKOFF", 0)
+    writer = MessageWriter(batch_rows=2, max_retries=1, spill_dir=tmp_path)
+    writer.start = lambda: None   # no background task: the tests flush explicitly
+    return writer
+
+
+@pytest.fixture
+def outage(monkeypatch):
+    async def down():
+        return Down()
+
+    def start():
+        monkeypatch.setattr(supabase_clients, "async_client", down)
+
+    return start
+
+
+async def contents():
+    client = await supabase_clients.async_client()
+    rows = (await client.table("messages").select("content").order("created_at").execute()).data
+    return [row["content"] for row in rows]
+
+
+def conversation(writer):
+    return writer.write("conversations", {"user_id": 1, "title": "t"})
+
+
+def message(writer, conv, content, role="user"):
+    return writer.write("messages", {"conversation_id": conv["id"], "role": role, "content": content})
+
+
+async def test_batches_are_written_parents_first(writer):
+    conv = conversation(writer)
+    for i in range(3):
+        message(writer, conv, f"m{i}")
+    await writer.flush()
+    assert await contents() == ["m0", "m1", "m2"]
+    assert writer.metrics()["written_rows"] == 4
+
+
+async def test_invalid_rows_are_dropped_and_the_rest_written(writer):
+    conv = conversation(writer)
+    message(writer, conv, "ok")
+    message(writer, conv, "bad", role="robot")
+    await writer.flush()
+    assert await contents() == ["ok"]
+    assert writer.metrics()["dropped_rows"] == 1
+
+
+async def test_rows_queued_after_a_spill_wait_behind_it(writer, outage, monkeypatch):
+    outage()
+    conv = conversation(writer)
+    message(writer, conv, "spilled")
+    await writer.flush()
+    assert writer.metrics()["spilled_files"] == 1
+
+    # The database is back, but the conversation is still on disk
+    monkeypatch.undo()
+    monkeypatch.setattr(message_writer, "RETRY_BACKOFF", 0)
+    message(writer, conv, "later")
+    await writer.flush()
+    assert await contents() == ["spilled", "later"]
+    assert writer.metrics()["dropped_rows"] == 0
+    assert writer.metrics()["spilled_files"] == 0
+
+
+async def test_overflow_spill_keeps_queue_order(writer):
+    writer.max_pending = 2
+    conv = conversation(writer)
+    message(writer, conv, "queued")
+    message(writer, conv, "overflow")   # queue full: everything goes to disk
+    assert writer._pending == [] and writer.metrics()["spilled_files"] == 1
+    message(writer, conv, "after")
+
+    await writer.flush()
+    assert await contents() == ["queued", "overflow", "after"]
+    assert writer.metrics()["dropped_rows"] == 0
+
+
+async def test_replay_skips_files_claimed_by_live_workers_and_reclaims_dead_ones(writer, tmp_path):
+    conv = conversation(writer)
+    await writer.flush()
+    rows = [{"table": "messages", "row": {"id": f"00000000-0000-0000-0000-00000000000{i}",
+                                          "conversation_id": conv["id"], "role": "user", "content": f"r{i}",
+                                          "created_at": f"2026-01-01T00:00:0{i}+00:00"}} for i in range(2)]
+    live = tmp_path / f"0001-1-a.jsonl.{os.getpid()}.claimed"
+    live.write_text(json.dumps(rows[0]) + "\n")
+    dead = tmp_path / "0002-1-b.jsonl.999999999.claimed"
+    dead.write_text(json.dumps(rows[1]) + "\n")
+
+    await writer.replay_spilled()
+    assert await contents() == ["r1"]
+    assert live.exists() and not dead.exists()
+    assert writer.metrics()["replayed_rows"] == 1
+
+
+async def test_stop_spills_what_it_cannot_write(writer, outage):
+    outage()
+    conv = conversation(writer)
+    message(writer, conv, "last words")
+    await writer.stop()
+    spilled = [json.loads(line) for path in tmp_files(writer) for line in path.read_text().splitlines()]
+    assert [entry["table"] for entry in spilled] == ["conversations", "messages"]
+
+
+def tmp_files(writer):
+    return sorted(writer.spill_dir.glob("*.jsonl"))
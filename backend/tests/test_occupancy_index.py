@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from occupancy_index import SLOT, SLOTS, OccupancyIndex
+
+ORIGIN = datetime(2026, 1, 1, 0, 0)
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    return ORIGIN + timedelta(hours=hour, minutes=minute)
+
+
+def booking(booking_id, charger_id, start, end, status="Confirmed"):
+    return {"id": booking_id, "charger_id": charger_id, "start_time": start.isoformat(),
+            "end_time": end.isoformat(), "status": status}
+
+
+@pytest.fixture
+def index():
+    index = OccupancyIndex()
+    index.load([
+        booking(1, 7, at(10), at(11)),
+        booking(2, 7, at(12, 5), at(12, 20)),   # touches the 12:00 and 12:15 slots
+        booking(3, 7, at(13), at(14), status="Cancelled"),
+    ], ORIGIN)
+    return index
+
+
+def test_is_free_marks_every_touched_slot_busy(index):
+    assert index.is_free(7, at(9), at(10)) is True
+    assert index.is_free(7, at(10, 45), at(11, 15)) is False
+    assert index.is_free(7, at(11), at(12)) is True
+    # Rounded out to 15 minutes: 12:00-12:30 is busy although the booking is 12:05-12:20
+    assert index.is_free(7, at(12), at(12, 5)) is False
+    assert index.is_free(7, at(12, 25), at(12, 30)) is False
+    assert index.is_free(7, at(12, 30), at(13)) is True
+
+
+def test_cancelled_bookings_and_unknown_chargers_are_free(index):
+    assert index.is_free(7, at(13), at(14)) is True
+    assert index.is_free(99, at(10), at(11)) is True
+
+
+def test_windows_outside_the_index_are_unknown(index):
+    assert index.is_free(7, ORIGIN - SLOT, ORIGIN) is None
+    assert index.is_free(7, at(0), ORIGIN + SLOT * (SLOTS + 1)) is None
+
+
+def test_first_free_skips_busy_slots(index):
+    assert index.first_free(7, timedelta(hours=1), at(9)) == at(9)
+    assert index.first_free(7, timedelta(hours=1), at(9, 30)) == at(11)
+    # 11:00-12:00 fits one hour, not two; 12:30 is the first start after booking 2
+    assert index.first_free(7, timedelta(hours=2), at(10)) == at(12, 30)
+
+
+def test_first_free_rounds_to_slot_boundaries(index):
+    # Not before 9:50 -> first aligned start 10:00, which is busy until 11:00
+    assert index.first_free(7, timedelta(minutes=20), at(9, 50)) == at(11)
+    # 50 minutes need four slots: 11:00-12:00 fits, 11:15 would run into 12:00
+    assert index.first_free(7, timedelta(minutes=50), at(11)) == at(11)
+    assert index.first_free(7, timedelta(minutes=50), at(11, 15)) == at(12, 30)
+
+
+def test_first_free_respects_not_after(index):
+    assert index.first_free(7, timedelta(hours=1), at(10), not_after=at(11, 30)) is None
+    assert index.first_free(7, timedelta(hours=1), at(10), not_after=at(12)) == at(11)
+
+
+def test_writes_update_bits_and_ids_match_across_types(index):
+    index.upsert_booking(booking("4", "7", at(15), at(16)))
+    assert index.is_free("7", at(15), at(16)) is False
+    index.remove_booking(4)
+    assert index.is_free(7, at(15), at(16)) is True
+
+    # Moving a booking frees its old charger
+    index.upsert_booking(booking(1, 8, at(10), at(11)))
+    assert index.is_free(7, at(10), at(11)) is True
+    assert index.is_free(8, at(10), at(11)) is False
+
+    index.upsert_booking(booking(2, 7, at(12, 5), at(12, 20), status="Cancelled"))
+    assert index.is_free(7, at(12), at(12, 30)) is True
+
+
+def test_busy_view_matches_is_free(index):
+    view = index.busy_view([7, "8"], at(0), at(24))
+    assert list(view) == [7]
+    assert view[7].is_free(at(9), at(10)) and not view[7].is_free(at(10), at(11))
+
+
+@pytest.mark.anyio
+async def test_bookings_sharing_a_slot_are_left_to_the_database(store):
+    from database import db
+    from occupancy_index import occupancy_index
+
+    occupancy_index.reload()
+    day = (datetime.now(timezone.utc) + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    async def book(start_minute, end_minute):
+        return await db.create_booking_if_available({
+            "user_id": 1, "charger_id": "2", "status": "Confirmed",
+            "start_time": (day + timedelta(minutes=start_minute)).isoformat(),
+            "end_time": (day + timedelta(minutes=end_minute)).isoformat(),
+        })
+
+    assert (await book(0, 10))["success"]
+    # Same 15-minute slot, no overlap: the bitmap says busy, the constraint allows it
+    assert (await book(10, 30))["success"]
+    assert (await book(20, 40)).get("conflict") is True
@@ -0,0 +1,150 @@
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from async_database import adb
+from charging_sessions import charging_sessions
+from ocpp_gateway import CALL, CALLERROR, CALLRESULT, ChargePoint, OcppGateway
+from supabase_clients import supabase_clients
+from telemetry import telemetry
+
+pytestmark = pytest.mark.anyio
+
+T0 = time.time()
+
+
+def at(minutes: float) -> str:
+    return datetime.fromtimestamp(T0 + minutes * 60, timezone.utc).isoformat()
+
+
+async def call(gateway, cp, action, payload):
+    reply = json.loads(await gateway.handle(cp, json.dumps([CALL, "1", action, payload])))
+    assert reply[0] == CALLRESULT, reply
+    return reply[2]
+
+
+async def start(gateway, cp, user_id=1, meter_start=10_000):
+    result = await call(gateway, cp, "StartTransaction",
+                        {"connectorId": 1, "idTag": str(user_id), "meterStart": meter_start, "timestamp": at(0)})
+    assert result["idTagInfo"]["status"] == "Accepted"
+    return result["transactionId"]
+
+
+def power_values(minutes, kw):
+    return [{"timestamp": at(m), "sampledValue": [{"measurand": "Power.Active.Import", "unit": "kW", "value": str(kw)}]}
+            for m in minutes]
+
+
+def booking(booking_id):
+    return supabase_clients.client().table("bookings").select("*").eq("id", booking_id).execute().data[0]
+
+
+@pytest.fixture
+def gateway(store):
+    return OcppGateway()
+
+
+async def test_stop_bills_register_delta_despite_power_samples(gateway):
+    cp = ChargePoint("1", 1, None)
+    transaction_id = await start(gateway, cp)
+    await call(gateway, cp, "MeterValues", {"connectorId": 1, "transactionId": transaction_id,
+                                            "meterValue": power_values(range(1, 60), 7.0)})
+    result = await call(gateway, cp, "StopTransaction",
+                        {"transactionId": transaction_id, "meterStop": 17_000, "timestamp": at(60)})
+    assert result["idTagInfo"]["status"] == "Accepted"
+    assert booking(transaction_id)["status"] == "Completed"
+    assert booking(transaction_id)["energy_kwh"] == pytest.approx(7.0)
+
+
+async def test_stop_after_restart_resumes_from_written_minutes(gateway):
+    cp = ChargePoint("1", 1, None)
+    transaction_id = await start(gateway, cp)
+    await call(gateway, cp, "MeterValues", {"connectorId": 1, "transactionId": transaction_id, "meterValue": [
+        {"timestamp": at(30), "sampledValue": [{"value": "13000"}]},
+    ]})
+    await telemetry.flush(close_all=True)
+
+    # Restart (or eviction): nothing held in memory, and the new connection never saw meterStart
+    telemetry._sessions.clear()
+    reconnected = ChargePoint("1", 1, None)
+    await call(gateway, reconnected, "StopTransaction",
+               {"transactionId": transaction_id, "meterStop": 17_000, "timestamp": at(60)})
+    assert booking(transaction_id)["energy_kwh"] == pytest.approx(7.0)
+    minutes = supabase_clients.client().table("session_meter_minutes").select("energy_kwh")\
+        .eq("booking_id", transaction_id).execute().data
+    assert sum(row["energy_kwh"] for row in minutes) == pytest.approx(7.0)
+
+
+async def test_stop_from_another_charger_is_rejected(gateway):
+    transaction_id = await start(gateway, ChargePoint("1", 1, None))
+    charging_sessions.remove_booking(transaction_id)   # tracked by another worker only
+
+    result = await call(gateway, ChargePoint("2", 2, None), "StopTransaction",
+                        {"transactionId": transaction_id, "meterStop": 99_000, "timestamp": at(5)})
+    assert result["idTagInfo"]["status"] == "Invalid"
+    assert booking(transaction_id)["status"] == "Confirmed"
+    assert transaction_id in telemetry._sessions
+
+
+async def test_meter_values_after_app_stop_are_ignored(gateway):
+    cp = ChargePoint("1", 1, None)
+    transaction_id = await start(gateway, cp)
+    session = charging_sessions.get(transaction_id)
+    await adb.complete_charging_session(transaction_id, await telemetry.bill(session))
+
+    await call(gateway, cp, "MeterValues", {"connectorId": 1, "transactionId": transaction_id,
+                                            "meterValue": power_values([1, 2], 7.0)})
+    assert transaction_id not in telemetry._sessions
+
+
+async def send(gateway, cp, message):
+    reply = await gateway.handle(cp, message if isinstance(message, str) else json.dumps(message))
+    return None if reply is None else json.loads(reply)
+
+
+async def test_frames_that_get_no_reply(gateway):
+    cp = ChargePoint("1", 1, None)
+    assert await send(gateway, cp, "[2, \"1\", ") is None
+    assert await send(gateway, cp, [CALLRESULT, "1", {}]) is None
+    assert await send(gateway, cp, {"action": "Heartbeat"}) is None
+
+
+@pytest.mark.parametrize("message, code", [
+    ([CALL, "7", "Heartbeat"], "FormationViolation"),
+    ([CALL, "7", "Heartbeat", []], "FormationViolation"),
+    ([CALL, "7", "DataTransfer", {}], "NotImplemented"),
+    ([CALL, "7", "BootNotification", {"chargePointVendor": "v"}], "FormationViolation"),
+    ([CALL, "7", "StatusNotification", {"connectorId": 1, "errorCode": "NoError", "status": "Melting"}],
+     "PropertyConstraintViolation"),
+    ([CALL, "7", "MeterValues", {"connectorId": 1, "transactionId": "x", "meterValue": []}], "TypeConstraintViolation"),
+])
+async def test_call_errors(gateway, message, code):
+    reply = await send(gateway, ChargePoint("1", 1, None), message)
+    assert reply[:3] == [CALLERROR, "7", code]
+    assert gateway.metrics()["call_errors"] == 1
+
+
+async def test_boot_heartbeat_and_status(gateway):
+    cp = ChargePoint("1", 1, None)
+    boot = await call(gateway, cp, "BootNotification", {"chargePointVendor": "Acme", "chargePointModel": "AC22"})
+    assert boot["status"] == "Accepted" and boot["interval"] > 0
+    assert (cp.vendor, cp.model) == ("Acme", "AC22")
+    assert "currentTime" in await call(gateway, cp, "Heartbeat", {})
+
+    for status in ("Preparing", "Faulted"):   # coalesced: only the last one is written
+        await call(gateway, cp, "StatusNotification", {"connectorId": 1, "errorCode": "NoError", "status": status})
+    await gateway.flush_status()
+    charger = supabase_clients.client().table("chargers").select("status").eq("id", 1).execute().data[0]
+    assert charger["status"] == "Offline"
+    assert gateway.metrics()["messages"]["StatusNotification"] == 2
+
+
+async def test_unknown_id_tag_is_invalid(gateway):
+    cp = ChargePoint("1", 1, None)
+    for id_tag in ("999", "RFID-CAFE"):
+        result = await call(gateway, cp, "StartTransaction",
+                            {"connectorId": 1, "idTag": id_tag, "meterStart": 0, "timestamp": at(0)})
+        assert result == {"transactionId": 0, "idTagInfo": {"status": "Invalid"}}
+    assert cp.transaction_id is None
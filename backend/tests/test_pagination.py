@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from pagination import InvalidCursor, clamp_limit, decode_cursor, encode_cursor, envelope, split_page
+from supabase_clients import supabase_clients
+
+
+@pytest.fixture
+def client(store):
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("position", [
+    ("2026-10-19T08:30:00.123456+00:00", "6f1c2a"),
+    ("2026-10-19T08:30:00+00:00", 17),
+    (None, 0),
+    ('quote " and \\ backslash', "é"),
+])
+def test_cursor_round_trip(position):
+    cursor = encode_cursor(*position)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == position
+
+
+@pytest.mark.parametrize("cursor", ["bad!", "e30", encode_cursor(1, 2)[:-2], "WzEsMiwzXQ"])
+def test_decode_rejects_foreign_cursors(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_first_page_has_no_position():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+def test_split_page():
+    rows = [{"id": i, "start_time": f"t{i}"} for i in range(4)]
+    assert split_page(rows, 4, "start_time") == (rows, None)
+    assert split_page(None, 4, "start_time") == ([], None)
+    page, next_cursor = split_page(rows, 3, "start_time")
+    assert page == rows[:3]
+    assert decode_cursor(next_cursor) == ("t2", 2)
+    assert envelope("items", page, 3, next_cursor)["page"] == {"limit": 3, "has_more": True, "next_cursor": next_cursor}
+
+
+def test_clamp_limit():
+    assert clamp_limit(None) == 50
+    assert clamp_limit(0, default=5) == 5
+    assert clamp_limit(10_000) == 200
+
+
+def test_message_pages_cover_equal_timestamps_once(client):
+    db = supabase_clients.client()
+    db.table("conversations").insert({"id": "c1", "user_id": 1, "title": "t"}).execute()
+    # Four messages share a timestamp, so pages must break ties on id
+    stamps = ["2026-10-19T08:00:00+00:00"] * 2 + ["2026-10-19T08:01:00+00:00"] * 4 + ["2026-10-19T08:02:00+00:00"]
+    db.table("messages").insert([
+        {"id": f"m{i}", "conversation_id": "c1", "role": "user", "content": str(i), "created_at": ts}
+        for i, ts in enumerate(stamps)
+    ]).execute()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/chat/history/c1", params=params).json()
+        page = [m["id"] for m in body["messages"]]
+        assert page == sorted(page, key=lambda mid: (stamps[int(mid[1:])], mid))
+        seen = page + seen
+        cursor = body["page"]["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"m{i}" for i in range(len(stamps))]
+
+
+def test_invalid_cursor_is_a_bad_request(client):
+    response = client.get("/api/chat/history", params={"user_id": "1", "cursor": "bad!"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+    response = client.get("/api/chat/history/c1", params={"cursor": "bad!"})
+    assert response.status_code == 400
+
+    response = client.post("/api/bookings", json={"user_id": "1", "cursor": "bad!"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import queries
+from async_database import adb
+from database import db
+from queries import SLOT_TAKEN, arun, run
+
+pytestmark = pytest.mark.anyio
+
+DAY = (datetime.now(timezone.utc) + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+
+def booking(charger_id, start_hour, hours=1):
+    return {"user_id": 1, "charger_id": charger_id, "status": "Confirmed",
+            "start_time": (DAY + timedelta(hours=start_hour)).isoformat(),
+            "end_time": (DAY + timedelta(hours=start_hour + hours)).isoformat()}
+
+
+async def test_run_and_arun_drive_the_same_operation(store):
+    def operation(client):
+        first = yield client.table("chargers").select("id").order("id")
+        try:
+            yield client.table("chargers").select("nope")
+        except Exception as e:
+            error = e.code
+        both = yield [client.table("users").select("id").eq("id", row["id"]) for row in first.data]
+        return [row["id"] for row in first.data], error, [len(response.data) for response in both]
+
+    expected = ([1, 2, 3], "42703", [1, 1, 0])
+    assert run(operation(db.client)) == expected
+    assert await arun(operation(await adb.connect())) == expected
+
+
+async def test_sync_and_async_databases_share_results(store, monkeypatch):
+    monkeypatch.setattr(queries, "BUSY_QUERY_CHUNK", 2)   # several chunks per lookup
+    assert (await adb.create_booking_if_available(booking(1, 0)))["success"]
+    assert (await db.create_booking_if_available(booking(3, 1)))["success"]
+
+    assert db.get_bookings("1", 5) == await adb.get_bookings("1", 5)
+    window = (DAY.isoformat(), (DAY + timedelta(hours=4)).isoformat())
+    intervals = lambda result: {cid: list(zip(b.starts, b.ends)) for cid, b in result["busy"].items()}
+    busy = intervals(db.get_busy_intervals([1, 2, 3], *window))
+    assert busy == intervals(await adb.get_busy_intervals([1, 2, 3], *window))
+    assert sorted(busy) == [1, 3]
+
+
+@pytest.mark.parametrize("database", ["db", "adb"])
+async def test_check_then_insert_fallback(store, monkeypatch, database):
+    database = {"db": db, "adb": adb}[database]
+    monkeypatch.setattr(database, "_book_slot_rpc", False)
+
+    assert (await database.create_booking_if_available(booking(2, 0, hours=2)))["success"]
+    assert await database.create_booking_if_available(booking(2, 1)) == SLOT_TAKEN
+    assert (await database.create_booking_if_available(booking(2, 2)))["success"]
+
+
+async def test_active_session_comes_from_the_database(store):
+    started = await adb.start_charging_session(2, 1)
+    assert (await adb.get_active_session(2))["id"] == started["session"]["id"]
+    assert await adb.get_active_session(1) is None
@@ -0,0 +1,66 @@
+import json
+
+import httpx
+import pytest
+from supabase import AsyncClientOptions, ClientOptions, acreate_client, create_client
+
+from local_store import LocalClient
+from query_metrics import InstrumentedClient, query_metrics, response_hooks
+
+ROWS = [{"id": i, "name": f"Charger {i}"} for i in range(20)]
+BODY = json.dumps(ROWS, indent=2).encode()   # not what re-encoding the rows would give
+
+
+def postgrest(request: httpx.Request) -> httpx.Response:
+    if request.url.params.get("select") == "chunked":
+        # No Content-Length: the size comes from the body
+        return httpx.Response(200, headers={"content-type": "application/json"}, stream=httpx.ByteStream(BODY))
+    return httpx.Response(200, content=BODY, headers={"content-type": "application/json"})
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    query_metrics.reset()
+    yield
+    query_metrics.reset()
+
+
+def sent_bytes(key):
+    return query_metrics.snapshot()["queries"][key]["bytes"]
+
+
+def test_bytes_come_from_the_http_response():
+    http = httpx.Client(transport=httpx.MockTransport(postgrest), event_hooks=response_hooks())
+    client = InstrumentedClient(create_client("http://supabase.test", "k" * 40, options=ClientOptions(httpx_client=http)))
+
+    assert client.table("chargers").select("*").execute().data == ROWS
+    client.table("chargers").select("chunked").execute()
+    bytes_ = sent_bytes("chargers.select")
+    assert bytes_["sum"] == 2 * len(BODY) and sum(bytes_["buckets"].values()) == 2
+
+
+@pytest.mark.anyio
+async def test_bytes_come_from_the_http_response_async():
+    transport = httpx.MockTransport(postgrest)
+    http = httpx.AsyncClient(transport=transport, event_hooks=response_hooks(asynchronous=True))
+    options = AsyncClientOptions(httpx_client=http)
+    client = InstrumentedClient(await acreate_client("http://supabase.test", "k" * 40, options=options))
+
+    assert (await client.table("chargers").select("*").execute()).data == ROWS
+    await client.table("chargers").select("chunked").execute()
+    assert sent_bytes("chargers.select")["sum"] == 2 * len(BODY)
+
+
+def test_local_backend_records_no_bytes(store):
+    client = InstrumentedClient(LocalClient(store))
+    client.table("chargers").select("*").execute()
+    stats = query_metrics.snapshot()["queries"]["chargers.select"]
+    assert stats["count"] == 1 and stats["rows"]["sum"] == 3
+    assert sum(stats["bytes"]["buckets"].values()) == 0
+
+
+def test_errors_are_counted_by_code(store):
+    client = InstrumentedClient(LocalClient(store))
+    with pytest.raises(Exception):
+        client.table("chargers").select("nope").execute()
+    assert query_metrics.snapshot()["queries"]["chargers.select"]["errors"] == {"APIError:42703": 1}
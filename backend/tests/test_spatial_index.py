@@ -0,0 +1,81 @@
+import random
+
+import numpy as np
+import pytest
+
+from spatial_index import ChargerSpatialIndex, haversine_km
+
+CENTER = (12.9716, 77.5946)
+
+
+def charger(charger_id, lat, lng, status="Available"):
+    return {"id": charger_id, "location": {"lat": lat, "lng": lng}, "status": status}
+
+
+def brute_force(chargers, lat, lng, k=None, radius_km=None, exclude=()):
+    rows = [c for c in chargers.values() if c["status"] not in exclude]
+    dists = haversine_km(lat, lng, np.array([c["location"]["lat"] for c in rows]),
+                         np.array([c["location"]["lng"] for c in rows]))
+    found = sorted(zip((c["id"] for c in rows), dists.tolist()), key=lambda r: r[1])
+    if radius_km is not None:
+        found = [r for r in found if r[1] <= radius_km]
+    return found[:k] if k is not None else found
+
+
+def assert_same(found, expected):
+    assert [cid for cid, _ in found] == [cid for cid, _ in expected]
+    assert [d for _, d in found] == pytest.approx([d for _, d in expected], rel=1e-6)
+
+
+def random_charger(rng, charger_id):
+    status = rng.choice(["Available", "Occupied", "Maintenance"])
+    return charger(charger_id, CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.5, 0.5), status)
+
+
+@pytest.mark.parametrize("rebuild_threshold", [10_000, 8])
+def test_nearest_and_within_follow_incremental_changes(rebuild_threshold):
+    rng = random.Random(7)
+    chargers = {i: random_charger(rng, i) for i in range(200)}
+    index = ChargerSpatialIndex(rebuild_threshold=rebuild_threshold)
+    index.build(chargers.values())
+
+    for step in range(300):
+        action = rng.random()
+        charger_id = rng.randrange(260)
+        if action < 0.6:
+            chargers[charger_id] = random_charger(rng, charger_id)    # new, moved or re-statused
+            index.upsert(chargers[charger_id])
+        elif charger_id in chargers:
+            del chargers[charger_id]
+            index.remove(charger_id)
+
+        if step % 25 == 0:
+            lat, lng = CENTER[0] + rng.uniform(-0.3, 0.3), CENTER[1] + rng.uniform(-0.3, 0.3)
+            for exclude in ((), ("Maintenance",)):
+                assert_same(index.nearest(lat, lng, k=15, exclude_statuses=exclude),
+                            brute_force(chargers, lat, lng, k=15, exclude=exclude))
+                assert_same(index.within(lat, lng, 12.0, exclude_statuses=exclude),
+                            brute_force(chargers, lat, lng, radius_km=12.0, exclude=exclude))
+    assert len(index) == len(chargers)
+
+
+def test_tombstoned_entry_is_not_returned_from_the_tree():
+    index = ChargerSpatialIndex()
+    index.build([charger(1, *CENTER), charger(2, CENTER[0] + 0.1, CENTER[1])])
+    # Move 1 far away: the tree still holds the old position
+    index.upsert(charger(1, CENTER[0] + 1.0, CENTER[1]))
+    assert [cid for cid, _ in index.nearest(*CENTER, k=2)] == [2, 1]
+    # And back: the tree entry is valid again
+    index.upsert(charger(1, *CENTER))
+    assert [cid for cid, _ in index.nearest(*CENTER, k=1)] == [1]
+    assert index._stale == set() and index._delta == {}
+
+
+def test_status_change_excludes_and_chargers_without_location_are_dropped():
+    index = ChargerSpatialIndex()
+    index.build([charger(1, *CENTER), charger(2, CENTER[0] + 0.1, CENTER[1]), {"id": 3, "location": None}])
+    assert len(index) == 2
+    index.upsert(charger(1, *CENTER, status="Maintenance"))
+    assert [cid for cid, _ in index.nearest(*CENTER, k=2, exclude_statuses=("Maintenance",))] == [2]
+    index.upsert({"id": 2, "location": {}})
+    assert index.nearest(*CENTER, k=2, exclude_statuses=("Maintenance",)) == []
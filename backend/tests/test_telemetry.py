@@ -0,0 +1,51 @@
+import pytest
+
+from telemetry import Telemetry
+
+START = 1_700_000_000.0
+
+
+def minutes(first: int, last: int):
+    return [START + 60 * m for m in range(first, last + 1)]
+
+
+def test_power_only_session_integrates_power():
+    telemetry = Telemetry()
+    ts = minutes(0, 60)
+    telemetry.ingest(1, ts, [7.0] * len(ts))
+    assert telemetry.live(1)["energy_kwh"] == pytest.approx(7.0)
+
+
+def test_meter_readings_are_not_double_counted_with_power():
+    # OCPP: meterStart, power-only MeterValues every minute, meterStop
+    telemetry = Telemetry()
+    telemetry.ingest(1, [START], [None], [10.0])
+    ts = minutes(1, 59)
+    telemetry.ingest(1, ts, [7.0] * len(ts))
+    assert telemetry.live(1)["energy_kwh"] == pytest.approx(7.0 * 59 / 60, abs=1e-3)
+    telemetry.ingest(1, [START + 3600], [None], [17.0])
+    assert telemetry.live(1)["energy_kwh"] == pytest.approx(7.0)
+
+
+def test_meter_corrects_power_estimate_within_a_batch():
+    # Mixed samples in one batch: power over-estimates, then two register readings
+    telemetry = Telemetry()
+    ts = minutes(0, 30)
+    meter = [5.0] + [None] * 14 + [6.0] + [None] * 14 + [7.0]
+    telemetry.ingest(1, ts, [11.0] * len(ts), meter)
+    assert telemetry.live(1)["energy_kwh"] == pytest.approx(2.0)
+
+    # More power-only samples after the last reading are still counted
+    telemetry.ingest(1, minutes(31, 35), [6.0] * 5)
+    expected = 2.0 + (11.0 + 6.0) / 2 / 60 + 4 * 6.0 / 60
+    assert telemetry.live(1)["energy_kwh"] == pytest.approx(expected, abs=1e-3)
+
+
+def test_minute_rows_sum_to_metered_energy():
+    telemetry = Telemetry()
+    telemetry.ingest(1, [START], [3.3], [0.0])
+    ts = minutes(1, 119)
+    telemetry.ingest(1, ts, [3.3] * len(ts))
+    telemetry.ingest(1, [START + 7200], [3.3], [7.0])
+    rows = telemetry._sessions[1].close_minutes()
+    assert sum(row["energy_kwh"] for row in rows) == pytest.approx(7.0)
@@ -0,0 +1,107 @@
+"""
+Read-through user cache
+TTL + LRU cache of `users` rows keyed by id, with an email -> id index, so
+session checks and ownership lookups don't hit the database on every request.
+
+Entries are frozen UserProfile rows (repository.py), so they never hold
+credentials and can be handed out without copying. The login path reads
+UserCredentials straight from the database (Database.get_user_for_login).
+Writes through Database / AsyncDatabase invalidate the affected user; other
+workers see changes within the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from repository import UserCredentials, UserProfile
+
+TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class UserCache:
+    def __init__(self, ttl: float = TTL_SECONDS, max_entries: int = MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._by_id: "OrderedDict[str, tuple]" = OrderedDict()   # id -> (expires_at, row)
+        self._email_to_id: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get_locked(self, key: str) -> Optional[UserProfile]:
+        entry = self._by_id.get(key)
+        if entry is None:
+            return None
+        expires_at, row = entry
+        if expires_at < time.monotonic():
+            self._drop_locked(key)
+            return None
+        self._by_id.move_to_end(key)
+        return row
+
+    def _drop_locked(self, key: str):
+        entry = self._by_id.pop(key, None)
+        if entry is not None:
+            email = entry[1].email
+            if self._email_to_id.get(email) == key:
+                del self._email_to_id[email]
+
+    def _lookup(self, key: Optional[str]) -> Optional[UserProfile]:
+        with self._lock:
+            row = self._get_locked(key) if key is not None else None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row
+
+    def get_by_id(self, user_id: Any) -> Optional[UserProfile]:
+        return self._lookup(str(user_id))
+
+    def get_by_email(self, email: str) -> Optional[UserProfile]:
+        return self._lookup(self._email_to_id.get(email))
+
+    def put(self, user: UserProfile):
+        """Cache a user (credentials are dropped if given UserCredentials)"""
+        if user is None or user.id is None:
+            return
+        if isinstance(user, UserCredentials):
+            user = user.profile()
+        key = str(user.id)
+        with self._lock:
+            self._drop_locked(key)
+            self._by_id[key] = (time.monotonic() + self.ttl, user)
+            if user.email:
+                self._email_to_id[user.email] = key
+            while len(self._by_id) > self.max_entries:
+                self._drop_locked(next(iter(self._by_id)))
+
+    def invalidate(self, user_id: Any = None, email: str = None):
+        with self._lock:
+            if user_id is not None:
+                self._drop_locked(str(user_id))
+            if email is not None:
+                key = self._email_to_id.get(email)
+                if key is not None:
+                    self._drop_locked(key)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._email_to_id.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Shared by Database and AsyncDatabase so writes through either invalidate it
+user_cache = UserCache()
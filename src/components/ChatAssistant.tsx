@@ -27,6 +27,10 @@ export default function ChatAssistant() {
     const [conversations, setConversations] = useState<Conversation[]>([])
     const [currentConversationId, setCurrentConversationId] = useState<string | null>(null)
     const [showHistory, setShowHistory] = useState(false)
+    // page.next_cursor from the history endpoints; null once there is nothing older
+    const [conversationsCursor, setConversationsCursor] = useState<string | null>(null)
+    const [messagesCursor, setMessagesCursor] = useState<string | null>(null)
+    const [loadingOlder, setLoadingOlder] = useState(false)
 
     // Initial greeting as a visual only, not saved unless interacted
     const INITIAL_MESSAGE: Message = { role: 'assistant', content: 'Hello! I am your Smart EV Assistant. How can I help you today?' }
@@ -36,6 +40,8 @@ export default function ChatAssistant() {
     const [userData, setUserData] = useState<any>(null)
 
     const scrollRef = useRef<HTMLDivElement>(null)
+    // Distance from the bottom to restore after prepending older messages
+    const keepScrollRef = useRef<number | null>(null)
 
     useEffect(() => {
         // Load user data on mount
@@ -53,20 +59,32 @@ export default function ChatAssistant() {
 
     useEffect(() => {
         if (scrollRef.current) {
-            scrollRef.current.scrollTop = scrollRef.current.scrollHeight
+            if (keepScrollRef.current !== null) {
+                scrollRef.current.scrollTop = scrollRef.current.scrollHeight - keepScrollRef.current
+                keepScrollRef.current = null
+            } else {
+                scrollRef.current.scrollTop = scrollRef.current.scrollHeight
+            }
         }
     }, [messages, loading])
 
-    const loadConversations = async () => {
+    // Without a cursor this (re)loads the newest page; with one it appends older conversations
+    const loadConversations = async (cursor: string | null = null) => {
         if (!userData?.id) return
+        if (cursor) setLoadingOlder(true)
         try {
-            const res = await fetch(`/api/chat/history?user_id=${userData.id}`)
+            const params = new URLSearchParams({ user_id: String(userData.id) })
+            if (cursor) params.set('cursor', cursor)
+            const res = await fetch(`/api/chat/history?${params}`)
             const data = await res.json()
             if (data.status === 'success') {
-                setConversations(data.conversations)
+                setConversations(prev => cursor ? [...prev, ...data.conversations] : data.conversations)
+                setConversationsCursor(data.page?.next_cursor ?? null)
             }
         } catch (e) {
             console.error("Failed to load history", e)
+        } finally {
+            setLoadingOlder(false)
         }
     }
 
@@ -77,6 +95,7 @@ export default function ChatAssistant() {
             const data = await res.json()
             if (data.status === 'success') {
                 setMessages(data.messages)
+                setMessagesCursor(data.page?.next_cursor ?? null)
                 setCurrentConversationId(conversationId)
                 setShowHistory(false)
             }
@@ -87,8 +106,31 @@ export default function ChatAssistant() {
         }
     }
 
+    const loadOlderMessages = async () => {
+        if (!currentConversationId || !messagesCursor || loadingOlder) return
+        setLoadingOlder(true)
+        try {
+            const params = new URLSearchParams({ cursor: messagesCursor })
+            const res = await fetch(`/api/chat/history/${currentConversationId}?${params}`)
+            const data = await res.json()
+            if (data.status === 'success') {
+                if (scrollRef.current) {
+                    keepScrollRef.current = scrollRef.current.scrollHeight - scrollRef.current.scrollTop
+                }
+                // Each page is chronological and older than everything shown
+                setMessages(prev => [...data.messages, ...prev])
+                setMessagesCursor(data.page?.next_cursor ?? null)
+            }
+        } catch (e) {
+            console.error("Failed to load older messages", e)
+        } finally {
+            setLoadingOlder(false)
+        }
+    }
+
     const startNewChat = () => {
         setMessages([INITIAL_MESSAGE])
+        setMessagesCursor(null)
         setCurrentConversationId(null)
         setShowHistory(false)
     }
@@ -218,6 +260,16 @@ export default function ChatAssistant() {
                                                     </button>
                                                 ))
                                             )}
+                                            {conversationsCursor && (
+                                                <button
+                                                    onClick={() => loadConversations(conversationsCursor)}
+                                                    disabled={loadingOlder}
+                                                    className="w-full p-2 rounded-lg text-xs text-gray-400 hover:bg-white/5 hover:text-white transition-colors flex items-center justify-center gap-2 disabled:opacity-50"
+                                                >
+                                                    {loadingOlder && <Loader2 size={12} className="animate-spin" />}
+                                                    Load older conversations
+                                                </button>
+                                            )}
                                         </div>
                                     </motion.div>
                                 )}
@@ -225,6 +277,17 @@ export default function ChatAssistant() {
 
                             {/* Messages List */}
                             <div className="flex-1 overflow-y-auto p-4 space-y-4 custom-scrollbar" ref={scrollRef}>
+                                {messagesCursor && (
+                                    <button
+                                        onClick={loadOlderMessages}
+                                        disabled={loadingOlder}
+                                        className="w-full py-1.5 text-xs text-gray-400 hover:text-white transition-colors flex items-center justify-center gap-2 disabled:opacity-50"
+                                    >
+                                        {loadingOlder && <Loader2 size={12} className="animate-spin" />}
+                                        Load older messages
+                                    </button>
+                                )}
+
                                 {messages.length === 0 && (
                                     <div className="flex flex-col items-center justify-center h-full text-gray-500 text-sm gap-2 opacity-50">
                                         <Bot size={32} />